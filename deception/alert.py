@@ -1,4 +1,5 @@
 import os
+import asyncio
 from typing import Optional, Dict
 import aiosmtplib
 from email.mime.text import MIMEText
@@ -124,8 +125,11 @@ class AlertManager:
                         severity: str = "medium",
                         additional_data: Optional[Dict] = None) -> Dict[str, bool]:
         """Send alerts through all configured channels."""
+        # The Discord webhook client is blocking, so keep it off the event loop
         results = {
             "email": await self.send_email_alert(title, message, severity),
-            "discord": self.send_discord_alert(title, message, severity, additional_data)
+            "discord": await asyncio.to_thread(
+                self.send_discord_alert, title, message, severity, additional_data
+            )
         }
         return results 
\ No newline at end of file
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from storage import CancelScope, QueryCancelled, current_cancel_scope
+
+class QueryTimeout(Exception):
+    """Raised when a data-access call exceeds its timeout or is cancelled."""
+
+class AsyncDataAccess:
+    """Run blocking data-access calls from async handlers on a bounded thread pool.
+
+    Each call gets a ``CancelScope`` that the storage engine checks while a
+    read query runs, so a timed-out or cancelled request stops its SQLite
+    work instead of holding a pool thread until the query finishes. At most
+    ``max_pending`` calls may be queued or running at once, including calls
+    whose caller already timed out but whose thread has not returned yet;
+    waiting for a slot counts against the call's timeout.
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 default_timeout: Optional[float] = None):
+        self.max_workers = max_workers or int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+        self.max_pending = max_pending or int(os.getenv("DB_MAX_PENDING", "32"))
+        self.default_timeout = default_timeout or float(os.getenv("DB_QUERY_TIMEOUT", "5.0"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db-read")
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._metrics = {"calls": 0, "timeouts": 0, "cancelled": 0, "in_flight": 0}
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool with a timeout."""
+        timeout = timeout or self.default_timeout
+        scope = CancelScope(timeout)
+        loop = asyncio.get_running_loop()
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._metrics["timeouts"] += 1
+            raise QueryTimeout(f"No database worker available within {timeout}s")
+
+        self._metrics["calls"] += 1
+        self._metrics["in_flight"] += 1
+        context = contextvars.copy_context()
+        context.run(current_cancel_scope.set, scope)
+        call = functools.partial(context.run, fn, *args, **kwargs)
+        try:
+            future = self._executor.submit(call)
+        except RuntimeError:
+            self._release()
+            raise
+        # The slot is held until the worker thread is done with the call, not just until the
+        # caller stops waiting, so timed-out calls still count against max_pending
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        try:
+            remaining = max(0.0, scope.deadline - time.monotonic()) if scope.deadline else None
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=remaining)
+        except asyncio.TimeoutError:
+            scope.cancel()
+            self._metrics["timeouts"] += 1
+            raise QueryTimeout(f"Query exceeded {timeout}s")
+        except QueryCancelled as e:
+            self._metrics["timeouts"] += 1
+            raise QueryTimeout(str(e))
+        except asyncio.CancelledError:
+            scope.cancel()
+            self._metrics["cancelled"] += 1
+            raise
+
+    def _release(self):
+        self._metrics["in_flight"] -= 1
+        self._slots.release()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # Loop already closed at shutdown
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_metrics(self) -> Dict:
+        """Get call, timeout and cancellation counts."""
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "default_timeout_seconds": self.default_timeout,
+            **self._metrics
+        }
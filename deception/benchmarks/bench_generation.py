@@ -0,0 +1,70 @@
+"""Decoy file generation throughput: batched text generation against one call per file.
+
+    python benchmarks/bench_generation.py --files 20 --rounds 3
+
+Loads the text model in-process. The sequential path is the old
+``generate_multiple_files``: one single-prompt generation of 150 tokens per
+file, whatever its template. The batched path is ``generate_files``, which
+generates the text of every file that needs one in one left-padded call with
+per-template lengths.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_generator import TEXT_PROMPT, FakeFileGenerator, GPT2TextModel
+
+class _FixedText:
+    """Stands in for the model so the sequential path reuses the same templating."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def generate(self, prompts, max_length=150):
+        return [self.text] * len(prompts)
+
+def _sequential(generator: FakeFileGenerator, model: GPT2TextModel, count: int):
+    try:
+        for _ in range(count):
+            generator.text_model = _FixedText(model.generate([TEXT_PROMPT], 150)[0])
+            generator.generate_fake_file()
+    finally:
+        generator.text_model = model
+
+def _timed(fn, count: int, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(count)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    model = GPT2TextModel(args.model, batch_size=args.batch_size)
+    model.load()
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = FakeFileGenerator(text_model=model)
+        generator.static_dir = Path(tmp)
+        generator.generate_multiple_files(1)  # warm up
+
+        sequential_s = _timed(lambda count: _sequential(generator, model, count), args.files, args.rounds)
+        batched_s = _timed(generator.generate_multiple_files, args.files, args.rounds)
+
+    print(f"model {args.model}, batch size {model.batch_size}, {args.files} files, best of {args.rounds}")
+    for name, seconds in (("sequential", sequential_s), ("batched", batched_s)):
+        print(f"{name:<10}  {seconds:8.2f} s  {args.files / seconds:8.2f} files/s")
+    print(f"speedup     {sequential_s / batched_s:8.2f}x")
+
+if __name__ == "__main__":
+    main()
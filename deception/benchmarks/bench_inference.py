@@ -0,0 +1,97 @@
+"""CPU inference benchmark for the decoy text model: default against fast mode.
+
+    python benchmarks/bench_inference.py --samples 16
+    python benchmarks/bench_inference.py --models gpt2 distilgpt2 --threads 4
+
+Each (model, mode) pair runs in a fresh interpreter so peak RSS is its own.
+Reports generated tokens per second and peak RSS, plus a quality sanity
+check: perplexity of a fixed business paragraph under the model (int8
+quantization should barely move it) and the share of non-empty, non-
+repetitive samples.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+REFERENCE = (
+    "The quarterly budget review showed that operating expenses rose by four percent, mainly because of "
+    "new cloud infrastructure contracts. The finance team recommends consolidating vendors and moving "
+    "batch workloads to reserved capacity before the next fiscal year."
+)
+
+PROBE = r"""
+import json, math, sys, time
+from file_generator import TEXT_PROMPT, GPT2TextModel
+from generator_service import _rss_mb
+
+model = GPT2TextModel(sys.argv[1], fast=sys.argv[2] == "fast", threads=int(sys.argv[3]) or None)
+model.load()
+samples, max_length = int(sys.argv[4]), int(sys.argv[5])
+
+import torch
+started = time.perf_counter()
+texts = model.generate([TEXT_PROMPT] * samples, max_length)
+elapsed = time.perf_counter() - started
+tokens = sum(len(model.tokenizer.encode(text)) for text in texts)
+
+with torch.inference_mode():
+    ids = model.tokenizer(sys.argv[6], return_tensors="pt")["input_ids"]
+    perplexity = math.exp(model.model(ids, labels=ids).loss.item())
+
+def distinct_bigrams(text):
+    words = text.split()
+    pairs = list(zip(words, words[1:]))
+    return len(set(pairs)) / len(pairs) if pairs else 0.0
+
+print("RESULT " + json.dumps({
+    **model.get_stats(),
+    "tokens": tokens,
+    "tokens_per_second": tokens / elapsed,
+    "peak_rss_mb": _rss_mb(),
+    "perplexity": perplexity,
+    "non_empty": sum(1 for text in texts if text.strip()) / len(texts),
+    "distinct_bigrams": sum(distinct_bigrams(text) for text in texts) / len(texts),
+    "sample": texts[0][:200]
+}))
+"""
+
+def _run(model: str, mode: str, threads: int, samples: int, max_length: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, model, mode, str(threads), str(samples), str(max_length), REFERENCE],
+        cwd=APP_DIR, env=dict(os.environ, GENERATOR_FAST="0"), capture_output=True, text=True
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{model} {mode} probe failed:\n{completed.stderr[-2000:]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=["gpt2"])
+    parser.add_argument("--samples", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=150)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for fast mode (0: torch default)")
+    args = parser.parse_args()
+
+    print(f"{'model':<12} {'mode':<8} {'tok/s':>8} {'peak RSS':>10} {'ppl':>8} {'non-empty':>10} {'distinct-2':>10}")
+    for model in args.models:
+        results = {mode: _run(model, mode, args.threads, args.samples, args.max_length)
+                   for mode in ("default", "fast")}
+        for mode, result in results.items():
+            print(f"{model:<12} {mode:<8} {result['tokens_per_second']:8.1f} {result['peak_rss_mb']:8.0f} MiB "
+                  f"{result['perplexity']:8.2f} {result['non_empty']:10.0%} {result['distinct_bigrams']:10.2f}")
+        drift = results["fast"]["perplexity"] / results["default"]["perplexity"] - 1
+        speedup = results["fast"]["tokens_per_second"] / results["default"]["tokens_per_second"]
+        verdict = "ok" if drift < 0.10 and results["fast"]["non_empty"] >= 0.9 else "CHECK SAMPLES"
+        print(f"{model:<12} fast mode: {speedup:.2f}x tokens/s, perplexity {drift:+.1%} "
+              f"({results['fast']['quantized_layers']} int8 layers, {results['fast']['threads']} threads) "
+              f"-> quality {verdict}")
+        print(f"{'':<12} fast sample: {results['fast']['sample']!r}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Memory and lookup benchmark for Bloom-prefiltered .ipset feeds.
+
+    python benchmarks/bench_ipset.py --entries 1000000 --fp-rate 0.01
+
+Compares a compiled .ipset against the Python set of strings the built-in
+feeds use, for addresses that are listed and (mostly) not listed.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from bloom import IPSet, compile_ipset
+from ip_index import parse_ip
+
+def _addresses(count: int, rng: random.Random):
+    return [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+            for _ in range(count)]
+
+def _per_lookup_ns(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--probes", type=int, default=200_000)
+    parser.add_argument("--fp-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    listed = _addresses(args.entries, rng)
+    probes_listed = rng.sample(listed, min(args.probes, len(listed)))
+    probes_clean = _addresses(args.probes, rng)
+
+    as_set = set(listed)
+    set_bytes = sys.getsizeof(as_set) + sum(sys.getsizeof(ip) for ip in as_set)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ipset")
+        started = time.perf_counter()
+        compiled = compile_ipset(listed, path, fp_rate=args.fp_rate)
+        compile_s = time.perf_counter() - started
+        exact = IPSet(path)
+
+        parsed_listed = [parse_ip(ip) for ip in probes_listed]
+        parsed_clean = [parse_ip(ip) for ip in probes_clean]
+        clean_values = np.array([value for _, value in parsed_clean], dtype=np.uint64)
+
+        def prefilter_only(parsed):
+            return exact.bloom.might_contain(parsed[1])
+
+        filter_hits = sum(prefilter_only(parsed) for parsed in parsed_clean)
+        truly_listed = sum(ip in as_set for ip in probes_clean)
+
+        started = time.perf_counter()
+        exact.contains_many_v4(clean_values)
+        vector_ns = (time.perf_counter() - started) / len(clean_values) * 1e9
+
+        rows = [
+            ("entries", f"{len(exact):,}"),
+            ("python set of str", f"{set_bytes / 2**20:,.1f} MiB"),
+            ("bloom filter (resident)", f"{compiled['filter_bytes'] / 2**20:,.2f} MiB, {compiled['hashes']} hashes"),
+            ("exact store (mmapped)", f"{os.path.getsize(path) / 2**20:,.1f} MiB on disk"),
+            ("compile", f"{compile_s:,.2f} s"),
+            ("expected / observed FP rate",
+             f"{compiled['expected_fp_rate']:.4f} / {(filter_hits - truly_listed) / len(parsed_clean):.4f}"),
+            ("set lookup (str)", f"{_per_lookup_ns(as_set.__contains__, probes_clean):,.0f} ns"),
+            ("filter only, clean IP", f"{_per_lookup_ns(prefilter_only, parsed_clean):,.0f} ns"),
+            ("contains, clean IP", f"{_per_lookup_ns(lambda p: exact.contains(*p), parsed_clean):,.0f} ns"),
+            ("contains, listed IP", f"{_per_lookup_ns(lambda p: exact.contains(*p), parsed_listed):,.0f} ns"),
+            ("contains_many_v4, clean IP", f"{vector_ns:,.0f} ns"),
+        ]
+        width = max(len(name) for name, _ in rows)
+        for name, value in rows:
+            print(f"{name:<{width}}  {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Bulk decoy generation with the n-gram backend: tokens/s and files/s.
+
+    python benchmarks/bench_markov.py --files 50000
+    python benchmarks/bench_markov.py --model models/decoy_markov.npz --files 50000
+
+Without --model, a throwaway model is trained on the file templates
+themselves, which is enough to measure speed (not to judge the text).
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_generator import FakeFileGenerator
+from markov import MarkovTextModel
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="Trained .npz model (default: train on the templates)")
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens per snippet for the raw generation run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = FakeFileGenerator()
+        generator.static_dir = Path(tmp)
+        if args.model:
+            generator.markov_model = MarkovTextModel.load(args.model)
+        else:
+            generator.markov_model = MarkovTextModel.train(generator.templates)
+        model = generator.markov_model
+        categories = list(generator.templates)
+
+        started = time.perf_counter()
+        model.generate_for([categories[i % len(categories)] for i in range(args.files)], args.tokens)
+        generate_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        files = generator.generate_multiple_files(args.files, backend="markov")
+        files_s = time.perf_counter() - started
+
+    stats = model.get_stats()
+    print(f"model: order {stats['order']}, {stats['vocab_size']:,} tokens, "
+          f"{sum(stats['contexts'].values()):,} contexts, {stats['table_bytes'] / 2**20:.1f} MiB")
+    print(f"text only   {args.files:,} x {args.tokens} tokens in {generate_s:.2f} s "
+          f"({args.files * args.tokens / generate_s / 1e6:.2f} M tokens/s)")
+    print(f"files       {len(files):,} files in {files_s:.2f} s ({len(files) / files_s:,.0f} files/s)")
+    print(f"torch imported: {'torch' in sys.modules}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Cold start time and memory of an API worker, with and without the in-process model.
+
+    python benchmarks/bench_startup.py            # import main the way uvicorn does
+    python benchmarks/bench_startup.py --local    # also time loading GPT-2 in-process (the old startup)
+    python benchmarks/bench_startup.py --generate # also time the first and a warm generation via the service
+
+Every measurement runs in a fresh interpreter so import caches do not carry over.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import main
+result = {"import_seconds": time.perf_counter() - started}
+if "{mode}" == "local":
+    started = time.perf_counter()
+    main.file_generator.text_model.load()
+    result["model_load_seconds"] = time.perf_counter() - started
+if {generate}:
+    for name in ("first_generation_seconds", "warm_generation_seconds"):
+        started = time.perf_counter()
+        main.file_generator._generate_text("Generate realistic business content: ")
+        result[name] = time.perf_counter() - started
+from generator_service import _rss_mb
+result["worker_peak_rss_mb"] = _rss_mb()
+result["torch_imported"] = "torch" in sys.modules
+if main.text_model is not None:
+    result["service"] = main.text_model.get_stats().get("service")
+    main.text_model.close()
+print("RESULT " + json.dumps(result))
+"""
+
+def _run(mode: str, generate: bool) -> dict:
+    env = dict(os.environ, GENERATOR_MODE=mode)
+    probe = PROBE.replace("{mode}", mode).replace("{generate}", str(generate))
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{mode} probe failed:\n{completed.stderr[-2000:]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--local", action="store_true", help="Also measure GENERATOR_MODE=local with the model loaded")
+    parser.add_argument("--generate", action="store_true", help="Also time generations through the service")
+    args = parser.parse_args()
+
+    results = {"service": _run("service", args.generate)}
+    if args.local:
+        results["local"] = _run("local", args.generate)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from ip_index import parse_ip
+
+MAGIC = b"VIPS"
+VERSION = 1
+# magic, version, hash count, IPv4 count, IPv6 count, filter bits, target FP rate, metadata length
+HEADER = struct.Struct("<4sHHQQQdI4x")
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_V6_SEED = 0x6A09E667F3BCC909
+
+def _mix64(x: int) -> int:
+    """splitmix64 finaliser on Python ints."""
+    x = (x + _GOLDEN) & MASK64
+    x = ((x ^ (x >> 30)) * _MIX1) & MASK64
+    x = ((x ^ (x >> 27)) * _MIX2) & MASK64
+    return x ^ (x >> 31)
+
+def _mix64_np(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser on uint64 arrays; matches ``_mix64``."""
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(_GOLDEN)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(_MIX1)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(_MIX2)
+    return x ^ (x >> np.uint64(31))
+
+def _hash64_np(keys: np.ndarray) -> np.ndarray:
+    """Filter hash: one multiply and an xor-shift, enough for keys of 64 bits or less."""
+    with np.errstate(over="ignore"):
+        x = keys * np.uint64(_GOLDEN)
+    return x ^ (x >> np.uint64(32))
+
+def _key(version: int, value: int) -> int:
+    """Fold an address into the 64-bit filter key space."""
+    if version == 4:
+        return value
+    return _mix64((value >> 64) ^ _V6_SEED) ^ (value & MASK64)
+
+def _keys_v6_np(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    return _mix64_np(high ^ np.uint64(_V6_SEED)) ^ low
+
+def bloom_size(entries: int, fp_rate: float, max_bytes: Optional[int] = None) -> Tuple[int, int]:
+    """Get (bits, hash count) for a filter; ``max_bytes`` caps the size at the cost of FP rate."""
+    if entries <= 0 or fp_rate <= 0:
+        return 0, 0
+    bits = math.ceil(-entries * math.log(fp_rate) / math.log(2) ** 2)
+    if max_bytes:
+        bits = min(bits, max_bytes * 8)
+    bits = max(64, (bits + 63) // 64 * 64)
+    return bits, max(1, round(bits / entries * math.log(2)))
+
+def expected_fp_rate(entries: int, bits: int, hashes: int) -> float:
+    if not entries or not bits:
+        return 0.0
+    return (1 - math.exp(-hashes * entries / bits)) ** hashes
+
+class BloomFilter:
+    """Bloom filter over 64-bit keys with double hashing.
+
+    Bit positions are ``(h1 + i * h2) mod bits`` for ``i < hashes``, where
+    ``h1``/``h2`` are the two halves of a multiplicative hash of the key. The
+    bit buffer can be a bytearray or a read-only mapped section.
+    """
+
+    def __init__(self, bits: int, hashes: int, buffer=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.buffer = buffer if buffer is not None else bytearray(bits // 8)
+
+    def _positions_np(self, keys: np.ndarray) -> np.ndarray:
+        """Get a (hashes, len(keys)) array of bit positions."""
+        hashed = _hash64_np(keys.astype(np.uint64, copy=False))
+        h1 = hashed & np.uint64(0xFFFFFFFF)
+        h2 = (hashed >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)[:, None]
+        with np.errstate(over="ignore"):
+            return (h1 + steps * h2) % np.uint64(self.bits)
+
+    def add_many(self, keys: np.ndarray, chunk: int = 1 << 20):
+        bits = np.frombuffer(self.buffer, dtype=np.uint8)
+        for start in range(0, len(keys), chunk):
+            positions = self._positions_np(keys[start:start + chunk]).ravel()
+            np.bitwise_or.at(bits, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def might_contain(self, key: int) -> bool:
+        # _hash64_np on one key, inlined; this is the per-lookup hot path
+        x = (key * _GOLDEN) & MASK64
+        x ^= x >> 32
+        h1, h2 = x & 0xFFFFFFFF, (x >> 32) | 1
+        buffer, bits = self.buffer, self.bits
+        position = h1 % bits
+        for _ in range(self.hashes):
+            if not buffer[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + h2) % bits
+        return True
+
+    def might_contain_many(self, keys: np.ndarray) -> np.ndarray:
+        bits = np.frombuffer(self.buffer, dtype=np.uint8)
+        positions = self._positions_np(keys)
+        hit = (bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return hit.all(axis=0)
+
+    def memory_bytes(self) -> int:
+        return self.bits // 8
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _layout(meta_len: int, bloom_bits: int, v4_count: int, v6_count: int):
+    """Get (name, offset, length in bytes) for every section of the file."""
+    sections = [("meta", meta_len), ("bloom", bloom_bits // 8), ("v4", v4_count * 4),
+                ("v6_hi", v6_count * 8), ("v6_lo", v6_count * 8)]
+    layout, offset = [], _align(HEADER.size)
+    for name, length in sections:
+        layout.append((name, offset, length))
+        offset = _align(offset + length)
+    return layout
+
+def compile_ipset(lines: Iterable[str], output_path: str, fp_rate: Optional[float] = None,
+                  max_bytes: Optional[int] = None, meta: Optional[Dict] = None) -> Dict:
+    """Compile single addresses (one per line, '#' comments) into an .ipset file.
+
+    The file holds the sorted, deduplicated addresses (4 bytes per IPv4,
+    16 per IPv6) and a Bloom filter sized for ``fp_rate`` (env
+    ``FEED_BLOOM_FP_RATE``, default 0.01; 0 disables the filter), capped at
+    ``max_bytes`` (env ``FEED_BLOOM_MAX_BYTES``) if given.
+    """
+    fp_rate = float(os.getenv("FEED_BLOOM_FP_RATE", "0.01")) if fp_rate is None else fp_rate
+    max_bytes = int(os.getenv("FEED_BLOOM_MAX_BYTES", "0")) if max_bytes is None else max_bytes
+
+    v4, v6_hi, v6_lo = array("I"), array("Q"), array("Q")
+    rejected = 0
+    for line in lines:
+        entry = line.split("#", 1)[0].strip()
+        if not entry:
+            continue
+        parsed = parse_ip(entry.split()[0])
+        if parsed is None:
+            rejected += 1
+        elif parsed[0] == 4:
+            v4.append(parsed[1])
+        else:
+            v6_hi.append(parsed[1] >> 64)
+            v6_lo.append(parsed[1] & MASK64)
+
+    v4 = np.unique(np.frombuffer(v4, dtype=np.uint32)) if len(v4) else np.empty(0, np.uint32)
+    v6 = np.unique(np.stack([np.frombuffer(v6_hi, dtype=np.uint64), np.frombuffer(v6_lo, dtype=np.uint64)],
+                            axis=1), axis=0) if len(v6_hi) else np.empty((0, 2), np.uint64)
+
+    entries = len(v4) + len(v6)
+    bits, hashes = bloom_size(entries, fp_rate, max_bytes)
+    bloom = BloomFilter(bits, hashes)
+    if bits:
+        bloom.add_many(v4.astype(np.uint64))
+        bloom.add_many(_keys_v6_np(v6[:, 0], v6[:, 1]))
+
+    meta_blob = json.dumps(meta or {}).encode("utf-8")
+    data = {"meta": meta_blob, "bloom": bytes(bloom.buffer), "v4": v4.tobytes(),
+            "v6_hi": np.ascontiguousarray(v6[:, 0]).tobytes(), "v6_lo": np.ascontiguousarray(v6[:, 1]).tobytes()}
+    # Write a sibling temp file and rename it over the target: readers may have the old file
+    # mapped, and truncating it in place would fault them (SIGBUS)
+    out = tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(output_path)),
+                                      prefix=".", suffix=".tmp", delete=False)
+    try:
+        with out:
+            out.write(HEADER.pack(MAGIC, VERSION, hashes, len(v4), len(v6), bits, fp_rate, len(meta_blob)))
+            for name, offset, _ in _layout(len(meta_blob), bits, len(v4), len(v6)):
+                out.write(b"\0" * (offset - out.tell()))
+                out.write(data[name])
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(out.name, output_path)
+    except BaseException:
+        os.unlink(out.name)
+        raise
+
+    return {"ipv4": len(v4), "ipv6": len(v6), "rejected": rejected, "filter_bytes": bits // 8,
+            "hashes": hashes, "expected_fp_rate": round(expected_fp_rate(entries, bits, hashes), 6)}
+
+class IPSet:
+    """Exact set of single addresses in a memory-mapped .ipset file, behind a Bloom filter.
+
+    Most absent addresses are rejected by the filter without touching the
+    sorted address sections; filter hits are confirmed with a binary search
+    over the mapped arrays. Only the filter pages are hot, so resident
+    memory is about the filter size whatever the number of addresses.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError(".ipset files are little-endian only")
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is not a compiled .ipset file")
+        view = memoryview(self._map)
+
+        magic, version, hashes, v4_count, v6_count, bits, fp_rate, meta_len = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a compiled .ipset file")
+        self.v4_count, self.v6_count, self.fp_rate = v4_count, v6_count, fp_rate
+
+        sections = {name: view[offset:offset + length]
+                    for name, offset, length in _layout(meta_len, bits, v4_count, v6_count)}
+        self.meta = json.loads(bytes(sections["meta"]) or b"{}")
+        self.bloom = BloomFilter(bits, hashes, sections["bloom"]) if bits else None
+        self._v4 = sections["v4"].cast("I")
+        self._v6_hi = sections["v6_hi"].cast("Q")
+        self._v6_lo = sections["v6_lo"].cast("Q")
+
+    def __len__(self) -> int:
+        return self.v4_count + self.v6_count
+
+    def _exact(self, version: int, value: int) -> bool:
+        if version == 4:
+            i = bisect_left(self._v4, value)
+            return i < self.v4_count and self._v4[i] == value
+        high, low = value >> 64, value & MASK64
+        i = bisect_left(self._v6_hi, high)
+        while i < self.v6_count and self._v6_hi[i] == high:
+            if self._v6_lo[i] == low:
+                return True
+            if self._v6_lo[i] > low:
+                return False
+            i += 1
+        return False
+
+    def contains(self, version: int, value: int) -> bool:
+        if self.bloom is not None and not self.bloom.might_contain(_key(version, value)):
+            return False
+        return self._exact(version, value)
+
+    def contains_many_v4(self, values: np.ndarray) -> np.ndarray:
+        """Vectorised ``contains`` for IPv4 values (uint64 array)."""
+        found = np.zeros(len(values), dtype=bool)
+        if not self.v4_count or not len(values):
+            return found
+        candidates = np.flatnonzero(self.bloom.might_contain_many(values)) if self.bloom is not None \
+            else np.arange(len(values))
+        if len(candidates):
+            addresses = np.frombuffer(self._v4, dtype=np.uint32)
+            wanted = values[candidates].astype(np.uint32)
+            index = np.minimum(np.searchsorted(addresses, wanted), self.v4_count - 1)
+            found[candidates] = addresses[index] == wanted
+        return found
+
+    def get_stats(self) -> Dict:
+        bits = self.bloom.bits if self.bloom is not None else 0
+        hashes = self.bloom.hashes if self.bloom is not None else 0
+        return {
+            "entries": len(self),
+            "filter_bytes": bits // 8,
+            "hashes": hashes,
+            "target_fp_rate": self.fp_rate,
+            "expected_fp_rate": round(expected_fp_rate(len(self), bits, hashes), 6),
+            "exact_bytes": self.v4_count * 4 + self.v6_count * 16
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a large single-address feed into an .ipset file.")
+    parser.add_argument("feed", help="Text feed, one address per line")
+    parser.add_argument("output", help=".ipset file to write, usually into THREAT_FEED_DIR")
+    parser.add_argument("--fp-rate", type=float, help="Bloom filter false-positive rate; 0 disables it")
+    parser.add_argument("--max-bytes", type=int, help="Upper bound on filter size")
+    args = parser.parse_args()
+
+    from feed_manager import _header_directives
+    meta = _header_directives(args.feed)
+    with open(args.feed, encoding="utf-8") as f:
+        print(compile_ipset(f, args.output, args.fp_rate, args.max_bytes, meta))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Normalised field -> names it goes by in CSV headers, JSON keys and Zeek conn.log
+FIELD_ALIASES = {
+    "ts": ("ts", "timestamp", "time", "start_time"),
+    "source_ip": ("source_ip", "src_ip", "src", "id.orig_h", "saddr"),
+    "dest_ip": ("dest_ip", "dst_ip", "dst", "id.resp_h", "daddr"),
+    "source_port": ("source_port", "src_port", "sport", "id.orig_p"),
+    "dest_port": ("dest_port", "dst_port", "dport", "id.resp_p"),
+    "protocol": ("protocol", "proto"),
+    "bytes_sent": ("bytes_sent", "orig_bytes", "src_bytes", "bytes_out"),
+    "bytes_received": ("bytes_received", "resp_bytes", "dst_bytes", "bytes_in"),
+    "duration": ("duration",),
+    "flags": ("flags", "conn_state")
+}
+
+FORMATS = ("csv", "jsonl", "zeek")
+
+def _open(path: Path):
+    """Open a log file for binary reading, transparently un-gzipping."""
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+def _fingerprint(path: Path) -> str:
+    """Identify a file by its first 64 KiB, so a replaced file is not resumed."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(65536)).hexdigest()
+
+def _parse_ts(value) -> Optional[int]:
+    """Parse epoch seconds/milliseconds or an ISO timestamp to epoch ms."""
+    if value in (None, "", "-"):
+        return None
+    try:
+        number = float(value)
+        return int(number if number > 1e11 else number * 1000)
+    except (TypeError, ValueError):
+        return int(datetime.fromisoformat(str(value)).timestamp() * 1000)
+
+def _parse_int(value) -> int:
+    if value in (None, "", "-", "(empty)"):
+        return 0
+    return int(float(value))
+
+def _normalize(raw: Dict) -> Tuple:
+    """Map one parsed record onto a connection tuple.
+
+    Returns ``(ts_ms, source_ip, dest_ip, source_port, dest_port, protocol,
+    bytes_sent, bytes_received, duration, flags)``.
+    """
+    record = {}
+    for name, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in raw and raw[alias] not in ("", "-"):
+                record[name] = raw[alias]
+                break
+
+    if "source_ip" not in record or "dest_port" not in record:
+        raise ValueError("missing source_ip or dest_port")
+
+    flags = record.get("flags", [])
+    if isinstance(flags, str):
+        flags = json.loads(flags) if flags.startswith("[") else [flags]
+
+    return (
+        _parse_ts(record.get("ts")) or int(time.time() * 1000),
+        str(record["source_ip"]),
+        str(record.get("dest_ip", "")),
+        _parse_int(record.get("source_port")),
+        _parse_int(record["dest_port"]),
+        str(record.get("protocol", "TCP")).upper(),
+        _parse_int(record.get("bytes_sent")),
+        _parse_int(record.get("bytes_received")),
+        float(record.get("duration") or 0.0),
+        flags
+    )
+
+def detect_format(path: Path) -> str:
+    """Guess a log format from its first line."""
+    with _open(path) as f:
+        first = f.readline().decode("utf-8", "replace").lstrip()
+    if first.startswith("#separator"):
+        return "zeek"
+    if first.startswith("{"):
+        return "jsonl"
+    return "csv"
+
+def _line_parser(path: Path, fmt: str) -> Tuple[Callable[[str], Optional[Dict]], int]:
+    """Build a line parser for a file and get the byte offset its data starts at."""
+    if fmt == "jsonl":
+        return (lambda line: json.loads(line) if line.strip() else None), 0
+
+    if fmt == "csv":
+        with _open(path) as f:
+            header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]))
+
+        def parse_csv(line: str) -> Optional[Dict]:
+            if not line.strip():
+                return None
+            return dict(zip(header, next(csv.reader([line]))))
+        return parse_csv, len(header_line)
+
+    # Zeek TSV: directives up front, data rows after, '#close' at the end
+    separator, unset, fields, offset = "\t", "-", [], 0
+    with _open(path) as f:
+        for raw_line in f:
+            line = raw_line.decode("utf-8").rstrip("\r\n")
+            if not line.startswith("#"):
+                break
+            offset += len(raw_line)
+            if line.startswith("#separator "):
+                separator = line.partition(" ")[2].encode().decode("unicode_escape")
+                continue
+            directive, *values = line.split(separator)
+            if directive == "#unset_field":
+                unset = values[0]
+            elif directive == "#fields":
+                fields = values
+    if not fields:
+        raise ValueError(f"No #fields header in {path}")
+
+    def parse_zeek(line: str) -> Optional[Dict]:
+        if not line.strip() or line.startswith("#"):
+            return None
+        return {name: value for name, value in zip(fields, line.split(separator)) if value != unset}
+    return parse_zeek, offset
+
+class BulkImporter:
+    """Streams connection logs through NetworkAnalyzer scoring into the database.
+
+    Files are read line by line from a byte offset, parsed into chunks of
+    ``chunk_rows`` connections, scored with ``NetworkAnalyzer.score_batch``
+    and inserted with one ``executemany`` per chunk on the storage writer.
+    The checkpoint row is written in the same transaction as its chunk, so an
+    interrupted import resumes after the last committed chunk without
+    duplicating or losing rows. Parsing of the next chunk overlaps the write
+    of the previous one; memory stays bounded by two chunks.
+    """
+
+    def __init__(self, analyzer, chunk_rows: Optional[int] = None,
+                 import_dir: Optional[str] = None):
+        self.analyzer = analyzer
+        self.storage = analyzer.storage
+        self.chunk_rows = chunk_rows or int(os.getenv("IMPORT_CHUNK_ROWS", "20000"))
+        self.import_dir = Path(import_dir or os.getenv("IMPORT_DIR", "imports"))
+        self.jobs: Dict[str, Dict] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+
+    def _chunks(self, path: Path, fmt: str, offset: int, stats: Dict) -> Iterator[Tuple[List[Tuple], int]]:
+        """Yield (connections, end offset) chunks starting at a byte offset."""
+        parse, data_offset = _line_parser(path, fmt)
+        offset = max(offset, data_offset)
+        chunk = []
+        with _open(path) as f:
+            f.seek(offset)
+            for raw_line in f:
+                offset += len(raw_line)
+                try:
+                    record = parse(raw_line.decode("utf-8"))
+                    if record is not None:
+                        chunk.append(_normalize(record))
+                except (ValueError, TypeError, KeyError, UnicodeDecodeError, csv.Error):
+                    stats["errors"] += 1
+                if len(chunk) >= self.chunk_rows:
+                    yield chunk, offset
+                    chunk = []
+        yield chunk, offset
+
+    def _score(self, chunk: List[Tuple], tracker) -> List[float]:
+        """Score a chunk, replaying it through the window tracker in file order."""
+        window_connections, window_unique_ports = [], []
+        for ts, source_ip, _, _, dest_port, *_ in chunk:
+            recent_count, unique_ports = tracker.window_stats(source_ip, minutes=10, now_ms=ts)
+            window_connections.append(recent_count)
+            window_unique_ports.append(unique_ports)
+            tracker.record(source_ip, dest_port, ts)
+
+        batch = self.analyzer.score_batch(
+            dest_port=[row[4] for row in chunk],
+            source_port=[row[3] for row in chunk],
+            protocol=[row[5] for row in chunk],
+            bytes_sent=[row[6] for row in chunk],
+            bytes_received=[row[7] for row in chunk],
+            window_connections=window_connections,
+            window_unique_ports=window_unique_ports
+        )
+        return batch["threat_score"].tolist()
+
+    def _writer(self, source: str, fingerprint: str, chunk: List[Tuple], scores: List[float],
+                offset: int, stats: Dict, finished: bool) -> Callable:
+        """Build the writer-thread function that inserts a chunk and its checkpoint."""
+        rows = []
+        for (ts, source_ip, dest_ip, source_port, dest_port, protocol,
+             bytes_sent, bytes_received, duration, flags), score in zip(chunk, scores):
+            session_data = f"{source_ip}:{source_port}-{dest_ip}:{dest_port}-{protocol}"
+            rows.append((
+                source_ip, dest_ip, source_port, dest_port, protocol,
+                datetime.fromtimestamp(ts / 1000), bytes_sent, bytes_received, duration,
+                json.dumps(flags), hashlib.md5(session_data.encode()).hexdigest()[:16], score, ts
+            ))
+        checkpoint = (source, fingerprint, offset, stats["rows"], stats["errors"],
+                      stats["last_ts"], finished, datetime.now())
+
+        def write(conn):
+            conn.executemany('''
+                INSERT INTO network_connections
+                (source_ip, dest_ip, source_port, dest_port, protocol, timestamp,
+                 bytes_sent, bytes_received, duration, flags, session_id, threat_score, ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute('''
+                INSERT OR REPLACE INTO import_checkpoints
+                (source, fingerprint, byte_offset, rows, errors, last_ts, finished, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', checkpoint)
+        return write
+
+    def import_file(self, path: str, fmt: str = "auto", restart: bool = False,
+                    progress: Optional[Callable[[Dict], None]] = None,
+                    cancel: Optional[threading.Event] = None) -> Dict:
+        """Import one connection log. Resumes from its checkpoint unless restart is set."""
+        path = Path(path)
+        source = str(path.resolve())
+        fmt = detect_format(path) if fmt == "auto" else fmt
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        self.storage.migrate()
+
+        fingerprint = _fingerprint(path)
+        checkpoint = self.storage.query_one('''
+            SELECT fingerprint, byte_offset, rows, errors, last_ts, finished
+            FROM import_checkpoints WHERE source = ?
+        ''', (source,))
+        offset, stats = 0, {"rows": 0, "errors": 0, "last_ts": None}
+        if checkpoint and checkpoint[0] == fingerprint and not restart:
+            offset = checkpoint[1]
+            stats.update(rows=checkpoint[2], errors=checkpoint[3], last_ts=checkpoint[4])
+
+        stats.update(source=source, format=fmt, resumed_from=offset, imported=0,
+                     rows_per_sec=0.0, finished=False)
+        if checkpoint and checkpoint[0] == fingerprint and checkpoint[5] and not restart:
+            stats["finished"] = True
+            return stats
+
+        tracker = self.analyzer.history_tracker(stats["last_ts"] or 0)
+        started = time.perf_counter()
+        pending = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-import") as executor:
+            for chunk, end_offset in self._chunks(path, fmt, offset, stats):
+                if cancel is not None and cancel.is_set():
+                    break
+                scores = self._score(chunk, tracker) if chunk else []
+                stats["rows"] += len(chunk)
+                stats["imported"] += len(chunk)
+                if chunk:
+                    stats["last_ts"] = max(stats["last_ts"] or 0, max(row[0] for row in chunk))
+                at_end = len(chunk) < self.chunk_rows
+                write = self._writer(source, fingerprint, chunk, scores, end_offset, stats, at_end)
+
+                if pending is not None:
+                    pending.result()  # At most one chunk in flight
+                pending = executor.submit(self.storage.call, write)
+
+                elapsed = time.perf_counter() - started
+                stats["rows_per_sec"] = round(stats["imported"] / elapsed, 1) if elapsed else 0.0
+                if progress is not None:
+                    progress(dict(stats))
+                stats["finished"] = at_end
+            if pending is not None:
+                pending.result()
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["rows_per_sec"] = round(stats["imported"] / elapsed, 1) if elapsed else 0.0
+        return stats
+
+    def start_job(self, relative_path: str, fmt: str = "auto", restart: bool = False) -> str:
+        """Import a file under import_dir in the background. Returns a job id."""
+        root = self.import_dir.resolve()
+        path = (root / relative_path).resolve()
+        if root not in path.parents or not path.is_file():
+            raise FileNotFoundError(f"No such import file: {relative_path}")
+
+        job_id = uuid.uuid4().hex[:12]
+        cancel = threading.Event()
+        self._cancel[job_id] = cancel
+        self.jobs[job_id] = {"job_id": job_id, "status": "running", "path": relative_path}
+
+        def run():
+            try:
+                result = self.import_file(path, fmt, restart, progress=self.jobs[job_id].update,
+                                          cancel=cancel)
+                self.jobs[job_id].update(result)
+                self.jobs[job_id]["status"] = "cancelled" if cancel.is_set() else "finished"
+            except Exception as e:
+                self.jobs[job_id].update(status="failed", error=str(e))
+                print(f"Bulk import {relative_path} failed: {e}")
+
+        threading.Thread(target=run, name=f"bulk-import-{job_id}", daemon=True).start()
+        return job_id
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Stop a running job after its current chunk."""
+        cancel = self._cancel.get(job_id)
+        if cancel is None:
+            return False
+        cancel.set()
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Import connection logs into the honeypot database.")
+    parser.add_argument("files", nargs="+", help="CSV, JSONL or Zeek conn.log files (optionally .gz)")
+    parser.add_argument("--format", default="auto", choices=("auto",) + FORMATS)
+    parser.add_argument("--db", default="honeypot.db", help="Database path")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Connections per transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints")
+    args = parser.parse_args()
+
+    from network_analyzer import NetworkAnalyzer
+
+    importer = BulkImporter(NetworkAnalyzer(args.db), chunk_rows=args.chunk_rows)
+    for file in args.files:
+        def report(stats):
+            print(f"{file}: {stats['rows']} rows, {stats['errors']} errors, "
+                  f"{stats['rows_per_sec']} rows/sec", flush=True)
+        stats = importer.import_file(file, args.format, args.restart, progress=report)
+        print(f"{file}: imported {stats['imported']} rows in {stats.get('seconds', 0)}s "
+              f"({stats['rows_per_sec']} rows/sec), resumed from byte {stats['resumed_from']}")
+
+if __name__ == "__main__":
+    main()
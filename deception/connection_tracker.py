@@ -0,0 +1,158 @@
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+SKETCH_BITS = 512
+
+def _port_bit(port: int) -> int:
+    """Map a port to one bit of a 512-bit distinct-port sketch."""
+    return 1 << (((port * 0x9E3779B1) & 0xFFFFFFFF) >> 23)
+
+def estimate_distinct(bitmap: int) -> int:
+    """Linear-counting estimate of distinct ports in a sketch bitmap."""
+    zeros = SKETCH_BITS - bitmap.bit_count()
+    if zeros == 0:
+        return round(SKETCH_BITS * math.log(SKETCH_BITS))
+    return round(-SKETCH_BITS * math.log(zeros / SKETCH_BITS))
+
+class _IPWindow:
+    """Ring buffer of per-bucket connection counts, sums and port sketches for one IP."""
+    __slots__ = ("epochs", "counts", "threat", "bytes", "ports", "last_bucket")
+
+    def __init__(self, buckets: int):
+        self.epochs = array("q", [-1]) * buckets
+        self.counts = array("I", [0]) * buckets
+        self.threat = array("d", [0.0]) * buckets
+        self.bytes = array("q", [0]) * buckets
+        self.ports = [0] * buckets
+        self.last_bucket = -1
+
+class ConnectionTracker:
+    """Memory-bounded per-IP sliding-window connection statistics.
+
+    Time is split into ``bucket_seconds`` buckets kept in a ring of
+    ``window_minutes`` worth of slots per IP. Each slot holds a connection
+    count, threat-score and byte sums, and a 512-bit distinct-port sketch, so "connections in the last N
+    minutes" and "unique ports" cost at most one pass over the ring, however
+    many connections the IP made. IPs are kept in LRU order; the least
+    recently seen are evicted once ``max_ips`` is reached or once they have
+    been idle longer than the window.
+    """
+
+    def __init__(self,
+                 window_minutes: Optional[int] = None,
+                 bucket_seconds: Optional[int] = None,
+                 max_ips: Optional[int] = None):
+        self.window_minutes = window_minutes or int(os.getenv("TRACKER_WINDOW_MINUTES", "10"))
+        self.bucket_seconds = bucket_seconds or int(os.getenv("TRACKER_BUCKET_SECONDS", "10"))
+        self.max_ips = max_ips or int(os.getenv("TRACKER_MAX_IPS", "100000"))
+        self.bucket_ms = self.bucket_seconds * 1000
+        self.buckets = max(1, math.ceil(self.window_minutes * 60 / self.bucket_seconds))
+
+        self._ips: "OrderedDict[str, _IPWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def record(self, ip_address: str, dest_port: int, ts_ms: Optional[int] = None,
+               threat_score: float = 0.0, total_bytes: int = 0):
+        """Record one connection from an IP."""
+        ts_ms = ts_ms if ts_ms is not None else int(time.time() * 1000)
+        bucket = ts_ms // self.bucket_ms
+        slot = bucket % self.buckets
+
+        with self._lock:
+            window = self._ips.get(ip_address)
+            if window is None:
+                window = _IPWindow(self.buckets)
+                self._ips[ip_address] = window
+            else:
+                self._ips.move_to_end(ip_address)
+
+            if bucket <= window.last_bucket - self.buckets:
+                return  # Older than the window
+            if window.epochs[slot] != bucket:
+                if window.epochs[slot] > bucket:
+                    return  # Slot already reused by a newer bucket
+                window.epochs[slot] = bucket
+                window.counts[slot] = 0
+                window.threat[slot] = 0.0
+                window.bytes[slot] = 0
+                window.ports[slot] = 0
+            window.counts[slot] += 1
+            window.threat[slot] += threat_score
+            window.bytes[slot] += total_bytes
+            window.ports[slot] |= _port_bit(dest_port)
+            window.last_bucket = max(window.last_bucket, bucket)
+
+            self._evict(bucket)
+
+    def _evict(self, current_bucket: int):
+        """Drop least recently seen IPs that are over capacity or idle."""
+        while self._ips:
+            ip_address, window = next(iter(self._ips.items()))
+            if len(self._ips) > self.max_ips or window.last_bucket <= current_bucket - self.buckets:
+                self._ips.popitem(last=False)
+                self._evictions += 1
+            else:
+                break
+
+    def window_stats(self, ip_address: str, minutes: Optional[int] = None,
+                     now_ms: Optional[int] = None) -> Tuple[int, int]:
+        """Get (connection count, estimated unique dest ports) for the last N minutes."""
+        count, unique_ports, _, _ = self.window_totals(ip_address, minutes, now_ms)
+        return count, unique_ports
+
+    def window_totals(self, ip_address: str, minutes: Optional[int] = None,
+                      now_ms: Optional[int] = None) -> Tuple[int, int, float, int]:
+        """Get (count, estimated unique ports, threat-score sum, bytes) for the last N minutes."""
+        minutes = minutes or self.window_minutes
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        now_bucket = now_ms // self.bucket_ms
+        span = min(self.buckets, max(1, math.ceil(minutes * 60 / self.bucket_seconds)))
+
+        with self._lock:
+            window = self._ips.get(ip_address)
+            if window is None or window.last_bucket <= now_bucket - span:
+                return 0, 0, 0.0, 0
+
+            count = 0
+            threat = 0.0
+            total_bytes = 0
+            ports = 0
+            for bucket in range(now_bucket - span + 1, now_bucket + 1):
+                slot = bucket % self.buckets
+                if window.epochs[slot] == bucket:
+                    count += window.counts[slot]
+                    threat += window.threat[slot]
+                    total_bytes += window.bytes[slot]
+                    ports |= window.ports[slot]
+
+        return count, estimate_distinct(ports) if ports else 0, threat, total_bytes
+
+    def rebuild(self, storage) -> int:
+        """Reload the window from stored connections. Returns rows replayed."""
+        since = int(time.time() * 1000) - self.buckets * self.bucket_ms
+        rows = storage.query('''
+            SELECT source_ip, dest_port, ts, threat_score,
+                   COALESCE(bytes_sent, 0) + COALESCE(bytes_received, 0)
+            FROM network_connections
+            WHERE ts > ?
+            ORDER BY ts
+        ''', (since,))
+        for source_ip, dest_port, ts, threat_score, total_bytes in rows:
+            self.record(source_ip, dest_port or 0, ts, threat_score or 0.0, total_bytes)
+        return len(rows)
+
+    def get_metrics(self) -> Dict:
+        """Get tracked IP count and evictions."""
+        return {
+            "tracked_ips": len(self._ips),
+            "max_ips": self.max_ips,
+            "window_minutes": self.window_minutes,
+            "bucket_seconds": self.bucket_seconds,
+            "evictions": self._evictions
+        }
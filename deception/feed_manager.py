@@ -0,0 +1,251 @@
+import csv
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from bloom import IPSet
+from ip_index import FeedTag, IPIndex, IPIndexBuilder
+
+FEED_SUFFIXES = (".txt", ".csv", ".json", ".ipset")
+
+STIX_IP_PATTERN = re.compile(r"ipv[46]-addr:value\s*=\s*'([^']+)'")
+
+def _confidence(value, default: float) -> float:
+    """Parse a confidence given as 0-1 or as a 0-100 percentage."""
+    if value in (None, ""):
+        return default
+    value = float(value)
+    return value / 100 if value > 1 else value
+
+def _header_directives(path: Path) -> Dict[str, str]:
+    """Read ``# key: value`` lines at the top of a text feed."""
+    directives = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("#"):
+                break
+            key, sep, value = line[1:].partition(":")
+            if sep:
+                directives[key.strip().lower()] = value.strip()
+    return directives
+
+def _read_text(path: Path, tag: FeedTag) -> Iterator[Tuple[str, FeedTag]]:
+    """One address or CIDR per line; '#' starts a comment."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = line.split("#", 1)[0].strip()
+            if entry:
+                yield entry.split()[0], tag
+
+def _read_csv(path: Path, tag: FeedTag) -> Iterator[Tuple[str, FeedTag]]:
+    """CSV with a header; rows may override type, confidence and description."""
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = csv.DictReader(line for line in f if not line.startswith("#"))
+        for row in rows:
+            network = next((row[key] for key in ("network", "cidr", "ip", "ip_address", "indicator", "value")
+                            if row.get(key)), None)
+            if network is None:
+                continue
+            yield network, tag._replace(
+                threat_type=row.get("type") or row.get("threat_type") or tag.threat_type,
+                confidence=_confidence(row.get("confidence"), tag.confidence),
+                description=row.get("description") or tag.description
+            )
+
+def _read_json(path: Path, tag: FeedTag) -> Iterator[Tuple[str, FeedTag]]:
+    """STIX 2 bundles of indicators, or a list of addresses/indicator objects."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("objects") or data.get("indicators") or []
+
+    for item in data:
+        if isinstance(item, str):
+            yield item, tag
+            continue
+        if not isinstance(item, dict) or item.get("type", "indicator") != "indicator":
+            continue
+        item_tag = tag._replace(
+            threat_type=item.get("threat_type")
+            or (item.get("indicator_types") or item.get("labels") or [tag.threat_type])[0],
+            confidence=_confidence(item.get("confidence"), tag.confidence),
+            description=item.get("description") or item.get("name") or tag.description
+        )
+        if "pattern" in item:
+            for network in STIX_IP_PATTERN.findall(item["pattern"]):
+                yield network, item_tag
+        elif "value" in item:
+            yield item["value"], item_tag
+
+READERS = {".txt": _read_text, ".csv": _read_csv, ".json": _read_json}
+
+class FeedManager:
+    """Loads threat feeds from a directory into an IPIndex and keeps it fresh.
+
+    Built-in feeds are always present. Files in ``feed_dir`` (``.txt``
+    address/CIDR lists, ``.csv`` and STIX-style ``.json``) are one feed each,
+    named after the file; text and CSV feeds may start with ``# type:``,
+    ``# confidence:``, ``# source:`` and ``# description:`` lines. Feeds of
+    millions of single addresses should be compiled to ``.ipset`` files
+    (``python bloom.py``), which are memory-mapped behind a Bloom filter
+    instead of being loaded into the index arrays. A watcher
+    thread checks file sizes and mtimes every ``reload_interval`` seconds and
+    rebuilds the whole index in the background. The new index replaces
+    ``self.index`` in one assignment, so lookups never lock and keep using
+    the old index until the new one is complete.
+    """
+
+    def __init__(self, builtin: Optional[List[Tuple[set, FeedTag]]] = None,
+                 feed_dir: Optional[str] = None, reload_interval: Optional[float] = None):
+        self.builtin = builtin or []
+        self.feed_dir = Path(feed_dir or os.getenv("THREAT_FEED_DIR", "feeds"))
+        self.reload_interval = reload_interval or float(os.getenv("FEED_RELOAD_SECONDS", "30"))
+        self.feed_stats: Dict[str, Dict] = {}
+        self.reloads = 0
+        self.last_reload = None
+        self._callbacks: List[Callable[[IPIndex], None]] = []
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fingerprint = None
+        self.index = IPIndexBuilder().build()
+        self.reload(force=True)
+
+    def start(self):
+        """Start watching the feed directory."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="feed-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def on_reload(self, callback: Callable[[IPIndex], None]):
+        """Register a callback run with the new index after every swap."""
+        self._callbacks.append(callback)
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Threat feed reload failed: {e}")
+
+    def _feed_files(self) -> List[Path]:
+        if not self.feed_dir.is_dir():
+            return []
+        return sorted(path for path in self.feed_dir.iterdir()
+                      if path.is_file() and path.suffix.lower() in FEED_SUFFIXES)
+
+    def _current_fingerprint(self, files: List[Path]) -> Tuple:
+        fingerprint = []
+        for path in files:
+            stat = path.stat()
+            fingerprint.append((path.name, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+
+    def _load_file(self, builder: IPIndexBuilder, path: Path) -> Dict:
+        """Add one feed file to the builder and get its stats."""
+        if path.suffix.lower() == ".ipset":
+            return self._load_ipset(builder, path)
+        directives = _header_directives(path) if path.suffix.lower() != ".json" else {}
+        tag = FeedTag(
+            feed=path.stem,
+            threat_type=directives.get("type", "malicious_ip"),
+            confidence=_confidence(directives.get("confidence"), 0.7),
+            source=directives.get("source", path.name),
+            description=directives.get("description", f"IP found in {path.stem} feed")
+        )
+        return self._add_entries(builder, READERS[path.suffix.lower()](path, tag), path.name)
+
+    def _load_ipset(self, builder: IPIndexBuilder, path: Path) -> Dict:
+        started = time.perf_counter()
+        exact = IPSet(str(path))
+        tag = FeedTag(
+            feed=path.stem,
+            threat_type=exact.meta.get("type", "malicious_ip"),
+            confidence=_confidence(exact.meta.get("confidence"), 0.7),
+            source=exact.meta.get("source", path.name),
+            description=exact.meta.get("description", f"IP found in {path.stem} feed")
+        )
+        builder.add_exact_set(exact, tag)
+        stats = exact.get_stats()
+        return {
+            "source": path.name,
+            "entries": stats["entries"],
+            "rejected": 0,
+            "memory_bytes": stats["filter_bytes"],
+            "disk_bytes": stats["exact_bytes"],
+            "expected_fp_rate": stats["expected_fp_rate"],
+            "load_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def _add_entries(self, builder: IPIndexBuilder, entries, source: str) -> Dict:
+        started = time.perf_counter()
+        entry_count = rejected = 0
+        memory = builder.memory_bytes
+        for network, tag in entries:
+            if builder.add(network, tag):
+                entry_count += 1
+            else:
+                rejected += 1
+        return {
+            "source": source,
+            "entries": entry_count,
+            "rejected": rejected,
+            "memory_bytes": builder.memory_bytes - memory,
+            "load_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the index if feed files changed. Returns True if swapped."""
+        with self._build_lock:
+            files = self._feed_files()
+            fingerprint = self._current_fingerprint(files)
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            started = time.perf_counter()
+            builder = IPIndexBuilder()
+            stats = {}
+            for networks, tag in self.builtin:
+                stats[tag.feed] = self._add_entries(builder, ((network, tag) for network in sorted(networks)),
+                                                    "builtin")
+            for path in files:
+                try:
+                    stats[path.stem] = self._load_file(builder, path)
+                except (OSError, ValueError, KeyError, TypeError, csv.Error) as e:
+                    stats[path.stem] = {"source": path.name, "error": str(e)}
+                    print(f"Skipping threat feed {path.name}: {e}")
+
+            index = builder.build()
+            self.index = index
+            self.feed_stats = stats
+            self._fingerprint = fingerprint
+            self.reloads += 1
+            self.last_reload = {
+                "at": time.time(),
+                "build_ms": round((time.perf_counter() - started) * 1000, 3)
+            }
+
+        for callback in self._callbacks:
+            try:
+                callback(index)
+            except Exception as e:
+                print(f"Threat feed reload callback failed: {e}")
+        return True
+
+    def get_stats(self) -> Dict:
+        """Get per-feed load stats and the current index size."""
+        return {
+            "feed_dir": str(self.feed_dir),
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "index": self.index.get_stats(),
+            "feeds": self.feed_stats
+        }
@@ -1,19 +1,150 @@
 import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Iterable, List, Dict, Optional, Set, Tuple, Union
 import random
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-import torch
 from datetime import datetime
 
-class FakeFileGenerator:
-    def __init__(self, model_name: str = "gpt2"):
-        self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-        self.model = GPT2LMHeadModel.from_pretrained(model_name)
+TEXT_PROMPT = "Generate realistic business content: "
+TEXT_BACKENDS = ("gpt2", "markov")
+
+class GPT2TextModel:
+    """GPT-2 text generation, loaded on first use.
+
+    torch and transformers are imported by ``load``, not at module import,
+    so processes that never generate text (the API workers when generation
+    runs in generator_service) never pay for them.
+
+    ``fast`` (env ``GENERATOR_FAST``) is the CPU inference mode: int8 dynamic
+    quantization of the linear layers, ``threads`` intra-op threads (env
+    ``GENERATOR_THREADS``, default torch's choice, pinned explicitly), a
+    warm-up generation at load and ``torch.inference_mode``.
+    """
+
+    def __init__(self, model_name: str = "gpt2", batch_size: Optional[int] = None,
+                 fast: Optional[bool] = None, threads: Optional[int] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size or int(os.getenv("GENERATION_BATCH_SIZE", "16"))
+        self.fast = os.getenv("GENERATOR_FAST", "0").lower() in ("1", "true", "yes") if fast is None else fast
+        self.threads = threads or int(os.getenv("GENERATOR_THREADS", "0")) or None
+        self.quantized_layers = 0
+        self.tokenizer = None
+        self.model = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Load the tokenizer and model if not loaded yet."""
+        with self._load_lock:
+            if self.model is not None:
+                return
+            started = time.perf_counter()
+            from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+            self.tokenizer = GPT2Tokenizer.from_pretrained(self.model_name)
+            self.model = GPT2LMHeadModel.from_pretrained(self.model_name)
+            
+            # Set padding token if not already set
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            # Decoder-only models continue from the last position, so pad on the left
+            self.tokenizer.padding_side = "left"
+            self.model.eval()
+            if self.fast:
+                self._optimize_for_cpu()
+            self.load_seconds = time.perf_counter() - started
+
+    def _optimize_for_cpu(self):
+        import torch
+        from transformers.pytorch_utils import Conv1D
+
+        self.threads = self.threads or torch.get_num_threads()
+        torch.set_num_threads(self.threads)
+
+        # GPT-2's attention and MLP projections are Conv1D modules (x @ W + b), which
+        # quantize_dynamic does not recognise; swap them for the equivalent nn.Linear
+        for parent in list(self.model.modules()):
+            for name, child in list(parent.named_children()):
+                if isinstance(child, Conv1D):
+                    linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                    linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+                    linear.bias = child.bias
+                    setattr(parent, name, linear)
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.quantized_layers = sum(1 for module in self.model.modules()
+                                    if "quantized" in type(module).__module__ and type(module).__name__ == "Linear")
+
+        # The first generate pays for kernel selection and allocator growth; do it now
+        started = time.perf_counter()
+        self._generate_batch([TEXT_PROMPT], [24])
+        self.warmup_seconds = time.perf_counter() - started
+
+    def get_stats(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "loaded": self.model is not None,
+            "fast": self.fast,
+            "threads": self.threads,
+            "quantized_layers": self.quantized_layers,
+            "model_load_seconds": round(self.load_seconds, 3) if self.load_seconds else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds else None
+        }
+
+    def generate(self, prompts: List[str], max_length: Union[int, List[int]] = 150) -> List[str]:
+        """Generate a continuation for each prompt.
+
+        ``max_length`` is the total token length (prompt included), either
+        one value or one per prompt. Prompts are left-padded into batches of
+        ``batch_size`` and each batch is decoded in one ``model.generate``
+        call, run until the longest budget in the batch; shorter samples are
+        cut to their own budget.
+        """
+        self.load()
+        lengths = list(max_length) if isinstance(max_length, (list, tuple)) else [max_length] * len(prompts)
+        texts = []
+        for start in range(0, len(prompts), self.batch_size):
+            texts.extend(self._generate_batch(prompts[start:start + self.batch_size],
+                                              lengths[start:start + self.batch_size]))
+        return texts
+
+    def _generate_batch(self, prompts: List[str], lengths: List[int]) -> List[str]:
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=50)
+        prompt_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+        budgets = [max(1, length - tokens) for length, tokens in zip(lengths, prompt_tokens)]
         
-        # Set padding token if not already set
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
+        import torch
+        with torch.inference_mode() if self.fast else torch.no_grad():
+            outputs = self.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_new_tokens=max(budgets),
+                num_return_sequences=1,
+                no_repeat_ngram_size=2,
+                do_sample=True,
+                temperature=0.8,
+                top_p=0.9,
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id
+            )
+        
+        # Keep only the generated part (excluding the padded prompt), up to each sample's budget
+        generated = outputs[:, inputs["input_ids"].shape[1]:]
+        return [self.tokenizer.decode(tokens[:budget], skip_special_tokens=True).strip()
+                for tokens, budget in zip(generated, budgets)]
+
+class FakeFileGenerator:
+    def __init__(self, model_name: str = "gpt2", text_model=None):
+        # Anything with generate(prompts, max_length) -> texts, e.g. generator_service.GeneratorClient
+        self.text_model = text_model if text_model is not None else GPT2TextModel(model_name)
+        # n-gram backend for bulk generation, loaded from MARKOV_MODEL_PATH on first use
+        self.markov_model = None
+        # Tells whether a name is taken outside static_dir, e.g. VirtualFileSystem.exists
+        self.name_taken: Optional[Callable[[str], bool]] = None
+        # Names handed out by plan_file but not written yet, shared by every caller
+        self._reserved: Set[str] = set()
+        self._names_lock = threading.Lock()
             
         self.static_dir = Path("app/static")
         self.static_dir.mkdir(parents=True, exist_ok=True)
@@ -47,44 +178,27 @@ class FakeFileGenerator:
 
     def _generate_text(self, prompt: str, max_length: int = 150) -> str:
         """Generate text using the GPT-2 model."""
-        inputs = self.tokenizer.encode(prompt, return_tensors="pt", truncation=True, max_length=50)
-        attention_mask = torch.ones_like(inputs)
-        
-        outputs = self.model.generate(
-            inputs,
-            attention_mask=attention_mask,
-            max_length=max_length,
-            num_return_sequences=1,
-            no_repeat_ngram_size=2,
-            do_sample=True,
-            temperature=0.8,
-            top_p=0.9,
-            pad_token_id=self.tokenizer.eos_token_id,
-            eos_token_id=self.tokenizer.eos_token_id
-        )
-        
-        # Get only the generated part (excluding the prompt)
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # Remove the prompt from the beginning
-        if generated_text.startswith(prompt):
-            generated_text = generated_text[len(prompt):].strip()
-        
-        return generated_text
+        return self.text_model.generate([prompt], max_length)[0]
 
-    def _generate_random_string(self, length: int = 16) -> str:
+    def text_length(self, template: str) -> int:
+        """Token budget for a template's {text}: 0 without one, shorter when it repeats."""
+        slots = template.count("{text}")
+        return max(60, 150 // slots) if slots else 0
+
+    def _generate_random_string(self, length: int = 16, rng=random) -> str:
         """Generate random string for fake credentials."""
         import string
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+        return ''.join(rng.choices(string.ascii_letters + string.digits, k=length))
 
-    def _generate_fake_amount(self) -> str:
+    def _generate_fake_amount(self, rng=random) -> str:
         """Generate a realistic-looking financial amount."""
-        return f"{random.randint(1, 999):,}"
+        return f"{rng.randint(1, 999):,}"
 
-    def _generate_fake_percentage(self) -> str:
+    def _generate_fake_percentage(self, rng=random) -> str:
         """Generate a realistic-looking percentage."""
-        return f"{random.uniform(0.1, 15.0):.1f}"
+        return f"{rng.uniform(0.1, 15.0):.1f}"
 
-    def _generate_honeypot_filename(self, category: str) -> str:
+    def generate_honeypot_filename(self, category: str, rng=random, qualified: bool = False) -> str:
         """Generate enticing filenames that attackers would target."""
         prefixes = {
             "financial": ["financial_report", "budget", "revenue", "expenses", "profit_loss", "bank_statements", "tax_returns", "audit_report"],
@@ -101,35 +215,75 @@ class FakeFileGenerator:
         ]
         extensions = [".txt", ".md", ".doc", ".pdf", ".xlsx", ".csv", ".json", ".xml", ".sql", ".env"]
         
-        prefix = random.choice(prefixes[category])
-        suffix = random.choice(suffixes)
-        extension = random.choice(extensions)
+        prefix = rng.choice(prefixes[category])
+        suffix = rng.choice(suffixes)
+        extension = rng.choice(extensions)
+        
+        if qualified:
+            # A department, region or date between prefix and suffix: millions of distinct names
+            kind = rng.randrange(3)
+            if kind == 0:
+                prefix += "_" + rng.choice(["finance", "eng", "sales", "ops", "legal", "exec", "it", "marketing"])
+            elif kind == 1:
+                prefix += "_" + rng.choice(["emea", "apac", "us", "latam", "hq"])
+            else:
+                prefix += f"_{datetime.now().year - rng.randrange(5)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
         
         return f"{prefix}{suffix}{extension}"
 
     def generate_fake_file(self, category: str = None) -> Dict:
         """Generate a fake file with realistic content."""
+        return self.generate_files([category])[0]
+
+    def plan_file(self, category: Optional[str] = None) -> Tuple[str, str, str]:
+        """Pick the category (if not given), template and filename of a new file.
+
+        The filename stays reserved until ``write_file`` writes it or
+        ``release_names`` gives it back, so no other plan picks it meanwhile.
+        """
         if category is None:
             category = random.choice(list(self.templates.keys()))
-            
         template = random.choice(self.templates[category])
-        filename = self._generate_honeypot_filename(category)
-        
-        # Replace placeholders with generated content
-        content = template.format(
-            quarter=random.randint(1, 4),
-            year=datetime.now().year,
-            amount=self._generate_fake_amount(),
-            percentage=self._generate_fake_percentage(),
-            version=f"{random.randint(1, 3)}.{random.randint(0, 9)}",
-            text=self._generate_text("Generate realistic business content: "),
-            random_string=self._generate_random_string()
+        filename = self.generate_honeypot_filename(category)
+        with self._names_lock:
+            # Short names run out after a few thousand files; never overwrite or shadow an existing decoy
+            while self._name_in_use(filename):
+                filename = self.generate_honeypot_filename(category, qualified=True)
+            self._reserved.add(filename)
+        return category, template, filename
+
+    def _name_in_use(self, filename: str) -> bool:
+        return (filename in self._reserved or (self.static_dir / filename).exists()
+                or (self.name_taken is not None and self.name_taken(filename)))
+
+    def release_names(self, filenames: Iterable[str]):
+        """Give back names reserved by plan_file that will not be written."""
+        with self._names_lock:
+            self._reserved.difference_update(filenames)
+
+    def render(self, template: str, text: str = "", rng=random, year: Optional[int] = None) -> str:
+        """Fill a template with fake values from ``rng`` and the given {text}."""
+        return template.format(
+            quarter=rng.randint(1, 4),
+            year=year or datetime.now().year,
+            amount=self._generate_fake_amount(rng),
+            percentage=self._generate_fake_percentage(rng),
+            version=f"{rng.randint(1, 3)}.{rng.randint(0, 9)}",
+            text=text,
+            random_string=self._generate_random_string(rng=rng)
         )
+
+    def write_file(self, category: str, template: str, filename: str, text: str = "") -> Dict:
+        """Fill a template with fake values and the given {text} and save it."""
+        # Replace placeholders with generated content
+        content = self.render(template, text)
         
         # Save the file
         file_path = self.static_dir / filename
         with open(file_path, "w", encoding="utf-8") as f:
             f.write(content)
+        # The file now exists, which keeps the name from being planned again
+        self.release_names([filename])
             
         return {
             "filename": filename,
@@ -138,6 +292,40 @@ class FakeFileGenerator:
             "category": category
         }
 
-    def generate_multiple_files(self, count: int = 5) -> List[Dict]:
+    def load_markov(self):
+        """Get the n-gram text model, loading it from MARKOV_MODEL_PATH on first use."""
+        if self.markov_model is None:
+            from markov import MarkovTextModel
+            self.markov_model = MarkovTextModel.load()
+        return self.markov_model
+
+    def generate_files(self, categories: List[Optional[str]], backend: str = "gpt2") -> List[Dict]:
+        """Generate one fake file per category (None picks one at random).
+
+        Templates are chosen first so that the {text} of every file that
+        needs one is generated in a single batched model call. ``backend`` is
+        "gpt2" (the text model) or "markov" (the trained n-gram model, for
+        thousands of files at a time).
+        """
+        if backend not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend: {backend}")
+        plans = [self.plan_file(category) for category in categories]
+        try:
+            lengths = [self.text_length(template) for _, template, _ in plans]
+            needed = [length for length in lengths if length]
+            if not needed:
+                texts = iter([])
+            elif backend == "markov":
+                texts = iter(self.load_markov().generate_for(
+                    [category for (category, _, _), length in zip(plans, lengths) if length], needed))
+            else:
+                texts = iter(self.text_model.generate([TEXT_PROMPT] * len(needed), needed))
+            return [self.write_file(*plan, text=next(texts) if length else "")
+                    for plan, length in zip(plans, lengths)]
+        finally:
+            # Names of files that failed to generate or write
+            self.release_names(filename for _, _, filename in plans)
+
+    def generate_multiple_files(self, count: int = 5, backend: str = "gpt2") -> List[Dict]:
         """Generate multiple fake files."""
-        return [self.generate_fake_file() for _ in range(count)]
\ No newline at end of file
+        return self.generate_files([None] * count, backend)
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from file_generator import TEXT_BACKENDS, FakeFileGenerator
+
+TERMINAL = ("finished", "cancelled", "failed")
+
+class JobQueueFull(Exception):
+    """Raised when the maximum number of jobs is already queued."""
+
+class GenerationJobs:
+    """Bounded queue of background file-generation jobs.
+
+    ``submit`` returns a job id at once; up to ``max_queued`` jobs of at most
+    ``max_files`` files each wait for one of ``workers`` runner threads, and
+    a cancelled job stops counting towards ``max_queued`` right away. A
+    runner generates its job in chunks of ``chunk_files``, updating the job
+    record after every chunk, so progress is per file and cancellation takes
+    effect at the next chunk.
+    All runners share ``generator`` and so its one text model: the
+    generator_service host, or the in-process model in local mode. Sampling
+    happens there (or in numpy for the n-gram backend), so the runners
+    mostly wait with the GIL released.
+    """
+
+    def __init__(self, generator: FakeFileGenerator, workers: Optional[int] = None,
+                 max_queued: Optional[int] = None, chunk_files: Optional[int] = None,
+                 on_files: Optional[Callable[[List[Dict]], None]] = None):
+        self.workers = workers or int(os.getenv("GENERATION_JOB_WORKERS", "2"))
+        self.max_queued = max_queued or int(os.getenv("GENERATION_JOB_QUEUE", "16"))
+        self.max_files = int(os.getenv("GENERATION_JOB_MAX_FILES", "100000"))
+        self.chunk_files = chunk_files or int(os.getenv("GENERATION_JOB_CHUNK", "8"))
+        self.history = int(os.getenv("GENERATION_JOB_HISTORY", "100"))
+        self.on_files = on_files
+        self.generator = generator
+        self.jobs: Dict[str, Dict] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        # Unbounded: the limit applies to live queued jobs, counted in submit
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"generation-runner-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Cancel queued and running jobs and stop the runners."""
+        for cancel in list(self._cancel.values()):
+            cancel.set()
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def submit(self, count: int, backend: str = "gpt2") -> Dict:
+        """Queue a job generating ``count`` files. Raises JobQueueFull when the queue is at capacity."""
+        if backend not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend: {backend}")
+        if not 1 <= count <= self.max_files:
+            raise ValueError(f"count must be between 1 and {self.max_files}")
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "count": count,
+            "backend": backend,
+            "generated": 0,
+            "files": [],
+            "created_at": time.time()
+        }
+        with self._lock:
+            if self._queued() >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} generation jobs already queued")
+            self.jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+            self._queue.put(job_id)
+            self._prune()
+        return self.get_job(job_id, None)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one after its current chunk."""
+        cancel = self._cancel.get(job_id)
+        if cancel is None:
+            return False
+        with self._lock:
+            cancel.set()
+            if self.jobs[job_id]["status"] == "queued":
+                self.jobs[job_id].update(status="cancelled", finished_at=time.time())
+        return True
+
+    def get_job(self, job_id: str, files_from: Optional[int] = 0) -> Optional[Dict]:
+        """Copy of a job record taken under the lock, or None for an unknown job.
+
+        The copy lists the job's files from index ``files_from`` on, or none if
+        ``files_from`` is None.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            copy = {key: value for key, value in job.items() if key != "files"}
+            if files_from is not None:
+                copy["files"] = job["files"][files_from:]
+            return copy
+
+    def list_jobs(self) -> List[Dict]:
+        """Copies of the recent job records, without their file lists."""
+        with self._lock:
+            job_ids = list(self.jobs)
+        return [job for job in (self.get_job(job_id, None) for job_id in job_ids) if job is not None]
+
+    def _queued(self) -> int:
+        return sum(1 for job in list(self.jobs.values()) if job["status"] == "queued")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``history``."""
+        done = [job_id for job_id, job in self.jobs.items() if job["status"] in TERMINAL]
+        for job_id in done[:max(0, len(done) - self.history)]:
+            del self.jobs[job_id]
+            self._cancel.pop(job_id, None)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self.jobs.get(job_id)
+                cancel = self._cancel.get(job_id)
+                if job is None or cancel is None or cancel.is_set():
+                    continue
+                job.update(status="running", started_at=time.time())
+            try:
+                while job["generated"] < job["count"] and not cancel.is_set():
+                    files = self.generator.generate_multiple_files(
+                        min(self.chunk_files, job["count"] - job["generated"]), job["backend"])
+                    if self.on_files is not None:
+                        self.on_files(files)
+                    with self._lock:
+                        job["files"].extend(files)
+                        job["generated"] += len(files)
+                with self._lock:
+                    elapsed = time.time() - job["started_at"]
+                    job.update(
+                        status="cancelled" if cancel.is_set() else "finished",
+                        finished_at=time.time(),
+                        files_per_second=round(job["generated"] / elapsed, 2) if elapsed else None,
+                        total_bytes=sum(f["size"] for f in job["files"])
+                    )
+            except Exception as e:
+                # Reported through the job record and get_stats, like the reservoir's refill errors
+                with self._lock:
+                    job.update(status="failed", error=str(e), finished_at=time.time())
+                    self.last_error = f"{job_id}: {e}"
+
+    def get_stats(self) -> Dict:
+        statuses: Dict[str, int] = {}
+        for job in list(self.jobs.values()):
+            statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queued(),
+            "max_queued": self.max_queued,
+            "jobs": statuses,
+            "last_error": self.last_error
+        }
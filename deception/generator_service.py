@@ -0,0 +1,327 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+Address = Union[str, Tuple[str, int]]
+
+def _rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def default_address() -> Address:
+    """GENERATOR_ADDRESS ("host:port" or a socket path), else a per-user Unix socket."""
+    configured = os.getenv("GENERATOR_ADDRESS")
+    if configured:
+        host, sep, port = configured.rpartition(":")
+        return (host, int(port)) if sep and port.isdigit() and os.sep not in configured else configured
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        return os.path.join(tempfile.gettempdir(), f"deception-generator-{os.getuid()}.sock")
+    return ("127.0.0.1", 8765)
+
+def _format_address(address: Address) -> str:
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+def _authkey(address: Address) -> bytes:
+    """GENERATOR_AUTHKEY; required over TCP, where anyone who can connect could send pickles.
+
+    A Unix socket is created owner-only, so without a key only this user can reach it.
+    """
+    key = os.getenv("GENERATOR_AUTHKEY")
+    if key:
+        return key.encode("utf-8")
+    if isinstance(address, tuple):
+        raise RuntimeError("Set GENERATOR_AUTHKEY to run the generator service over TCP")
+    return b"deception-generator"
+
+class GeneratorService:
+    """Model host process: loads the text model once and answers generation requests.
+
+    Requests are dicts sent over a ``multiprocessing.connection`` socket:
+    ``{"op": "generate", "prompts": [...], "max_length": n or [n, ...]}``, ``{"op": "ping"}``,
+    ``{"op": "stats"}`` or ``{"op": "release"}``. The address is bound before
+    the model loads, so a service that loses a start-up race exits without
+    loading it; until the model is ready, pings report ``ready: False`` and
+    generate requests wait. Every client connection gets a thread; generation
+    itself is serialised on the one model. With ``exit_when_idle`` (hosts
+    spawned by a client) a ``release`` from the last connected client stops
+    the service.
+    """
+
+    def __init__(self, address: Address, model_name: str = "gpt2", exit_when_idle: bool = False):
+        self.address = address
+        self.model_name = model_name
+        self.exit_when_idle = exit_when_idle
+        self.authkey = _authkey(address)
+        self.started_at = time.time()
+        self.requests = 0
+        self.texts = 0
+        self.clients = 0
+        self._model_lock = threading.Lock()
+        self._clients_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._listener: Optional[Listener] = None
+        self.model = None
+
+    def _bind(self) -> Listener:
+        if isinstance(self.address, tuple):
+            return Listener(self.address, authkey=self.authkey)
+        # Owner-only from the moment the socket file exists, rather than after a chmod
+        previous = os.umask(0o177)
+        try:
+            return Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous)
+
+    def _listen(self) -> Optional[Listener]:
+        """Bind the address; None if another live service already holds it."""
+        try:
+            return self._bind()
+        except OSError:
+            if isinstance(self.address, tuple):
+                raise
+        try:
+            Client(self.address, authkey=self.authkey).close()
+            return None
+        except OSError:
+            os.unlink(self.address)  # Stale socket left by a service that died
+            return self._bind()
+
+    def serve_forever(self):
+        self._listener = self._listen()
+        if self._listener is None:
+            print(f"Generator service already running at {_format_address(self.address)}")
+            return
+        threading.Thread(target=self._accept, name="generator-accept", daemon=True).start()
+
+        from file_generator import GPT2TextModel
+
+        try:
+            model = GPT2TextModel(self.model_name)
+            model.load()
+        except Exception as e:
+            print(f"Generator model load failed: {e}", flush=True)
+            self._listener.close()
+            sys.exit(1)
+        self.model = model
+        self._ready.set()
+        print(f"Generator service ready at {_format_address(self.address)} "
+              f"(model loaded in {self.model.load_seconds:.2f}s{', fast mode' if self.model.fast else ''})",
+              flush=True)
+        threading.Event().wait()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError):
+                continue  # Failed handshake, e.g. a client with the wrong key
+            except OSError:
+                return  # Listener closed
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with self._clients_lock:
+            self.clients += 1
+        try:
+            with conn:
+                while True:
+                    try:
+                        request = conn.recv()
+                    except (EOFError, OSError):
+                        return
+                    try:
+                        response = {"ok": True, **self._dispatch(request)}
+                        conn.send(response)
+                    except (EOFError, OSError):
+                        return
+                    except Exception as e:
+                        conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+                        continue
+                    if response.get("stopping"):
+                        self._listener.close()
+                        os._exit(0)
+        finally:
+            with self._clients_lock:
+                self.clients -= 1
+
+    def _dispatch(self, request: Dict) -> Dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ready": self._ready.is_set()}
+        if op == "stats":
+            return {"stats": self.get_stats()}
+        if op == "release":
+            with self._clients_lock:
+                return {"stopping": self.exit_when_idle and self.clients == 1}
+        if op == "generate":
+            self._ready.wait()
+            with self._model_lock:
+                texts = self.model.generate(request["prompts"], request.get("max_length", 150))
+            self.requests += 1
+            self.texts += len(texts)
+            return {"texts": texts}
+        raise ValueError(f"Unknown op: {op}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            **(self.model.get_stats() if self._ready.is_set() else {"loading": self.model_name}),
+            "clients": self.clients,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests": self.requests,
+            "texts": self.texts,
+            "rss_mb": _rss_mb()
+        }
+
+class GeneratorClient:
+    """Text model proxy used by the API workers; starts the model host on first use.
+
+    ``generate`` connects to the service at ``address`` and, if nothing is
+    listening, spawns ``python generator_service.py`` and waits up to
+    ``start_timeout`` seconds (env ``GENERATOR_START_TIMEOUT``, default 120)
+    for it to load the model. All workers share one service, so the model is
+    in memory once, and the workers themselves never import torch. A spawned
+    service outlives the client that started it while other clients are
+    still connected; the last one to ``close`` stops it.
+    """
+
+    def __init__(self, address: Optional[Address] = None, model_name: Optional[str] = None,
+                 start_timeout: Optional[float] = None):
+        self.address = address or default_address()
+        self.model_name = model_name or os.getenv("GENERATOR_MODEL", "gpt2")
+        self.start_timeout = start_timeout or float(os.getenv("GENERATOR_START_TIMEOUT", "120"))
+        self.process: Optional[subprocess.Popen] = None
+        self.start_seconds = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _try_connect(self) -> bool:
+        try:
+            self._conn = Client(self.address, authkey=_authkey(self.address))
+            return True
+        except OSError:
+            return False
+
+    def _wait_ready(self, deadline: float) -> bool:
+        """Ping the connected service until its model is loaded."""
+        while time.monotonic() < deadline:
+            self._conn.send({"op": "ping"})
+            if self._conn.recv().get("ready", True):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def _spawn(self):
+        """Start the model host and wait until its model is loaded."""
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--address", _format_address(self.address),
+             "--model", self.model_name, "--exit-when-idle"],
+            cwd=str(Path(__file__).resolve().parent)
+        )
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if self._try_connect():
+                break
+            if self.process.poll() is not None:
+                # Exited without serving: it failed, or lost a race to another worker's service
+                if self._try_connect():
+                    break
+                raise RuntimeError(f"Generator service exited with code {self.process.returncode}")
+            time.sleep(0.2)
+        else:
+            raise TimeoutError(f"Generator service not ready within {self.start_timeout}s")
+        if not self._wait_ready(deadline):
+            raise TimeoutError(f"Generator model not loaded within {self.start_timeout}s")
+        self.start_seconds = round(time.perf_counter() - started, 3)
+
+    def _request(self, request: Dict) -> Dict:
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None and not self._try_connect():
+                    self._spawn()
+                try:
+                    self._conn.send(request)
+                    response = self._conn.recv()
+                    break
+                except (EOFError, OSError):
+                    # Service went away; reconnect (and respawn if needed) once
+                    self._conn = None
+                    if attempt:
+                        raise
+        if not response["ok"]:
+            raise RuntimeError(f"Generator service error: {response['error']}")
+        return response
+
+    def generate(self, prompts: List[str], max_length: Union[int, List[int]] = 150) -> List[str]:
+        """Generate a continuation for each prompt in the model host (one batched call)."""
+        return self._request({"op": "generate", "prompts": list(prompts), "max_length": max_length})["texts"]
+
+    def get_stats(self) -> Dict:
+        """Get client and (if running) service stats without starting the service."""
+        stats = {
+            "address": _format_address(self.address),
+            "connected": self._conn is not None,
+            "spawned_pid": self.process.pid if self.process else None,
+            "start_seconds": self.start_seconds,
+            "client_rss_mb": _rss_mb(),
+            "torch_imported": "torch" in sys.modules
+        }
+        try:
+            with self._lock:
+                running = self._conn is not None or self._try_connect()
+        except RuntimeError as e:
+            stats["service_error"] = str(e)
+            running = False
+        if running:
+            try:
+                stats["service"] = self._request({"op": "stats"})["stats"]
+            except Exception as e:
+                stats["service_error"] = str(e)
+        return stats
+
+    def close(self):
+        """Disconnect; a spawned service stops once no other client is connected."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.send({"op": "release"})
+                stopping = self._conn.recv().get("stopping", False)
+            except (EOFError, OSError):
+                stopping = False
+            self._conn.close()
+            self._conn = None
+        if stopping and self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.terminate()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host the decoy text model for API workers.")
+    parser.add_argument("--address", help="Unix socket path or host:port (default: GENERATOR_ADDRESS)")
+    parser.add_argument("--model", default=os.getenv("GENERATOR_MODEL", "gpt2"))
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="Exit when the last client releases the service (used for spawned hosts)")
+    args = parser.parse_args()
+    if args.address:
+        os.environ["GENERATOR_ADDRESS"] = args.address
+    GeneratorService(default_address(), args.model, args.exit_when_idle).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ip_index import parse_ip
+
+MAGIC = b"VGEO"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIII")
+
+# String fields of a record, in file order; latitude/longitude are stored separately
+STRING_FIELDS = ("country", "region", "city", "isp", "organization", "asn", "timezone")
+
+CSV_COLUMNS = {
+    "country": ("country", "country_name"),
+    "region": ("region", "subdivision", "state"),
+    "city": ("city", "city_name"),
+    "isp": ("isp",),
+    "organization": ("organization", "org", "as_organization"),
+    "asn": ("asn", "autonomous_system_number"),
+    "timezone": ("timezone", "time_zone"),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng")
+}
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _layout(v4_count: int, v6_count: int, record_count: int, string_count: int) -> List[Tuple[str, int, str, int]]:
+    """Get (name, offset, array typecode, length) for every section of the file."""
+    sections = [
+        ("v4_start", "I", v4_count), ("v4_end", "I", v4_count), ("v4_record", "I", v4_count),
+        ("v6_start_hi", "Q", v6_count), ("v6_start_lo", "Q", v6_count),
+        ("v6_end_hi", "Q", v6_count), ("v6_end_lo", "Q", v6_count), ("v6_record", "I", v6_count),
+        ("record_strings", "I", record_count * len(STRING_FIELDS)), ("record_coords", "d", record_count * 2),
+        ("string_offsets", "I", string_count + 1)
+    ]
+    layout, offset = [], _align(HEADER.size)
+    for name, code, length in sections:
+        layout.append((name, offset, code, length))
+        offset = _align(offset + array(code).itemsize * length)
+    layout.append(("strings", offset, "B", 0))
+    return layout
+
+def _field(row: Dict, name: str) -> str:
+    return next((row[column] for column in CSV_COLUMNS[name] if row.get(column)), "")
+
+def compile_csv(csv_path: str, output_path: str) -> Dict:
+    """Compile a range CSV into the binary sorted-range format.
+
+    Rows need ``start_ip`` and ``end_ip`` or a ``network`` CIDR, plus any of
+    the location columns in ``CSV_COLUMNS``. Ranges must not overlap.
+    """
+    strings: Dict[str, int] = {"": 0}
+    records: Dict[Tuple, int] = {}
+    ranges = {4: [], 6: []}
+
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("network"):
+                network = ipaddress.ip_network(row["network"].strip(), strict=False)
+                start, end = network.network_address, network.broadcast_address
+            else:
+                start, end = ipaddress.ip_address(row["start_ip"].strip()), ipaddress.ip_address(row["end_ip"].strip())
+            if start.version != end.version or int(start) > int(end):
+                raise ValueError(f"Bad range {start} - {end}")
+
+            asn = _field(row, "asn")
+            if asn and not asn.upper().startswith("AS"):
+                asn = f"AS{asn}"
+            values = {name: _field(row, name) for name in STRING_FIELDS}
+            values["asn"] = asn
+            key = tuple(strings.setdefault(values[name], len(strings)) for name in STRING_FIELDS) + (
+                float(_field(row, "latitude") or 0.0), float(_field(row, "longitude") or 0.0))
+            ranges[start.version].append((int(start), int(end), records.setdefault(key, len(records))))
+
+    for version, version_ranges in ranges.items():
+        version_ranges.sort()
+        for previous, current in zip(version_ranges, version_ranges[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(f"Overlapping IPv{version} ranges at {ipaddress.ip_address(current[0])}")
+
+    blobs = [text.encode("utf-8") for text in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    mask = 0xFFFFFFFFFFFFFFFF
+    data = {
+        "v4_start": array("I", (r[0] for r in ranges[4])),
+        "v4_end": array("I", (r[1] for r in ranges[4])),
+        "v4_record": array("I", (r[2] for r in ranges[4])),
+        "v6_start_hi": array("Q", (r[0] >> 64 for r in ranges[6])),
+        "v6_start_lo": array("Q", (r[0] & mask for r in ranges[6])),
+        "v6_end_hi": array("Q", (r[1] >> 64 for r in ranges[6])),
+        "v6_end_lo": array("Q", (r[1] & mask for r in ranges[6])),
+        "v6_record": array("I", (r[2] for r in ranges[6])),
+        "record_strings": array("I", (i for key in records for i in key[:len(STRING_FIELDS)])),
+        "record_coords": array("d", (c for key in records for c in key[len(STRING_FIELDS):])),
+        "string_offsets": array("I", offsets)
+    }
+
+    # Write a sibling temp file and rename it over the target: a running server may have the
+    # old file mapped, and truncating it in place would fault it (SIGBUS)
+    out = tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(output_path)),
+                                      prefix=".", suffix=".tmp", delete=False)
+    try:
+        with out:
+            out.write(HEADER.pack(MAGIC, VERSION, 0, len(ranges[4]), len(ranges[6]), len(records), len(strings)))
+            for name, offset, _, _ in _layout(len(ranges[4]), len(ranges[6]), len(records), len(strings)):
+                out.write(b"\0" * (offset - out.tell()))
+                if name == "strings":
+                    out.write(b"".join(blobs))
+                else:
+                    out.write(data[name].tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(out.name, output_path)
+    except BaseException:
+        os.unlink(out.name)
+        raise
+
+    return {"ipv4_ranges": len(ranges[4]), "ipv6_ranges": len(ranges[6]),
+            "records": len(records), "strings": len(strings)}
+
+class GeoIPDatabase:
+    """Read-only geolocation lookups over a memory-mapped compiled range file.
+
+    The file holds sorted range starts/ends per IP version, a table of
+    deduplicated location records and a string pool, all little-endian and
+    8-byte aligned. Sections are used in place through ``memoryview.cast``;
+    a lookup is a bisect over the mapped starts plus one end check, and
+    decoded records are memoised because many ranges share one record.
+    """
+
+    def __init__(self, path: str, record_cache: int = 65536):
+        if sys.byteorder != "little":
+            raise RuntimeError("Compiled geolocation files are little-endian only")
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+
+        magic, version, _, v4_count, v6_count, record_count, string_count = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a compiled geolocation file")
+        self.counts = {"ipv4_ranges": v4_count, "ipv6_ranges": v6_count, "records": record_count}
+
+        self._sections = {}
+        for name, offset, code, length in _layout(v4_count, v6_count, record_count, string_count):
+            if name == "strings":
+                self._sections[name] = view[offset:]
+            else:
+                size = array(code).itemsize * length
+                self._sections[name] = view[offset:offset + size].cast(code)
+        self._record = lru_cache(maxsize=record_cache)(self._decode_record)
+
+    def _string(self, i: int) -> str:
+        offsets = self._sections["string_offsets"]
+        return bytes(self._sections["strings"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def _decode_record(self, i: int) -> Dict:
+        ids = self._sections["record_strings"]
+        coords = self._sections["record_coords"]
+        width = len(STRING_FIELDS)
+        record = {name: self._string(ids[i * width + j]) or "Unknown" for j, name in enumerate(STRING_FIELDS)}
+        record["latitude"] = coords[i * 2]
+        record["longitude"] = coords[i * 2 + 1]
+        return record
+
+    def _find(self, version: int, value: int) -> Optional[int]:
+        """Get the record index of the range containing an address."""
+        s = self._sections
+        if version == 4:
+            i = bisect_right(s["v4_start"], value) - 1
+            return s["v4_record"][i] if i >= 0 and value <= s["v4_end"][i] else None
+
+        high, low = value >> 64, value & 0xFFFFFFFFFFFFFFFF
+        starts_hi = s["v6_start_hi"]
+        lo_bound = bisect_left(starts_hi, high)
+        hi_bound = bisect_right(starts_hi, high, lo_bound)
+        i = bisect_right(s["v6_start_lo"], low, lo_bound, hi_bound) - 1
+        if i < 0:
+            return None
+        end = (s["v6_end_hi"][i] << 64) | s["v6_end_lo"][i]
+        return s["v6_record"][i] if value <= end else None
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        """Get the location of an address, or None if no range covers it."""
+        parsed = parse_ip(ip_address)
+        if parsed is None:
+            return None
+        record = self._find(*parsed)
+        return dict(self._record(record)) if record is not None else None
+
+    def lookup_many(self, ip_addresses: Sequence[str]) -> List[Optional[Dict]]:
+        """Get ``lookup`` results for many addresses, in input order.
+
+        IPv4 addresses are searched together with one ``searchsorted`` over
+        the mapped range starts.
+        """
+        results: List[Optional[Dict]] = [None] * len(ip_addresses)
+        positions, values = [], []
+        for i, ip_address in enumerate(ip_addresses):
+            parsed = parse_ip(ip_address)
+            if parsed is None:
+                continue
+            if parsed[0] == 4:
+                positions.append(i)
+                values.append(parsed[1])
+            else:
+                record = self._find(*parsed)
+                results[i] = dict(self._record(record)) if record is not None else None
+        if not values or not self.counts["ipv4_ranges"]:
+            return results
+
+        s = self._sections
+        values = np.array(values, dtype=np.uint32)
+        index = np.searchsorted(np.frombuffer(s["v4_start"], dtype=np.uint32), values, "right") - 1
+        ends = np.frombuffer(s["v4_end"], dtype=np.uint32)
+        found = (index >= 0) & (values <= ends[np.maximum(index, 0)])
+        records = np.frombuffer(s["v4_record"], dtype=np.uint32)
+        for j in np.flatnonzero(found):
+            results[positions[j]] = dict(self._record(int(records[index[j]])))
+        return results
+
+    def close(self):
+        self._sections.clear()
+        self._map.close()
+        self._file.close()
+
+class MaxMindDatabase:
+    """Lookups in a MaxMind ``.mmdb`` file via the optional maxminddb package."""
+
+    def __init__(self, path: str):
+        try:
+            import maxminddb
+        except ImportError as e:
+            raise ImportError("Reading .mmdb files needs the maxminddb package") from e
+        self.path = path
+        self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+        self.counts = {"node_count": self._reader.metadata().node_count}
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        try:
+            data = self._reader.get(ip_address)
+        except ValueError:
+            return None
+        if not data:
+            return None
+
+        def name(section) -> str:
+            return (section or {}).get("names", {}).get("en", "Unknown")
+
+        location = data.get("location", {})
+        asn = data.get("autonomous_system_number")
+        organization = data.get("autonomous_system_organization") or data.get("traits", {}).get("organization")
+        return {
+            "country": name(data.get("country")),
+            "region": name((data.get("subdivisions") or [None])[0]),
+            "city": name(data.get("city")),
+            "isp": data.get("traits", {}).get("isp") or organization or "Unknown",
+            "organization": organization or "Unknown",
+            "asn": f"AS{asn}" if asn else "Unknown",
+            "timezone": location.get("time_zone", "Unknown"),
+            "latitude": location.get("latitude", 0.0),
+            "longitude": location.get("longitude", 0.0)
+        }
+
+    def lookup_many(self, ip_addresses: Sequence[str]) -> List[Optional[Dict]]:
+        return [self.lookup(ip_address) for ip_address in ip_addresses]
+
+    def close(self):
+        self._reader.close()
+
+def open_geoip(path: str):
+    """Open a compiled range file or a MaxMind .mmdb by suffix."""
+    return MaxMindDatabase(path) if Path(path).suffix == ".mmdb" else GeoIPDatabase(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a geolocation range CSV into a lookup file.")
+    parser.add_argument("csv", help="CSV with start_ip,end_ip (or network) and location columns")
+    parser.add_argument("output", help="Compiled file to write")
+    args = parser.parse_args()
+    print(compile_csv(args.csv, args.output))
+
+if __name__ == "__main__":
+    main()
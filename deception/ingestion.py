@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+@dataclass
+class AccessEvent:
+    """Compact record of a single decoy file access."""
+    filename: str
+    ip_address: str
+    user_agent: str
+    header_count: int
+    file_size: int
+    received_at: float = field(default_factory=time.time)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    results: Dict = field(default_factory=dict)
+
+Stage = Callable[[List[AccessEvent]], Awaitable[None]]
+
+class IngestionPipeline:
+    """Bounded in-process event queue drained in batches by background workers.
+
+    Request handlers call ``publish`` and return immediately; worker tasks pop
+    up to ``batch_size`` events at a time and run them through each stage in
+    order. When the queue is full the backpressure policy decides whether the
+    new event is dropped (``drop_newest``), the oldest queued event is evicted
+    (``drop_oldest``) or the publisher waits up to ``block_timeout`` seconds
+    for space (``block``).
+    """
+
+    BACKPRESSURE_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+    def __init__(self,
+                 stages: List[Tuple[str, Stage]],
+                 max_depth: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 policy: Optional[str] = None,
+                 block_timeout: Optional[float] = None):
+        self.stages = stages
+        self.max_depth = max_depth or int(os.getenv("INGEST_QUEUE_DEPTH", "10000"))
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "100"))
+        self.worker_count = workers or int(os.getenv("INGEST_WORKERS", "2"))
+        self.policy = policy or os.getenv("INGEST_BACKPRESSURE", "drop_oldest")
+        self.block_timeout = block_timeout if block_timeout is not None else float(os.getenv("INGEST_BLOCK_TIMEOUT", "0.05"))
+
+        if self.policy not in self.BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {self.policy}")
+
+        self._events: Deque[AccessEvent] = deque()
+        self._not_empty: Optional[asyncio.Event] = None
+        self._not_full: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self._stopping = False
+
+        self._metrics = {
+            "enqueued": 0,
+            "processed": 0,
+            "dropped": 0,
+            "batches": 0,
+            "stage_errors": {name: 0 for name, _ in stages},
+            "stage_seconds": {name: 0.0 for name, _ in stages},
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+            "avg_lag_seconds": 0.0
+        }
+
+    async def start(self):
+        """Start the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._accepting = True
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"ingest-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stop accepting events, let the workers finish the queue and any batch in flight.
+
+        Workers exit once the queue is empty; only those still busy when
+        ``drain_timeout`` expires are cancelled.
+        """
+        self._accepting = False
+        if not self._workers:
+            return
+        self._stopping = True
+        self._not_empty.set()
+        _, pending = await asyncio.wait(self._workers, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def publish(self, event: AccessEvent) -> bool:
+        """Queue an access event. Returns False if it was dropped."""
+        if not self._accepting:
+            self._metrics["dropped"] += 1
+            return False
+
+        if len(self._events) >= self.max_depth:
+            if self.policy == "drop_newest":
+                self._metrics["dropped"] += 1
+                return False
+            elif self.policy == "drop_oldest":
+                self._events.popleft()
+                self._metrics["dropped"] += 1
+            else:
+                self._not_full.clear()
+                try:
+                    await asyncio.wait_for(self._not_full.wait(), timeout=self.block_timeout)
+                except asyncio.TimeoutError:
+                    self._metrics["dropped"] += 1
+                    return False
+                if len(self._events) >= self.max_depth:
+                    self._metrics["dropped"] += 1
+                    return False
+
+        event.enqueued_at = time.monotonic()
+        self._events.append(event)
+        self._metrics["enqueued"] += 1
+        self._not_empty.set()
+        return True
+
+    async def _worker(self):
+        """Pop batches off the queue and run them through every stage."""
+        while True:
+            await self._not_empty.wait()
+            if not self._events:
+                if self._stopping:
+                    return
+                self._not_empty.clear()
+                continue
+
+            batch = []
+            while self._events and len(batch) < self.batch_size:
+                batch.append(self._events.popleft())
+            if not self._events and not self._stopping:
+                self._not_empty.clear()
+            self._not_full.set()
+
+            self._record_lag(time.monotonic() - batch[0].enqueued_at)
+
+            for name, stage in self.stages:
+                started = time.perf_counter()
+                try:
+                    await stage(batch)
+                except Exception as e:
+                    self._metrics["stage_errors"][name] += 1
+                    print(f"Ingestion stage '{name}' failed: {e}")
+                self._metrics["stage_seconds"][name] += time.perf_counter() - started
+
+            self._metrics["processed"] += len(batch)
+            self._metrics["batches"] += 1
+
+    def _record_lag(self, lag: float):
+        """Track how long the oldest event of a batch waited in the queue."""
+        self._metrics["last_lag_seconds"] = lag
+        self._metrics["max_lag_seconds"] = max(self._metrics["max_lag_seconds"], lag)
+        avg = self._metrics["avg_lag_seconds"]
+        self._metrics["avg_lag_seconds"] = lag if avg == 0 else 0.9 * avg + 0.1 * lag
+
+    def get_metrics(self) -> Dict:
+        """Get queue depth, throughput and lag metrics."""
+        oldest_age = time.monotonic() - self._events[0].enqueued_at if self._events else 0.0
+        return {
+            "queue_depth": len(self._events),
+            "max_depth": self.max_depth,
+            "backpressure_policy": self.policy,
+            "workers": len(self._workers),
+            "batch_size": self.batch_size,
+            "oldest_event_age_seconds": round(oldest_age, 4),
+            **{key: round(value, 4) if isinstance(value, float) else value
+               for key, value in self._metrics.items()
+               if key not in ("stage_errors", "stage_seconds")},
+            "stage_errors": dict(self._metrics["stage_errors"]),
+            "stage_seconds": {name: round(seconds, 4)
+                              for name, seconds in self._metrics["stage_seconds"].items()}
+        }
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Threat levels from least to most severe; merges keep the most severe
+THREAT_LEVELS = ("unknown", "low", "medium", "high", "critical")
+_LEVEL_RANK = {level: rank for rank, level in enumerate(THREAT_LEVELS)}
+
+def _rank_sql(column: str) -> str:
+    cases = " ".join(f"WHEN '{level}' THEN {rank}" for level, rank in _LEVEL_RANK.items())
+    return f"(CASE {column} {cases} ELSE 0 END)"
+
+UPSERT_SQL = f'''
+    INSERT INTO threat_intel
+    (ip_address, threat_type, confidence_score, first_seen, last_seen, source,
+     additional_info, last_seen_ts, hit_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (ip_address) DO UPDATE SET
+        threat_type = CASE WHEN {_rank_sql("excluded.threat_type")} > {_rank_sql("threat_intel.threat_type")}
+                           THEN excluded.threat_type ELSE threat_intel.threat_type END,
+        confidence_score = excluded.confidence_score,
+        last_seen = excluded.last_seen,
+        last_seen_ts = MAX(COALESCE(threat_intel.last_seen_ts, 0), excluded.last_seen_ts),
+        additional_info = (
+            SELECT json_group_array(json(value)) FROM (
+                SELECT value FROM json_each(COALESCE(threat_intel.additional_info, '[]'))
+                UNION
+                SELECT value FROM json_each(excluded.additional_info)
+            )
+        ),
+        hit_count = threat_intel.hit_count + excluded.hit_count
+'''
+
+class _Sighting:
+    """Merged, not yet written sightings of one IP."""
+    __slots__ = ("threat_level", "confidence", "first_seen", "last_seen", "last_ts", "hits", "indicators")
+
+    def __init__(self, now: datetime, now_ms: int):
+        self.threat_level = "unknown"
+        self.confidence = 1.0
+        self.first_seen = now
+        self.last_seen = now
+        self.last_ts = now_ms
+        self.hits = 0
+        self.indicators: Dict[Tuple, Dict] = {}
+
+    def merge(self, analysis: Dict, now: datetime, now_ms: int):
+        if _LEVEL_RANK.get(analysis["threat_level"], 0) > _LEVEL_RANK.get(self.threat_level, 0):
+            self.threat_level = analysis["threat_level"]
+        self.confidence = analysis["reputation_score"] / 100
+        self.last_seen = now
+        self.last_ts = now_ms
+        self.hits += 1
+        for indicator in analysis["threat_indicators"]:
+            key = (indicator.get("feed"), indicator.get("type"), indicator.get("network"))
+            self.indicators.setdefault(key, indicator)
+
+class ThreatIntelWriter:
+    """Write-behind buffer for threat_intel rows.
+
+    ``record`` merges each analysis into an in-memory entry per IP: hit
+    count, last seen, the most severe threat level, the latest reputation
+    score and the union of indicators. A background flusher upserts the
+    merged entries every ``flush_interval`` seconds with one multi-row
+    ``ON CONFLICT DO UPDATE``, which keeps ``first_seen``, adds to
+    ``hit_count`` and applies the same merge rules against the stored row.
+    Reaching ``max_dirty`` IPs triggers an early flush; ``stop`` flushes
+    whatever is left.
+    """
+
+    def __init__(self, storage, flush_interval: Optional[float] = None, max_dirty: Optional[int] = None):
+        self.storage = storage
+        self.flush_interval = flush_interval or float(os.getenv("THREAT_INTEL_FLUSH_SECONDS", "5"))
+        self.max_dirty = max_dirty or int(os.getenv("THREAT_INTEL_MAX_DIRTY", "5000"))
+        self._dirty: Dict[str, _Sighting] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"recorded": 0, "flushes": 0, "rows_written": 0}
+
+    def start(self):
+        """Start the background flusher."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="threat-intel-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out pending sightings."""
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Threat intel flush failed: {e}")
+
+    def record(self, ip_address: str, analysis: Dict):
+        """Merge one analysis of an IP into its pending entry."""
+        self.record_many(((ip_address, analysis),))
+
+    def record_many(self, analyses: Iterable[Tuple[str, Dict]]):
+        """Merge several (ip, analysis) pairs under one lock."""
+        now = datetime.now()
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            for ip_address, analysis in analyses:
+                sighting = self._dirty.get(ip_address)
+                if sighting is None:
+                    sighting = self._dirty[ip_address] = _Sighting(now, now_ms)
+                sighting.merge(analysis, now, now_ms)
+                self._stats["recorded"] += 1
+            full = len(self._dirty) >= self.max_dirty
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Queue one upsert per pending IP. Returns the number of rows."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        rows: List[tuple] = [(
+            ip_address,
+            sighting.threat_level,
+            sighting.confidence,
+            sighting.first_seen,
+            sighting.last_seen,
+            "internal_analysis",
+            json.dumps(list(sighting.indicators.values())),
+            sighting.last_ts,
+            sighting.hits
+        ) for ip_address, sighting in dirty.items()]
+        self.storage.executemany(UPSERT_SQL, rows)
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += len(rows)
+        return len(rows)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._dirty)
+        return {
+            "pending": pending,
+            "flush_interval_seconds": self.flush_interval,
+            "max_dirty": self.max_dirty,
+            **self._stats
+        }
@@ -0,0 +1,249 @@
+import ipaddress
+import socket
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from bloom import IPSet
+
+class FeedTag(NamedTuple):
+    """What a feed says about the networks it lists."""
+    feed: str
+    threat_type: str
+    confidence: float
+    source: str
+    description: str
+
+@dataclass
+class _PrefixGroup:
+    """All networks of one IP version and prefix length, sorted by prefix value.
+
+    Prefixes longer than 64 bits are split into sorted (high, low) halves.
+    """
+    prefix_len: int
+    shift: int
+    keys: array
+    tags: array
+    low: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def find(self, key: int) -> Tuple[int, int]:
+        """Get the [start, end) range of entries with this key."""
+        if self.low is None:
+            start = bisect_left(self.keys, key)
+            return start, bisect_right(self.keys, key, start)
+        high, low = key >> 64, key & 0xFFFFFFFFFFFFFFFF
+        start = bisect_left(self.keys, high)
+        end = bisect_right(self.keys, high, start)
+        if start == end:
+            return start, start
+        start = bisect_left(self.low, low, start, end)
+        return start, bisect_right(self.low, low, start, end)
+
+    def memory_bytes(self) -> int:
+        arrays = (self.keys, self.tags) if self.low is None else (self.keys, self.low, self.tags)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+_V4_MAPPED = bytes(10) + b"\xff\xff"
+
+def parse_ip(ip_address: str) -> Optional[Tuple[int, int]]:
+    """Get (version, integer) for an address; IPv4-mapped IPv6 counts as IPv4."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip_address), "big")
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip_address)
+    except OSError:
+        return None
+    if packed[:12] == _V4_MAPPED:
+        return 4, int.from_bytes(packed[12:], "big")
+    return 6, int.from_bytes(packed, "big")
+
+def _format_network(version: int, network: int, prefix_len: int) -> str:
+    if version == 4:
+        return f"{socket.inet_ntop(socket.AF_INET, network.to_bytes(4, 'big'))}/{prefix_len}"
+    return f"{socket.inet_ntop(socket.AF_INET6, network.to_bytes(16, 'big'))}/{prefix_len}"
+
+class IPIndex:
+    """Immutable longest-prefix-match index over IPv4 and IPv6 feed networks.
+
+    Networks are grouped by (version, prefix length). Each group is a sorted
+    array of prefix values (``array('I')`` up to /32, ``array('Q')`` up to
+    /64, two of those beyond) with a parallel array of tag ids, so a prefix
+    costs 6 bytes for IPv4 and 10 or 18 bytes for IPv6. A lookup does one binary
+    search per prefix length present and reports, for every feed that lists
+    the address, its most specific matching network. Very large single-address
+    feeds are kept out of the arrays as exact sets (see ``bloom.IPSet``) that
+    are checked after the prefix groups.
+    """
+
+    def __init__(self, groups: Dict[int, List[_PrefixGroup]], tags: List[FeedTag],
+                 exact_sets: Optional[List[Tuple[int, "IPSet"]]] = None):
+        # Longest prefixes first, so the first hit per feed is its longest match
+        self._groups = {version: sorted(version_groups, key=lambda g: g.prefix_len, reverse=True)
+                        for version, version_groups in groups.items()}
+        self.tags = tags
+        self._exact_sets = exact_sets or []
+        self._feed_order = {}
+        for tag in tags:
+            self._feed_order.setdefault(tag.feed, len(self._feed_order))
+
+    def lookup(self, ip_address: str) -> List[Dict]:
+        """Get one hit per feed listing the address, in feed order."""
+        parsed = parse_ip(ip_address)
+        if parsed is None:
+            return []
+        version, value = parsed
+
+        hits: Dict[str, Dict] = {}
+        for group in self._groups.get(version, ()):
+            key = value >> group.shift
+            start, end = group.find(key)
+            self._add_hits(hits, version, group, key, start, end)
+        for tag_id, exact in self._exact_sets:
+            tag = self.tags[tag_id]
+            if tag.feed not in hits and exact.contains(version, value):
+                hits[tag.feed] = self._hit(tag, _format_network(version, value, 32 if version == 4 else 128))
+        return self._ordered(hits)
+
+    def lookup_many(self, ip_addresses: Sequence[str]) -> List[List[Dict]]:
+        """Get ``lookup`` results for many addresses, in input order.
+
+        IPv4 addresses are matched with one vectorised ``searchsorted`` per
+        prefix group instead of a binary search per address and group.
+        """
+        results: List[List[Dict]] = [[] for _ in ip_addresses]
+        positions, values = [], []
+        for i, ip_address in enumerate(ip_addresses):
+            parsed = parse_ip(ip_address)
+            if parsed is None:
+                continue
+            if parsed[0] == 4:
+                positions.append(i)
+                values.append(parsed[1])
+            else:
+                results[i] = self.lookup(ip_address)
+        if not values:
+            return results
+
+        values = np.array(values, dtype=np.uint64)
+        hits: Dict[int, Dict[str, Dict]] = {}
+        for group in self._groups.get(4, ()):
+            keys = np.frombuffer(group.keys, dtype=f"u{group.keys.itemsize}").astype(np.uint64)
+            wanted = values >> np.uint64(group.shift)
+            starts = np.searchsorted(keys, wanted, "left")
+            ends = np.searchsorted(keys, wanted, "right")
+            for j in np.flatnonzero(ends > starts):
+                self._add_hits(hits.setdefault(positions[j], {}), 4, group, int(wanted[j]),
+                               int(starts[j]), int(ends[j]))
+        for tag_id, exact in self._exact_sets:
+            tag = self.tags[tag_id]
+            for j in np.flatnonzero(exact.contains_many_v4(values)):
+                position_hits = hits.setdefault(positions[j], {})
+                if tag.feed not in position_hits:
+                    position_hits[tag.feed] = self._hit(tag, _format_network(4, int(values[j]), 32))
+        for position, position_hits in hits.items():
+            results[position] = self._ordered(position_hits)
+        return results
+
+    def _add_hits(self, hits: Dict[str, Dict], version: int, group: _PrefixGroup, key: int, start: int, end: int):
+        """Record entries [start, end) of a group for feeds without a longer match."""
+        for i in range(start, end):
+            tag = self.tags[group.tags[i]]
+            if tag.feed not in hits:
+                hits[tag.feed] = self._hit(tag, _format_network(version, key << group.shift, group.prefix_len))
+
+    @staticmethod
+    def _hit(tag: FeedTag, network: str) -> Dict:
+        return {
+            "type": tag.threat_type,
+            "confidence": tag.confidence,
+            "source": tag.source,
+            "description": tag.description,
+            "feed": tag.feed,
+            "network": network
+        }
+
+    def _ordered(self, hits: Dict[str, Dict]) -> List[Dict]:
+        return sorted(hits.values(), key=lambda hit: self._feed_order[hit["feed"]])
+
+    def contains(self, ip_address: str, threat_type: Optional[str] = None) -> bool:
+        """Check whether any feed (optionally of one threat type) lists the address."""
+        return any(threat_type is None or hit["type"] == threat_type for hit in self.lookup(ip_address))
+
+    def __len__(self) -> int:
+        return (sum(len(group) for version_groups in self._groups.values() for group in version_groups)
+                + sum(len(exact) for _, exact in self._exact_sets))
+
+    def get_stats(self) -> Dict:
+        """Get prefix counts per version/length and memory used by the arrays and filters."""
+        return {
+            "prefixes": len(self),
+            "memory_bytes": sum(group.memory_bytes()
+                                for version_groups in self._groups.values() for group in version_groups)
+                            + sum(exact.get_stats()["filter_bytes"] for _, exact in self._exact_sets),
+            "prefix_lengths": {
+                f"v{version}": {group.prefix_len: len(group) for group in version_groups}
+                for version, version_groups in self._groups.items()
+            },
+            "exact_sets": {self.tags[tag_id].feed: exact.get_stats() for tag_id, exact in self._exact_sets}
+        }
+
+class IPIndexBuilder:
+    """Collects feed networks and builds an IPIndex."""
+
+    def __init__(self):
+        self._tags: Dict[FeedTag, int] = {}
+        self._entries: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        self._exact_sets: List[Tuple[int, "IPSet"]] = []
+        self.rejected = 0
+        self.memory_bytes = 0  # Array bytes the entries added so far will take
+
+    def add(self, network: str, tag: FeedTag) -> bool:
+        """Add an address or CIDR network. Returns False if it does not parse."""
+        try:
+            parsed = ipaddress.ip_network(network.strip(), strict=False)
+        except ValueError:
+            self.rejected += 1
+            return False
+        if parsed.version == 6 and parsed.prefixlen >= 96 and parsed.network_address.ipv4_mapped is not None:
+            parsed = ipaddress.ip_network((parsed.network_address.ipv4_mapped, parsed.prefixlen - 96))
+
+        tag_id = self._tags.setdefault(tag, len(self._tags))
+        shift = parsed.max_prefixlen - parsed.prefixlen
+        self.memory_bytes += (4 if parsed.prefixlen <= 32 else 8 if parsed.prefixlen <= 64 else 16) + 2
+        self._entries.setdefault((parsed.version, parsed.prefixlen), []).append(
+            (int(parsed.network_address) >> shift, tag_id))
+        return True
+
+    def add_exact_set(self, exact: "IPSet", tag: FeedTag):
+        """Add a compiled single-address feed without copying it into the arrays."""
+        self._exact_sets.append((self._tags.setdefault(tag, len(self._tags)), exact))
+        self.memory_bytes += exact.get_stats()["filter_bytes"]
+
+    def build(self) -> IPIndex:
+        tag_code = "H" if len(self._tags) <= 0xFFFF else "I"
+        groups: Dict[int, List[_PrefixGroup]] = {}
+        for (version, prefix_len), entries in self._entries.items():
+            entries = sorted(set(entries))
+            max_prefixlen = 32 if version == 4 else 128
+            tags = array(tag_code, (tag_id for _, tag_id in entries))
+            low = None
+            if prefix_len <= 32:
+                keys = array("I", (key for key, _ in entries))
+            elif prefix_len <= 64:
+                keys = array("Q", (key for key, _ in entries))
+            else:
+                keys = array("Q", (key >> 64 for key, _ in entries))
+                low = array("Q", (key & 0xFFFFFFFFFFFFFFFF for key, _ in entries))
+            groups.setdefault(version, []).append(
+                _PrefixGroup(prefix_len, max_prefixlen - prefix_len, keys, tags, low))
+
+        return IPIndex(groups, sorted(self._tags, key=self._tags.get), self._exact_sets)
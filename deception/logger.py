@@ -1,92 +1,54 @@
-import sqlite3
 import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from storage import get_storage, epoch_ms
 
 class DatabaseLogger:
     def __init__(self, db_path: str = "honeypot.db"):
         self.db_path = db_path
+        self.storage = get_storage(db_path)
         self._init_db()
 
     def _init_db(self):
         """Initialize the SQLite database with required tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Create files table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            content_type TEXT,
-            size INTEGER,
-            is_accessed BOOLEAN DEFAULT FALSE
-        )
-        ''')
-
-        # Create access_logs table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS access_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            file_id INTEGER,
-            ip_address TEXT,
-            user_agent TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (file_id) REFERENCES files (id)
-        )
-        ''')
-
-        conn.commit()
-        conn.close()
+        self.storage.migrate()
 
     def log_file_creation(self, filename: str, content_type: str, size: int) -> int:
         """Log a newly created honeypot file."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        return self.storage.execute_and_wait('''
         INSERT INTO files (filename, content_type, size)
         VALUES (?, ?, ?)
         ''', (filename, content_type, size))
-        
-        file_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return file_id
+
+    def log_file_creations(self, files: List[Dict]) -> None:
+        """Log many newly created honeypot files in one group commit."""
+        self.storage.executemany('''
+        INSERT INTO files (filename, content_type, size)
+        VALUES (?, ?, ?)
+        ''', [(f["filename"], f["content_type"], f["size"]) for f in files])
 
     def log_file_access(self, file_id: int, ip_address: str, user_agent: Optional[str] = None) -> None:
         """Log when a honeypot file is accessed."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.storage.execute('''
+        INSERT INTO access_logs (file_id, ip_address, user_agent, ts)
+        VALUES (?, ?, ?, ?)
+        ''', (file_id, ip_address, user_agent, epoch_ms()))
         
-        cursor.execute('''
-        INSERT INTO access_logs (file_id, ip_address, user_agent)
-        VALUES (?, ?, ?)
-        ''', (file_id, ip_address, user_agent))
-        
-        cursor.execute('''
+        self.storage.execute('''
         UPDATE files SET is_accessed = TRUE WHERE id = ?
         ''', (file_id,))
-        
-        conn.commit()
-        conn.close()
 
     def get_access_stats(self) -> Dict[str, Any]:
         """Get statistics about file accesses."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Get total accesses
-        cursor.execute('SELECT COUNT(*) FROM access_logs')
-        total_accesses = cursor.fetchone()[0]
+        total_accesses = self.storage.query_one('SELECT COUNT(*) FROM access_logs')[0]
         
         # Get unique IPs
-        cursor.execute('SELECT COUNT(DISTINCT ip_address) FROM access_logs')
-        unique_ips = cursor.fetchone()[0]
+        unique_ips = self.storage.query_one('SELECT COUNT(DISTINCT ip_address) FROM access_logs')[0]
         
         # Get most accessed files
-        cursor.execute('''
+        most_accessed = self.storage.query('''
         SELECT f.filename, COUNT(a.id) as access_count
         FROM files f
         JOIN access_logs a ON f.id = a.file_id
@@ -94,9 +56,6 @@ class DatabaseLogger:
         ORDER BY access_count DESC
         LIMIT 5
         ''')
-        most_accessed = cursor.fetchall()
-        
-        conn.close()
         
         return {
             'total_accesses': total_accesses,
@@ -106,17 +65,10 @@ class DatabaseLogger:
 
     def get_recent_accesses(self, limit: int = 10) -> list:
         """Get recent file access logs."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        return self.storage.query('''
         SELECT a.timestamp, f.filename, a.ip_address, a.user_agent
         FROM access_logs a
         JOIN files f ON a.file_id = f.id
-        ORDER BY a.timestamp DESC
+        ORDER BY a.ts DESC
         LIMIT ?
-        ''', (limit,))
-        
-        recent = cursor.fetchall()
-        conn.close()
-        return recent 
\ No newline at end of file
+        ''', (limit,)) 
\ No newline at end of file
@@ -1,61 +1,125 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pathlib import Path
 import uvicorn
-from typing import List, Dict
+import asyncio
+import codecs
+import json
+import mimetypes
+from typing import AsyncIterator, List, Dict, Optional
 import os
 from datetime import datetime
 import random
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from file_generator import FakeFileGenerator
+from file_generator import FakeFileGenerator, TEXT_BACKENDS
+from generator_service import GeneratorClient
+from reservoir import SnippetReservoir
+from generation_jobs import GenerationJobs, JobQueueFull, TERMINAL
+from virtual_fs import VirtualFileSystem
 from logger import DatabaseLogger
 from alert import AlertManager
 from attack_simulator import AttackSimulator
 from threat_intelligence import ThreatIntelligence
 from network_analyzer import NetworkAnalyzer
+from ingestion import IngestionPipeline, AccessEvent
+from bulk_import import BulkImporter
+import storage
+from async_db import AsyncDataAccess, QueryTimeout
 
 app = FastAPI(title="Honeypot File Trap System")
 
 # Initialize components
-file_generator = FakeFileGenerator()
+# The text model runs in a shared generator_service process started on first use,
+# so API workers never import torch; GENERATOR_MODE=local loads it in-process instead
+text_model = GeneratorClient() if os.getenv("GENERATOR_MODE", "service") == "service" else None
+file_generator = FakeFileGenerator(os.getenv("GENERATOR_MODEL", "gpt2"), text_model=text_model)
+# Pre-generated {text} snippets, so creating files does not wait on the model
+reservoir = SnippetReservoir(file_generator)
 logger = DatabaseLogger()
 alert_manager = AlertManager()
 attack_simulator = AttackSimulator()
 threat_intel = ThreatIntelligence()
 network_analyzer = NetworkAnalyzer()
+data_access = AsyncDataAccess()
+# Batch IP analysis gets its own pool and a per-chunk deadline, so it neither
+# starves the read endpoints nor runs under their short query timeout
+batch_access = AsyncDataAccess(
+    max_workers=int(os.getenv("THREAT_BATCH_WORKERS", "2")),
+    max_pending=int(os.getenv("THREAT_BATCH_WORKERS", "2")) * 4,
+    default_timeout=float(os.getenv("THREAT_BATCH_CHUNK_TIMEOUT", "60"))
+)
+bulk_importer = BulkImporter(network_analyzer)
+generation_jobs = GenerationJobs(file_generator, on_files=logger.log_file_creations)
+# Decoys advertised by name and rendered on access, never written to app/static
+virtual_fs = VirtualFileSystem(file_generator, logger.storage)
 
-# Mount static files directory
+# Static files directory (served by serve_file so every access is recorded)
 static_dir = Path("app/static")
 static_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+# Files listed by name in a generation alert; bulk runs are summarised
+ALERT_FILE_LIST = 50
+GENERATION_EVENTS_POLL_SECONDS = 0.25
+
+async def _create_files(count: int, backend: str = "gpt2") -> Dict:
+    """Create files from the snippet reservoir and queue a generation job for the rest.
+
+    Returns the ready files, the number still pending and the id of the job
+    generating them (None if nothing is pending). Raises a 429 HTTPException
+    if the rest cannot be queued; the files already created are logged first.
+    """
+    if backend == "markov":
+        # The n-gram backend is fast enough for bulk counts without the reservoir
+        files = await asyncio.to_thread(file_generator.generate_multiple_files, count, backend)
+        return {"files": files, "pending": 0, "job_id": None}
+    files, missing = reservoir.create_files(count)
+    job_id = None
+    if missing:
+        # Reservoir ran dry: the model generates the rest in the background, not in this request
+        try:
+            job_id = generation_jobs.submit(missing, backend)["job_id"]
+        except JobQueueFull as e:
+            logger.log_file_creations(files)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Created {len(files)} files; the remaining {missing} were not queued: {e}")
+    return {"files": files, "pending": missing, "job_id": job_id}
 
 @app.post("/api/generate-files")
-async def generate_files(count: int = 5) -> List[Dict]:
-    """Generate fake honeypot files."""
-    try:
-        files = file_generator.generate_multiple_files(count)
-        for file_info in files:
-            logger.log_file_creation(
-                file_info["filename"],
-                file_info["content_type"],
-                file_info["size"]
-            )
+async def generate_files(count: int = 5, backend: str = "gpt2") -> Dict:
+    """Generate fake honeypot files.
+
+    Files the snippet reservoir cannot cover right away are generated by a
+    background job; follow it at /api/generation-jobs/{job_id}.
+    """
+    if backend not in TEXT_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"backend must be one of {', '.join(TEXT_BACKENDS)}")
+    try:
+        created = await _create_files(count, backend)
+        files = created["files"]
+        logger.log_file_creations(files)
         
         # Send email alert for new file generation
         if files:
-            file_list = "\n".join([f"- {file['filename']} ({file['category']}) - {file['size']} bytes" for file in files])
+            file_list = "\n".join([f"- {file['filename']} ({file['category']}) - {file['size']} bytes"
+                                   for file in files[:ALERT_FILE_LIST]])
+            if len(files) > ALERT_FILE_LIST:
+                file_list += f"\n- ... and {len(files) - ALERT_FILE_LIST} more"
+            pending_line = ""
+            if created["pending"]:
+                pending_line = (f"Queued for background generation: {created['pending']} files "
+                                f"(job {created['job_id']})\n")
             alert_message = f"""
 New honeypot files have been generated:
 
 {file_list}
 
 Total files generated: {len(files)}
-Generation time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+{pending_line}Generation time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 These files are now active and ready to trap potential attackers.
 """
@@ -66,17 +130,131 @@ These files are now active and ready to trap potential attackers.
                 severity="low"
             )
         
-        return files
+        return created
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _alert_severity(threat_analysis: Dict) -> str:
+    """Determine alert severity based on threat analysis."""
+    if threat_analysis["threat_level"] == "critical":
+        return "critical"
+    elif threat_analysis["threat_level"] == "high":
+        return "high"
+    elif threat_analysis["reputation_score"] < 50:
+        return "medium"
+    return "low"
+
+def _analyze_events(events: List[AccessEvent]):
+    """Run threat and network analysis for a batch of access events."""
+    for event in events:
+        threat_intel.reputation.observe_access(event.ip_address, event.user_agent, event.received_at)
+        event.results["threat_analysis"] = threat_intel.analyze_ip(event.ip_address)
+        event.results["network_analysis"] = network_analyzer.analyze_connection(
+            source_ip=event.ip_address,
+            dest_ip="127.0.0.1",  # Honeypot server IP
+            source_port=random.randint(1024, 65535),
+            dest_port=8000,
+            protocol="HTTP",
+            bytes_sent=event.header_count,
+            bytes_received=event.file_size
+        )
+        threat_intel.reputation.observe_connection(
+            event.ip_address, event.results["network_analysis"]["analysis"]["threat_score"], event.received_at)
+
+def _log_events(events: List[AccessEvent]):
+    """Log a batch of access events."""
+    for event in events:
+        logger.log_file_access(
+            file_id=1,  # You'll need to implement a way to get the file_id
+            ip_address=event.ip_address,
+            user_agent=event.user_agent
+        )
+
+async def analysis_stage(events: List[AccessEvent]):
+    """Ingestion stage: threat and network analysis."""
+    await asyncio.to_thread(_analyze_events, events)
+
+async def logging_stage(events: List[AccessEvent]):
+    """Ingestion stage: access logging."""
+    await asyncio.to_thread(_log_events, events)
+
+async def alert_stage(events: List[AccessEvent]):
+    """Send one alert per source IP for a batch of access events."""
+    by_ip: Dict[str, List[AccessEvent]] = {}
+    for event in events:
+        if "threat_analysis" in event.results:
+            by_ip.setdefault(event.ip_address, []).append(event)
+
+    for ip_address, ip_events in by_ip.items():
+        first = ip_events[0]
+        threat_analysis = first.results["threat_analysis"]
+        severity = _alert_severity(threat_analysis)
+        filenames = [event.filename for event in ip_events]
+
+        await alert_manager.send_alert(
+            title=f"Honeypot File Accessed - {severity.upper()} THREAT",
+            message=f"File '{', '.join(filenames)}' was accessed by potentially malicious actor",
+            severity=severity,
+            additional_data={
+                "ip_address": ip_address,
+                "user_agent": first.user_agent,
+                "filename": filenames[0],
+                "access_count": len(ip_events),
+                "threat_level": threat_analysis["threat_level"],
+                "reputation_score": threat_analysis["reputation_score"],
+                "geolocation": threat_analysis["geolocation"],
+                "threat_indicators": threat_analysis["threat_indicators"],
+                "network_analysis": first.results["network_analysis"],
+                "timestamp": datetime.fromtimestamp(first.received_at).isoformat()
+            }
+        )
+
+ingestion = IngestionPipeline(stages=[
+    ("analysis", analysis_stage),
+    ("logging", logging_stage),
+    ("alerting", alert_stage)
+])
+
+@app.on_event("startup")
+async def start_ingestion():
+    """Start the access-event ingestion workers."""
+    await ingestion.start()
+    # The reservoir starts refilling on first use, so booting never loads the text model
+    generation_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_ingestion():
+    """Drain queued access events and pending writes before shutting down."""
+    await ingestion.stop()
+    network_analyzer.pattern_detector.stop()
+    network_analyzer.signature_engine.stop()
+    threat_intel.feeds.stop()
+    threat_intel.reputation.stop()
+    threat_intel.writer.stop()
+    reservoir.stop()
+    generation_jobs.stop()
+    if text_model is not None:
+        text_model.close()
+    data_access.shutdown()
+    batch_access.shutdown()
+    storage.close_all()
+
 @app.get("/static/{filename}")
 async def serve_file(filename: str, request: Request):
-    """Serve a static file and log access."""
+    """Serve a static or virtual decoy file and queue the access for analysis."""
     file_path = static_dir / filename
     
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
+    if file_path.is_file():
+        response = FileResponse(file_path)
+        file_size = file_path.stat().st_size
+    else:
+        content = virtual_fs.cached(filename) or await asyncio.to_thread(virtual_fs.load, filename)
+        if content is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        response = Response(content, media_type=mimetypes.guess_type(filename)[0] or "text/plain")
+        file_size = len(content)
     
     # Get client information
     client_ip = request.client.host
@@ -87,65 +265,198 @@ async def serve_file(filename: str, request: Request):
     # Use forwarded IP if available (for proxy/load balancer scenarios)
     actual_ip = x_real_ip or x_forwarded_for or client_ip
     
-    # Analyze the IP for threats
-    threat_analysis = threat_intel.analyze_ip(actual_ip)
-    
-    # Analyze network connection
-    network_analysis = network_analyzer.analyze_connection(
-        source_ip=actual_ip,
-        dest_ip="127.0.0.1",  # Honeypot server IP
-        source_port=random.randint(1024, 65535),
-        dest_port=8000,
-        protocol="HTTP",
-        bytes_sent=len(request.headers),
-        bytes_received=file_path.stat().st_size if file_path.exists() else 0
-    )
-    
-    # Log the access
-    logger.log_file_access(
-        file_id=1,  # You'll need to implement a way to get the file_id
+    # Analysis, logging and alerting run in the ingestion workers
+    await ingestion.publish(AccessEvent(
+        filename=filename,
         ip_address=actual_ip,
-        user_agent=user_agent
-    )
-    
-    # Determine alert severity based on threat analysis
-    severity = "low"
-    if threat_analysis["threat_level"] == "critical":
-        severity = "critical"
-    elif threat_analysis["threat_level"] == "high":
-        severity = "high"
-    elif threat_analysis["reputation_score"] < 50:
-        severity = "medium"
-    
-    # Send alert
-    await alert_manager.send_alert(
-        title=f"Honeypot File Accessed - {severity.upper()} THREAT",
-        message=f"File '{filename}' was accessed by potentially malicious actor",
-        severity=severity,
-        additional_data={
-            "ip_address": actual_ip,
-            "user_agent": user_agent,
-            "filename": filename,
-            "threat_level": threat_analysis["threat_level"],
-            "reputation_score": threat_analysis["reputation_score"],
-            "geolocation": threat_analysis["geolocation"],
-            "threat_indicators": threat_analysis["threat_indicators"],
-            "network_analysis": network_analysis,
-            "timestamp": datetime.now().isoformat()
-        }
-    )
+        user_agent=user_agent,
+        header_count=len(request.headers),
+        file_size=file_size
+    ))
     
-    return FileResponse(file_path)
+    return response
 
 @app.get("/api/stats")
 async def get_stats():
     """Get honeypot statistics."""
-    return logger.get_access_stats()
+    try:
+        return await data_access.run(logger.get_access_stats)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
 
 @app.get("/api/recent-accesses")
 async def get_recent_accesses(limit: int = 10):
     """Get recent file access logs."""
-    return logger.get_recent_accesses(limit)
+    try:
+        return await data_access.run(logger.get_recent_accesses, limit)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+@app.get("/api/ingestion-metrics")
+async def get_ingestion_metrics():
+    """Get access-event queue depth and lag metrics."""
+    return ingestion.get_metrics()
+
+@app.get("/api/generator")
+async def get_generator_status():
+    """Get text model host status, start time and memory."""
+    if text_model is None:
+        return {"mode": "local", **file_generator.text_model.get_stats()}
+    return {"mode": "service", **await asyncio.to_thread(text_model.get_stats)}
+
+@app.get("/api/reservoir")
+async def get_reservoir():
+    """Get decoy snippet reservoir depth, refill rate and hit ratio."""
+    return reservoir.get_stats()
+
+@app.get("/api/storage-metrics")
+async def get_storage_metrics():
+    """Get database writer group-commit statistics."""
+    return {
+        "writer": logger.storage.get_metrics(),
+        "read_executor": data_access.get_metrics()
+    }
+
+@app.get("/api/signatures")
+async def get_signatures():
+    """Get loaded attack signatures with match counts and timings."""
+    return network_analyzer.signature_engine.get_stats()
+
+@app.post("/api/signatures/reload")
+async def reload_signatures():
+    """Recompile attack signatures from the rule files and database."""
+    try:
+        await data_access.run(network_analyzer.signature_engine.reload, True)
+        return network_analyzer.signature_engine.get_stats()
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# A re-score reads and rewrites every stored connection in its range; run one at a time
+rescore_lock = asyncio.Lock()
+
+@app.post("/api/signatures/rescore")
+async def rescore_connections(since: int = 0):
+    """Re-score stored connections since an epoch-ms time with the current signatures."""
+    if rescore_lock.locked():
+        raise HTTPException(status_code=409, detail="A re-score is already running")
+    async with rescore_lock:
+        try:
+            # Pick up rule changes the reloader has not seen yet
+            await asyncio.to_thread(network_analyzer.signature_engine.reload)
+            return await asyncio.to_thread(network_analyzer.rescore_history, since)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/import")
+async def start_import(path: str, format: str = "auto", restart: bool = False):
+    """Start importing a connection log from the import directory."""
+    try:
+        job_id = bulk_importer.start_job(path, format, restart)
+        return bulk_importer.jobs[job_id]
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/api/import/{job_id}")
+async def get_import(job_id: str):
+    """Get progress of a connection log import."""
+    if job_id not in bulk_importer.jobs:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return bulk_importer.jobs[job_id]
+
+@app.post("/api/import/{job_id}/cancel")
+async def cancel_import(job_id: str):
+    """Stop an import after its current chunk; it can be resumed later."""
+    if not bulk_importer.cancel_job(job_id):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return bulk_importer.jobs[job_id]
+
+@app.post("/api/virtual-files")
+async def create_virtual_files(count: int = 1000, category: Optional[str] = None):
+    """Add decoys to the virtual namespace; they are rendered when first accessed."""
+    try:
+        return await asyncio.to_thread(virtual_fs.create, count, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/virtual-files")
+async def list_virtual_files(limit: int = 100, offset: int = 0):
+    """List virtual decoy filenames, e.g. to advertise them."""
+    try:
+        return await data_access.run(virtual_fs.list_files, limit, offset)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+@app.get("/api/virtual-files/stats")
+async def get_virtual_files_stats():
+    """Get virtual decoy count, render time and render cache stats."""
+    return await asyncio.to_thread(virtual_fs.get_stats)
+
+@app.post("/api/generation-jobs", status_code=202)
+async def start_generation_job(count: int = 5, backend: str = "gpt2"):
+    """Queue a file generation job and return its id immediately."""
+    try:
+        return generation_jobs.submit(count, backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+@app.get("/api/generation-jobs")
+async def list_generation_jobs():
+    """Get recent generation jobs (without their file lists) and queue stats."""
+    return {
+        "stats": generation_jobs.get_stats(),
+        "jobs": generation_jobs.list_jobs()
+    }
+
+@app.get("/api/generation-jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Get a generation job's progress and the files generated so far."""
+    job = generation_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+    return job
+
+@app.get("/api/generation-jobs/{job_id}/events")
+async def stream_generation_job(job_id: str):
+    """Stream a generation job as server-sent events: status changes, one per file, then done."""
+    if generation_jobs.get_job(job_id, None) is None:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+
+    def event(name: str, data: Dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    async def events():
+        sent, status = 0, None
+        while True:
+            job = generation_jobs.get_job(job_id, sent)
+            if job is None:
+                return
+            files = job.pop("files")
+            if job["status"] != status:
+                status = job["status"]
+                yield event("status", job)
+            for file in files:
+                sent += 1
+                yield event("file", {**file, "generated": sent, "count": job["count"]})
+            if status in TERMINAL:
+                yield event("done", job)
+                return
+            await asyncio.sleep(GENERATION_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/generation-jobs/{job_id}/cancel")
+async def cancel_generation_job(job_id: str):
+    """Cancel a queued job, or stop a running one after its current chunk."""
+    if not generation_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Generation job not found")
+    return generation_jobs.get_job(job_id, None)
 
 # New enhanced endpoints
 @app.post("/api/simulate-attack")
@@ -161,12 +472,156 @@ async def simulate_attack(attack_type: str = "random", duration: int = 60):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _split_json_array(decoder: json.JSONDecoder, buffer: str, final: bool):
+    """Decode the complete values at the front of an open JSON array's remaining text.
+
+    Returns the values, the undecoded rest and whether the closing bracket was seen.
+    """
+    values, position = [], 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            return values, "", False
+        if buffer[position] == "]":
+            return values, "", True
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return values, buffer[position:], False
+        if end == len(buffer) and not final:
+            # A number may continue in the next chunk
+            return values, buffer[position:], False
+        values.append(value)
+        position = end
+
+async def _read_json_ips(request: Request) -> AsyncIterator[str]:
+    """Yield IPs from a JSON body; a top-level array is decoded as it arrives.
+
+    The {"ips": [...]} form is read whole before parsing, so send a bare
+    array or text lines for lists too large to buffer.
+    """
+    stream = request.stream()
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decoder = json.JSONDecoder()
+    buffer, opened, closed = "", False, False
+    async for chunk in stream:
+        buffer += text.decode(chunk)
+        if not opened:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            if buffer[0] != "[":
+                async for rest in stream:
+                    buffer += text.decode(rest)
+                body = json.loads(buffer + text.decode(b"", final=True))
+                for ip_address in body.get("ips", []) if isinstance(body, dict) else []:
+                    yield str(ip_address).strip()
+                return
+            buffer, opened = buffer[1:], True
+        values, buffer, closed = _split_json_array(decoder, buffer, final=False)
+        for ip_address in values:
+            yield str(ip_address).strip()
+        if closed:
+            return
+    if opened:
+        values, _, closed = _split_json_array(decoder, buffer + text.decode(b"", final=True), final=True)
+        for ip_address in values:
+            yield str(ip_address).strip()
+        if not closed:
+            raise ValueError("Unterminated JSON array")
+
+async def _read_ip_list(request: Request) -> AsyncIterator[str]:
+    """Yield IPs from a JSON array/{"ips": [...]} body or one IP per text line."""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        async for ip_address in _read_json_ips(request):
+            yield ip_address
+        return
+
+    # Text bodies are read as they arrive; the first field of each line is the IP
+    pending = ""
+    async for chunk in request.stream():
+        pending += chunk.decode("utf-8", errors="replace")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            fields = line.replace(",", " ").split()
+            if fields:
+                yield fields[0].strip('"')
+    fields = pending.replace(",", " ").split()
+    if fields:
+        yield fields[0].strip('"')
+
+@app.post("/api/threat-intel/batch")
+async def analyze_ip_batch(request: Request):
+    """Analyze many IPs, streaming one NDJSON result per distinct IP.
+
+    Duplicates are dropped within a window of the last
+    THREAT_BATCH_DEDUP_WINDOW distinct IPs, so memory stays bounded however
+    many unique IPs the body holds; an IP repeated after it has left the
+    window is analysed again. Each chunk runs on the batch pool under
+    THREAT_BATCH_CHUNK_TIMEOUT; a chunk that overruns stops and its IPs are
+    reported with the error.
+    """
+    chunk_size = int(os.getenv("THREAT_BATCH_CHUNK", "5000"))
+    dedup_window = int(os.getenv("THREAT_BATCH_DEDUP_WINDOW", "100000"))
+
+    async def analyze(batch: List[str]) -> str:
+        try:
+            results = await batch_access.run(threat_intel.analyze_many, batch)
+        except Exception as e:
+            results = [{"ip_address": ip_address, "error": str(e)} for ip_address in batch]
+        return "".join(json.dumps(result, default=str) + "\n" for result in results)
+
+    async def stream():
+        seen: "OrderedDict[str, None]" = OrderedDict()
+        batch = []
+        async for ip_address in _read_ip_list(request):
+            if not ip_address:
+                continue
+            if ip_address in seen:
+                seen.move_to_end(ip_address)
+            else:
+                seen[ip_address] = None
+                if len(seen) > dedup_window:
+                    seen.popitem(last=False)
+                batch.append(ip_address)
+            if len(batch) >= chunk_size:
+                yield await analyze(batch)
+                batch = []
+        if batch:
+            yield await analyze(batch)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.get("/api/threat-intel/{ip_address}")
 async def analyze_ip_threat(ip_address: str):
     """Analyze an IP address for threat intelligence."""
     try:
-        analysis = threat_intel.analyze_ip(ip_address)
+        analysis = await data_access.run(threat_intel.analyze_ip, ip_address)
         return analysis
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/threat-feeds")
+async def get_threat_feeds():
+    """Get per-feed entry counts, load times and index memory."""
+    return threat_intel.feeds.get_stats()
+
+@app.get("/api/threat-cache")
+async def get_threat_cache():
+    """Get IP analysis cache hit, miss and eviction counts."""
+    return threat_intel.cache.get_stats()
+
+@app.post("/api/threat-feeds/reload")
+async def reload_threat_feeds():
+    """Rebuild the threat-feed index from the feed directory now."""
+    try:
+        await asyncio.to_thread(threat_intel.feeds.reload, True)
+        return threat_intel.feeds.get_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -174,8 +629,10 @@ async def analyze_ip_threat(ip_address: str):
 async def get_network_analysis(hours: int = 24):
     """Get network traffic analysis."""
     try:
-        analysis = network_analyzer.get_network_statistics(hours)
+        analysis = await data_access.run(network_analyzer.get_network_statistics, hours)
         return analysis
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -183,12 +640,14 @@ async def get_network_analysis(hours: int = 24):
 async def get_attack_patterns(hours: int = 1):
     """Get detected attack patterns."""
     try:
-        patterns = network_analyzer.detect_attack_patterns(hours)
+        patterns = await data_access.run(network_analyzer.detect_attack_patterns, hours)
         return {
             "patterns": patterns,
             "count": len(patterns),
             "analysis_period": f"{hours} hours"
         }
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -196,8 +655,10 @@ async def get_attack_patterns(hours: int = 1):
 async def get_threat_summary(hours: int = 24):
     """Get comprehensive threat summary."""
     try:
-        summary = threat_intel.get_threat_summary(hours)
+        summary = await data_access.run(threat_intel.get_threat_summary, hours)
         return summary
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -208,13 +669,20 @@ async def generate_honeypot_scenario():
         scenario = attack_simulator.generate_demo_scenario()
         # Generate appropriate files for the scenario
         file_count = random.randint(5, 15)
-        files = file_generator.generate_multiple_files(file_count)
+        created = await _create_files(file_count)
+        message = f"Generated {len(created['files'])} honeypot files for {scenario['name']} scenario"
+        if created["pending"]:
+            message += f"; {created['pending']} more queued as job {created['job_id']}"
         
         return {
             "scenario": scenario,
-            "generated_files": files,
-            "message": f"Generated {file_count} honeypot files for {scenario['name']} scenario"
+            "generated_files": created["files"],
+            "pending_files": created["pending"],
+            "job_id": created["job_id"],
+            "message": message
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -222,10 +690,12 @@ async def generate_honeypot_scenario():
 async def get_dashboard_data():
     """Get comprehensive dashboard data."""
     try:
-        stats = logger.get_access_stats()
-        threat_summary = threat_intel.get_threat_summary(24)
-        network_stats = network_analyzer.get_network_statistics(24)
-        attack_patterns = network_analyzer.detect_attack_patterns(1)
+        stats, threat_summary, network_stats, attack_patterns = await asyncio.gather(
+            data_access.run(logger.get_access_stats),
+            data_access.run(threat_intel.get_threat_summary, 24),
+            data_access.run(network_analyzer.get_network_statistics, 24),
+            data_access.run(network_analyzer.detect_attack_patterns, 1)
+        )
         
         return {
             "file_access_stats": stats,
@@ -234,6 +704,8 @@ async def get_dashboard_data():
             "recent_attack_patterns": attack_patterns[:5],
             "last_updated": datetime.now().isoformat()
         }
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,252 @@
+import argparse
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+SHARED = "_all"
+BOS, EOS = 0, 1  # Document start (context padding) and end tokens
+TABLE_ARRAYS = ("keys", "offsets", "next_ids", "cumulative")
+
+TOKEN_PATTERN = re.compile(r"\n|\w+(?:[-'.]\w+)*|[^\w\s]")
+NO_SPACE_BEFORE = set(".,;:!?)]}%'\"") | {"\n"}
+NO_SPACE_AFTER = ("(", "[", "{", "$", "#", "\n")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text)
+
+def default_model_path() -> str:
+    return os.getenv("MARKOV_MODEL_PATH", "models/decoy_markov.npz")
+
+class _Table:
+    """Transition counts of one category in CSR form.
+
+    ``keys`` are the sorted context keys (the previous ``order`` token ids
+    packed base ``vocab_size``); the followers of context ``i`` are
+    ``next_ids[offsets[i]:offsets[i + 1]]``. ``cumulative`` holds the running
+    count over the whole table, so a follower is sampled by drawing a point
+    in the context's count range and binary-searching it.
+    """
+    __slots__ = ("keys", "offsets", "next_ids", "cumulative", "row_low", "row_span")
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, next_ids: np.ndarray, cumulative: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.next_ids = next_ids
+        self.cumulative = cumulative
+        running = np.concatenate((np.zeros(1, dtype=cumulative.dtype), cumulative))
+        self.row_low = running[offsets[:-1]]
+        self.row_span = running[offsets[1:]] - self.row_low
+
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.offsets.nbytes + self.next_ids.nbytes + self.cumulative.nbytes
+
+class MarkovTextModel:
+    """Compact n-gram text model for high-volume decoy {text}; numpy only, no torch.
+
+    Trained offline (``python markov.py train``) from a local corpus or GPT-2
+    samples, with one table per template category plus a shared table for
+    categories without their own text. Generation advances every requested
+    sample one token per step with vectorised lookups and sampling, so a
+    batch of thousands of snippets costs about as many numpy calls as one.
+    On a document end the sample starts a new paragraph, so every sample
+    fills its budget.
+    """
+
+    def __init__(self, vocab: List[str], order: int, tables: Dict[str, _Table], seed: Optional[int] = None):
+        self.vocab = vocab
+        self.order = order
+        self.tables = tables
+        self.rng = np.random.default_rng(seed)
+        # Token text with its leading space baked in, so detokenizing is one join
+        self._spaced = [token if token in NO_SPACE_BEFORE else " " + token for token in vocab]
+        self._spaced[BOS] = self._spaced[EOS] = "\n"
+
+    @classmethod
+    def train(cls, texts_by_category: Dict[str, Iterable[str]], order: int = 2,
+              seed: Optional[int] = None) -> "MarkovTextModel":
+        """Count transitions of every category's texts (and all of them for the shared table)."""
+        ids = {"<s>": BOS, "</s>": EOS}
+        documents = {}
+        for category, texts in texts_by_category.items():
+            documents[category] = [
+                np.array([BOS] * order + [ids.setdefault(token, len(ids)) for token in tokenize(text)] + [EOS],
+                         dtype=np.int64)
+                for text in texts if text.strip()
+            ]
+        vocab = list(ids)
+        if len(vocab) ** order >= 2 ** 62:
+            raise ValueError(f"Vocabulary of {len(vocab)} is too large for order {order}")
+        documents[SHARED] = [document for category_docs in documents.values() for document in category_docs]
+        tables = {category: cls._count(docs, order, len(vocab)) for category, docs in documents.items() if docs}
+        return cls(vocab, order, tables, seed)
+
+    @staticmethod
+    def _count(documents: List[np.ndarray], order: int, vocab_size: int) -> _Table:
+        contexts, followers = [], []
+        for document in documents:
+            key = np.zeros(len(document) - order, dtype=np.int64)
+            for position in range(order):
+                key = key * vocab_size + document[position:len(document) - order + position]
+            contexts.append(key)
+            followers.append(document[order:])
+        context = np.concatenate(contexts)
+        follower = np.concatenate(followers)
+
+        by_pair = np.lexsort((follower, context))
+        context, follower = context[by_pair], follower[by_pair]
+        new_pair = np.ones(len(context), dtype=bool)
+        new_pair[1:] = (context[1:] != context[:-1]) | (follower[1:] != follower[:-1])
+        starts = np.flatnonzero(new_pair)
+        counts = np.diff(np.append(starts, len(context)))
+        context, follower = context[starts], follower[starts]
+
+        new_context = np.ones(len(context), dtype=bool)
+        new_context[1:] = context[1:] != context[:-1]
+        offsets = np.append(np.flatnonzero(new_context), len(context))
+        return _Table(context[new_context].astype(np.uint64), offsets.astype(np.int64),
+                      follower.astype(np.int32), np.cumsum(counts).astype(np.uint64))
+
+    def save(self, path: Union[str, Path]):
+        arrays = {"vocab": np.array(self.vocab), "order": np.array(self.order)}
+        for category, table in self.tables.items():
+            for name in TABLE_ARRAYS:
+                arrays[f"{category}/{name}"] = getattr(table, name)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path, None] = None, seed: Optional[int] = None) -> "MarkovTextModel":
+        path = path or default_model_path()
+        if not Path(path).exists():
+            raise FileNotFoundError(f"No Markov model at {path}; train one with 'python markov.py train'")
+        with np.load(path) as data:
+            categories = {name.split("/", 1)[0] for name in data.files if "/" in name}
+            tables = {
+                category: _Table(*(data[f"{category}/{name}"] for name in TABLE_ARRAYS))
+                for category in categories
+            }
+            return cls([str(token) for token in data["vocab"]], int(data["order"]), tables, seed)
+
+    def _sample(self, table: _Table, lengths: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Token ids of shape (samples, max(lengths)); EOS marks paragraph breaks."""
+        samples = len(lengths)
+        out = np.empty((samples, int(lengths.max())), dtype=np.int32)
+        context = np.zeros((samples, self.order), dtype=np.uint64)  # All BOS
+        size = np.uint64(len(self.vocab))
+        for step in range(out.shape[1]):
+            key = context[:, 0].copy()
+            for position in range(1, self.order):
+                key = key * size + context[:, position]
+            # Both binary searches run on sorted queries (rows ascending, and each row's count
+            # range above the previous one), which keeps them cache-friendly: ~3x faster
+            by_key = np.argsort(key)
+            row = np.searchsorted(table.keys, key[by_key])
+            point = table.row_low[row] + (rng.random(samples) * table.row_span[row]).astype(np.uint64)
+            token = np.empty(samples, dtype=np.int32)
+            token[by_key] = table.next_ids[np.searchsorted(table.cumulative, point, side="right")]
+            out[:, step] = token
+            context[:, :-1] = context[:, 1:]
+            context[:, -1] = token
+            context[token == EOS] = BOS
+        return out
+
+    def _detokenize(self, ids: np.ndarray) -> str:
+        spaced = self._spaced
+        text = "".join([spaced[token] for token in ids.tolist()])
+        # Drop the space after opening brackets/currency signs and line breaks
+        for glue in NO_SPACE_AFTER:
+            text = text.replace(glue + " ", glue)
+        return text.strip()
+
+    def generate_for(self, categories: List[Optional[str]], lengths: Union[int, List[int]] = 150,
+                     seed: Optional[int] = None) -> List[str]:
+        """Generate one snippet per entry, flavoured by its category's table.
+
+        With ``seed`` the output is a pure function of the arguments and the
+        trained tables, so the same snippet can be rendered again later.
+        """
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        lengths = np.array(lengths if isinstance(lengths, (list, tuple)) else [lengths] * len(categories))
+        texts: List[Optional[str]] = [None] * len(categories)
+        groups: Dict[str, List[int]] = {}
+        for index, category in enumerate(categories):
+            groups.setdefault(category if category in self.tables else SHARED, []).append(index)
+        for category, indexes in groups.items():
+            ids = self._sample(self.tables[category], lengths[indexes], rng)
+            for row, index in enumerate(indexes):
+                texts[index] = self._detokenize(ids[row, :lengths[index]])
+        return texts
+
+    def generate(self, prompts: List[str], max_length: Union[int, List[int]] = 150) -> List[str]:
+        """Text model interface (prompts are ignored; uses the shared table)."""
+        return self.generate_for([None] * len(prompts), max_length)
+
+    def get_stats(self) -> Dict:
+        return {
+            "order": self.order,
+            "vocab_size": len(self.vocab),
+            "categories": sorted(self.tables),
+            "contexts": {category: len(table.keys) for category, table in self.tables.items()},
+            "table_bytes": sum(table.nbytes() for table in self.tables.values())
+        }
+
+def _read_corpus(corpus: Path) -> Dict[str, List[str]]:
+    """Text files under ``corpus``; files in a subdirectory belong to the category it names."""
+    texts: Dict[str, List[str]] = {}
+    for path in sorted(corpus.rglob("*.txt")):
+        relative = path.relative_to(corpus)
+        category = relative.parts[0] if len(relative.parts) > 1 else SHARED
+        # Blank lines separate documents
+        texts.setdefault(category, []).extend(re.split(r"\n\s*\n", path.read_text(encoding="utf-8")))
+    return texts
+
+def _sample_gpt2(samples: int, model_name: str) -> Dict[str, List[str]]:
+    """GPT-2 text for every template category, prompted with the category name."""
+    from file_generator import FakeFileGenerator
+
+    generator = FakeFileGenerator(model_name)
+    return {
+        category: generator.text_model.generate([f"Generate realistic {category} business content: "] * samples, 150)
+        for category in generator.templates
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the n-gram decoy text model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Train from a corpus directory and/or GPT-2 samples")
+    train.add_argument("--corpus", type=Path, help="Directory of .txt files, one subdirectory per category")
+    train.add_argument("--gpt2-samples", type=int, default=0, help="GPT-2 samples to draw per category")
+    train.add_argument("--gpt2-model", default=os.getenv("GENERATOR_MODEL", "gpt2"))
+    train.add_argument("--order", type=int, default=2)
+    train.add_argument("--output", default=default_model_path())
+    sample = subparsers.add_parser("sample", help="Print snippets from a trained model")
+    sample.add_argument("--model", default=default_model_path())
+    sample.add_argument("--category")
+    sample.add_argument("--count", type=int, default=3)
+    sample.add_argument("--length", type=int, default=80)
+    args = parser.parse_args()
+
+    if args.command == "sample":
+        model = MarkovTextModel.load(args.model)
+        for text in model.generate_for([args.category] * args.count, args.length):
+            print(text, end="\n\n")
+        return
+
+    texts = _read_corpus(args.corpus) if args.corpus else {}
+    if args.gpt2_samples:
+        for category, samples in _sample_gpt2(args.gpt2_samples, args.gpt2_model).items():
+            texts.setdefault(category, []).extend(samples)
+    if not texts:
+        parser.error("nothing to train on: pass --corpus and/or --gpt2-samples")
+    model = MarkovTextModel.train(texts, order=args.order)
+    model.save(args.output)
+    stats = model.get_stats()
+    print(f"Trained order-{stats['order']} model: {stats['vocab_size']:,} tokens, "
+          f"{sum(stats['contexts'].values()):,} contexts, {stats['table_bytes'] / 2**20:.1f} MiB -> {args.output}")
+
+if __name__ == "__main__":
+    main()
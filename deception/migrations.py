@@ -0,0 +1,298 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+def _baseline_schema(cursor: sqlite3.Connection):
+    """Tables created by the original DatabaseLogger, NetworkAnalyzer and ThreatIntelligence."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        content_type TEXT,
+        size INTEGER,
+        is_accessed BOOLEAN DEFAULT FALSE
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS access_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_id INTEGER,
+        ip_address TEXT,
+        user_agent TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (file_id) REFERENCES files (id)
+    )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS network_connections (
+            id INTEGER PRIMARY KEY,
+            source_ip TEXT,
+            dest_ip TEXT,
+            source_port INTEGER,
+            dest_port INTEGER,
+            protocol TEXT,
+            timestamp TIMESTAMP,
+            bytes_sent INTEGER,
+            bytes_received INTEGER,
+            duration REAL,
+            flags TEXT,
+            session_id TEXT,
+            threat_score REAL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS traffic_patterns (
+            id INTEGER PRIMARY KEY,
+            ip_address TEXT,
+            pattern_type TEXT,
+            pattern_data TEXT,
+            confidence_score REAL,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            occurrence_count INTEGER
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attack_signatures (
+            id INTEGER PRIMARY KEY,
+            signature_name TEXT,
+            pattern TEXT,
+            severity TEXT,
+            description TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS threat_intel (
+            id INTEGER PRIMARY KEY,
+            ip_address TEXT UNIQUE,
+            threat_type TEXT,
+            confidence_score REAL,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            source TEXT,
+            additional_info TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ip_geolocation (
+            id INTEGER PRIMARY KEY,
+            ip_address TEXT UNIQUE,
+            country TEXT,
+            region TEXT,
+            city TEXT,
+            latitude REAL,
+            longitude REAL,
+            isp TEXT,
+            organization TEXT,
+            asn TEXT,
+            timezone TEXT,
+            last_updated TIMESTAMP
+        )
+    ''')
+
+def _epoch_ms_timestamps(cursor: sqlite3.Connection):
+    """Add integer epoch-millisecond time columns and range-scan indexes."""
+    cursor.execute("ALTER TABLE access_logs ADD COLUMN ts INTEGER")
+    cursor.execute("ALTER TABLE network_connections ADD COLUMN ts INTEGER")
+    cursor.execute("ALTER TABLE threat_intel ADD COLUMN last_seen_ts INTEGER")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_ts ON access_logs (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_file_ts ON access_logs (file_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_ip_ts ON access_logs (ip_address, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_network_connections_ts ON network_connections (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_network_connections_source_ts ON network_connections (source_ip, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_threat_intel_last_seen_ts ON threat_intel (last_seen_ts)")
+
+def _network_rollups(cursor: sqlite3.Connection):
+    """Add hourly/daily network rollups and a covering index for threat summaries."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS network_rollups (
+            granularity TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            connection_count INTEGER NOT NULL DEFAULT 0,
+            threat_sum REAL NOT NULL DEFAULT 0,
+            threat_count INTEGER NOT NULL DEFAULT 0,
+            bytes_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, bucket_ts, key)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute("DROP INDEX IF EXISTS idx_threat_intel_last_seen_ts")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_threat_intel_last_seen_summary
+        ON threat_intel (last_seen_ts, threat_type, confidence_score)
+    ''')
+
+def _traffic_pattern_upserts(cursor: sqlite3.Connection):
+    """Make traffic_patterns one row per IP with an indexed last_seen_ts."""
+    cursor.execute('''
+        DELETE FROM traffic_patterns
+        WHERE id NOT IN (SELECT MAX(id) FROM traffic_patterns GROUP BY ip_address)
+    ''')
+    cursor.execute("ALTER TABLE traffic_patterns ADD COLUMN last_seen_ts INTEGER")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_traffic_patterns_ip ON traffic_patterns (ip_address)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_traffic_patterns_last_seen_ts ON traffic_patterns (last_seen_ts)")
+
+def _unique_signatures(cursor: sqlite3.Connection):
+    """Drop duplicated attack_signatures rows and keep names unique."""
+    cursor.execute('''
+        DELETE FROM attack_signatures
+        WHERE id NOT IN (SELECT MIN(id) FROM attack_signatures GROUP BY signature_name)
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attack_signatures_name ON attack_signatures (signature_name)")
+
+def _import_checkpoints(cursor: sqlite3.Connection):
+    """Track how far each bulk-imported file has been committed."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            byte_offset INTEGER NOT NULL DEFAULT 0,
+            rows INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            last_ts INTEGER,
+            finished BOOLEAN DEFAULT FALSE,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+def _threat_intel_hit_count(cursor: sqlite3.Connection):
+    """Count sightings per threat_intel row now that rows are upserted, not replaced."""
+    cursor.execute("ALTER TABLE threat_intel ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 1")
+
+def _ip_reputation(cursor: sqlite3.Connection):
+    """Persist the decayed behavioural reputation of each IP."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ip_reputation (
+            ip_address TEXT PRIMARY KEY,
+            badness REAL NOT NULL,
+            updated_ts INTEGER NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            user_agents TEXT
+        ) WITHOUT ROWID
+    ''')
+
+def _virtual_files(cursor: sqlite3.Connection):
+    """Manifest of decoys rendered on demand instead of written to disk."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS virtual_files (
+            filename TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            template INTEGER NOT NULL,
+            seed INTEGER NOT NULL,
+            created_ts INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+# (version, name, upgrade function). Append only; never edit an applied migration.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline_schema", _baseline_schema),
+    (2, "epoch_ms_timestamps", _epoch_ms_timestamps),
+    (3, "network_rollups", _network_rollups),
+    (4, "traffic_pattern_upserts", _traffic_pattern_upserts),
+    (5, "unique_signatures", _unique_signatures),
+    (6, "import_checkpoints", _import_checkpoints),
+    (7, "threat_intel_hit_count", _threat_intel_hit_count),
+    (8, "ip_reputation", _ip_reputation),
+    (9, "virtual_files", _virtual_files),
+]
+
+# Columns filled in the background after a migration adds them:
+# (table, new column, source column, whether the source holds local time).
+# Python datetime.now() values are local time; CURRENT_TIMESTAMP is UTC.
+BACKFILLS: List[Tuple[str, str, str, bool]] = [
+    ("network_connections", "ts", "timestamp", True),
+    ("access_logs", "ts", "timestamp", False),
+    ("threat_intel", "last_seen_ts", "last_seen", True),
+    ("traffic_patterns", "last_seen_ts", "last_seen", True),
+]
+
+def migrate(cursor: sqlite3.Connection) -> int:
+    """Apply every pending migration. Returns the resulting schema version."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    current = cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+    for version, name, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+        upgrade(cursor)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+        current = version
+
+    return current
+
+def _to_epoch_ms_sql(column: str, local_time: bool) -> str:
+    """SQL expression converting a TEXT timestamp column to epoch milliseconds."""
+    modifier = ", 'utc'" if local_time else ""
+    return (f"CAST(strftime('%s', {column}{modifier}) AS INTEGER) * 1000"
+            f" + CAST(substr(strftime('%f', {column}), 4) AS INTEGER)")
+
+class Backfill:
+    """Fill migration-added time columns in small chunks, newest rows first.
+
+    Each chunk is its own short write on the storage writer thread, so
+    regular inserts keep flowing while history is converted.
+    """
+
+    def __init__(self, storage, chunk_size: int = None, pause: float = None):
+        self.storage = storage
+        self.chunk_size = chunk_size or int(os.getenv("BACKFILL_CHUNK", "2000"))
+        self.pause = pause if pause is not None else float(os.getenv("BACKFILL_PAUSE", "0.01"))
+        self.progress: Dict[str, Dict] = {}
+        self.finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Run the backfill in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="schema-backfill", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        for table, column, source, local_time in BACKFILLS:
+            # Uses the new column's index, so finished tables are skipped cheaply
+            pending = self.storage.query_one(
+                f"SELECT 1 FROM {table} WHERE {column} IS NULL AND {source} IS NOT NULL LIMIT 1")
+            upper = self.storage.query_one(f"SELECT MAX(rowid) FROM {table}")[0] if pending else None
+            state = {"done": upper is None, "rows_updated": 0, "next_rowid": upper}
+            self.progress[f"{table}.{column}"] = state
+            expression = _to_epoch_ms_sql(source, local_time)
+
+            while not state["done"]:
+                low = max(0, state["next_rowid"] - self.chunk_size)
+                updated = self.storage.call(lambda conn, low=low, high=state["next_rowid"]: conn.execute(f'''
+                    UPDATE {table} SET {column} = {expression}
+                    WHERE rowid > ? AND rowid <= ? AND {column} IS NULL AND {source} IS NOT NULL
+                ''', (low, high)).rowcount)
+                state["rows_updated"] += updated
+                state["next_rowid"] = low
+                state["done"] = low == 0
+                if self.pause:
+                    time.sleep(self.pause)
+
+        self.finished.set()
@@ -1,10 +1,18 @@
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 import random
 import hashlib
+import time
+
+import numpy as np
+
+from storage import get_storage, epoch_ms
+from connection_tracker import ConnectionTracker
+from rollups import NetworkRollups
+from pattern_detector import PatternDetector
+from signature_engine import SignatureEngine
 
 @dataclass
 class NetworkConnection:
@@ -25,57 +33,23 @@ class NetworkAnalyzer:
     
     def __init__(self, db_path: str = "honeypot.db"):
         self.db_path = db_path
+        self.storage = get_storage(db_path)
+        self.connection_tracker = ConnectionTracker()
+        self.rollups = NetworkRollups(self.storage)
+        self.pattern_detector = PatternDetector(
+            self.storage, self._classify_attack_pattern, self._calculate_pattern_severity
+        )
         self._init_network_db()
+        self.signature_engine = SignatureEngine(self.storage)
+        self.connection_tracker.rebuild(self.storage)
+        self.pattern_detector.rebuild()
+        self.rollups.start()
+        self.pattern_detector.start()
+        self.signature_engine.start()
         
     def _init_network_db(self):
         """Initialize network analysis database tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS network_connections (
-                id INTEGER PRIMARY KEY,
-                source_ip TEXT,
-                dest_ip TEXT,
-                source_port INTEGER,
-                dest_port INTEGER,
-                protocol TEXT,
-                timestamp TIMESTAMP,
-                bytes_sent INTEGER,
-                bytes_received INTEGER,
-                duration REAL,
-                flags TEXT,
-                session_id TEXT,
-                threat_score REAL
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS traffic_patterns (
-                id INTEGER PRIMARY KEY,
-                ip_address TEXT,
-                pattern_type TEXT,
-                pattern_data TEXT,
-                confidence_score REAL,
-                first_seen TIMESTAMP,
-                last_seen TIMESTAMP,
-                occurrence_count INTEGER
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attack_signatures (
-                id INTEGER PRIMARY KEY,
-                signature_name TEXT,
-                pattern TEXT,
-                severity TEXT,
-                description TEXT,
-                created_at TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        self.storage.migrate()
         
         # Load default attack signatures
         self._load_default_signatures()
@@ -109,19 +83,14 @@ class NetworkAnalyzer:
             }
         ]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for sig in signatures:
-            cursor.execute('''
-                INSERT OR IGNORE INTO attack_signatures 
-                (signature_name, pattern, severity, description, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (sig["name"], sig["pattern"], sig["severity"], 
-                  sig["description"], datetime.now()))
-        
-        conn.commit()
-        conn.close()
+        rows = [(sig["name"], sig["pattern"], sig["severity"],
+                 sig["description"], datetime.now()) for sig in signatures]
+        # Wait for the commit: the signature engine reads these rows right after
+        self.storage.call(lambda conn: conn.executemany('''
+            INSERT OR IGNORE INTO attack_signatures 
+            (signature_name, pattern, severity, description, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows))
 
     def analyze_connection(self, source_ip: str, dest_ip: str, 
                           source_port: int, dest_port: int, 
@@ -151,6 +120,10 @@ class NetworkAnalyzer:
         
         # Store connection
         self._store_connection(connection, session_id, analysis["threat_score"])
+        ts = epoch_ms(connection.timestamp)
+        self.connection_tracker.record(source_ip, dest_port, ts)
+        self.pattern_detector.observe(source_ip, dest_port, ts, analysis["threat_score"],
+                                      bytes_sent + bytes_received)
         
         return {
             "connection_id": session_id,
@@ -170,40 +143,135 @@ class NetworkAnalyzer:
             "threat_score": 0.0,
             "anomalies": [],
             "pattern_matches": [],
-            "risk_factors": []
+            "risk_factors": [],
+            "signature_matches": []
         }
         
-        # Check for suspicious ports
-        if connection.dest_port in [22, 23, 3389, 445, 135]:
-            analysis["risk_factors"].append("High-value service port")
-            analysis["threat_score"] += 0.3
-        
-        # Check for unusual ports
-        if connection.source_port < 1024 and connection.protocol == "TCP":
-            analysis["anomalies"].append("Low source port number")
-            analysis["threat_score"] += 0.2
-        
-        # Check for large data transfers
-        total_bytes = connection.bytes_sent + connection.bytes_received
-        if total_bytes > 1000000:  # 1MB
-            analysis["risk_factors"].append("Large data transfer")
-            analysis["threat_score"] += 0.4
-        
-        # Check recent connections from same IP
-        recent_connections = self._get_recent_connections(connection.source_ip, minutes=10)
-        if len(recent_connections) > 20:
-            analysis["pattern_matches"].append("High connection frequency")
-            analysis["threat_score"] += 0.5
-        
-        # Check for port scanning patterns
-        unique_ports = len(set(conn[3] for conn in recent_connections))  # dest_port
-        if unique_ports > 10:
-            analysis["pattern_matches"].append("Port scanning detected")
-            analysis["threat_score"] += 0.7
-        
-        analysis["threat_score"] = min(1.0, analysis["threat_score"])
+        # Recent connections from same IP
+        recent_count, unique_ports = self.connection_tracker.window_stats(connection.source_ip, minutes=10)
+        context = {
+            "dest_port": connection.dest_port,
+            "source_port": connection.source_port,
+            "protocol": connection.protocol,
+            "bytes_sent": connection.bytes_sent,
+            "bytes_received": connection.bytes_received,
+            "total_bytes": connection.bytes_sent + connection.bytes_received,
+            "window_connections": recent_count,
+            "window_unique_ports": unique_ports
+        }
         
-        return analysis
+        return self.signature_engine.apply(self.signature_engine.evaluate(context), analysis)
+
+    def score_batch(self, dest_port, source_port, protocol, bytes_sent, bytes_received,
+                    window_connections, window_unique_ports) -> Dict:
+        """Score a batch of connections given as columns.
+
+        Row for row this matches ``_analyze_connection_patterns`` given the
+        same window statistics. Returns the threat scores, the rules and
+        their (rules x rows) match matrix.
+        """
+        bytes_sent = np.asarray(bytes_sent, dtype=np.int64)
+        bytes_received = np.asarray(bytes_received, dtype=np.int64)
+        columns = {
+            "dest_port": np.asarray(dest_port, dtype=np.int64),
+            "source_port": np.asarray(source_port, dtype=np.int64),
+            "protocol": np.asarray(protocol, dtype=object),
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+            "total_bytes": bytes_sent + bytes_received,
+            "window_connections": np.asarray(window_connections, dtype=np.int64),
+            "window_unique_ports": np.asarray(window_unique_ports, dtype=np.int64)
+        }
+        rules, matches = self.signature_engine.evaluate_columns(columns)
+        return {
+            "threat_score": self.signature_engine.score_columns(rules, matches),
+            "rules": rules,
+            "matches": matches
+        }
+
+    def history_tracker(self, since_ms: int, window_minutes: int = 10) -> ConnectionTracker:
+        """Get a tracker holding stored connections from the window before since_ms.
+
+        Used to recover window statistics when scoring connections after the
+        fact, in time order.
+        """
+        tracker = ConnectionTracker(window_minutes=window_minutes,
+                                    bucket_seconds=self.connection_tracker.bucket_seconds,
+                                    max_ips=self.connection_tracker.max_ips)
+        for source_ip, dest_port, ts in self.storage.query('''
+            SELECT source_ip, dest_port, ts FROM network_connections
+            WHERE ts >= ? AND ts < ? ORDER BY ts, id
+        ''', (since_ms - window_minutes * 60_000, since_ms)):
+            tracker.record(source_ip, dest_port or 0, ts)
+        return tracker
+
+    def rescore_history(self, since_ms: int = 0, chunk_rows: int = 20000) -> Dict:
+        """Re-score stored connections with the current signatures.
+
+        Connections are replayed in time order through a fresh tracker to
+        recover each one's window statistics, scored a chunk at a time with
+        ``score_batch``, and only changed scores are written back, along
+        with matching corrections to the network rollups.
+        """
+        if self.storage.backfill is not None:
+            self.storage.backfill.finished.wait()
+
+        started = time.perf_counter()
+        tracker = self.history_tracker(since_ms)
+
+        scored = changed = 0
+        last = (since_ms, -1)
+        while True:
+            rows = self.storage.query('''
+                SELECT id, ts, source_ip, source_port, dest_port, protocol,
+                       COALESCE(bytes_sent, 0), COALESCE(bytes_received, 0), threat_score
+                FROM network_connections
+                WHERE (ts, id) > (?, ?)
+                ORDER BY ts, id
+                LIMIT ?
+            ''', (*last, chunk_rows))
+            if not rows:
+                break
+
+            window_connections, window_unique_ports = [], []
+            for _, ts, source_ip, _, dest_port, _, _, _, _ in rows:
+                recent_count, unique_ports = tracker.window_stats(source_ip, minutes=10, now_ms=ts)
+                window_connections.append(recent_count)
+                window_unique_ports.append(unique_ports)
+                tracker.record(source_ip, dest_port or 0, ts)
+
+            batch = self.score_batch(
+                dest_port=[row[4] or 0 for row in rows],
+                source_port=[row[3] or 0 for row in rows],
+                protocol=[row[5] for row in rows],
+                bytes_sent=[row[6] for row in rows],
+                bytes_received=[row[7] for row in rows],
+                window_connections=window_connections,
+                window_unique_ports=window_unique_ports
+            )
+
+            changes = [
+                (row_id, ts, protocol, dest_port, source_ip, old_score, new_score)
+                for (row_id, ts, source_ip, _, dest_port, protocol, _, _, old_score), new_score
+                in zip(rows, batch["threat_score"].tolist())
+                if old_score != new_score
+            ]
+            if changes:
+                def apply_changes(conn, changes=changes):
+                    conn.executemany("UPDATE network_connections SET threat_score = ? WHERE id = ?",
+                                     [(change[6], change[0]) for change in changes])
+                    self.rollups.adjust_threat(conn, changes)
+                self.storage.call(apply_changes)
+
+            scored += len(rows)
+            changed += len(changes)
+            last = (rows[-1][1], rows[-1][0])
+
+        return {
+            "rows_scored": scored,
+            "rows_changed": changed,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
 
     def _generate_connection_flags(self, protocol: str, dest_port: int) -> List[str]:
         """Generate realistic connection flags."""
@@ -220,77 +288,49 @@ class NetworkAnalyzer:
         
         return flags
 
-    def _get_recent_connections(self, ip_address: str, minutes: int = 60) -> List:
-        """Get recent connections from an IP address."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT source_ip, dest_ip, source_port, dest_port, protocol, timestamp
-            FROM network_connections 
-            WHERE source_ip = ? AND timestamp > datetime('now', '-{} minutes')
-            ORDER BY timestamp DESC
-        '''.format(minutes), (ip_address,))
-        
-        results = cursor.fetchall()
-        conn.close()
-        
-        return results
-
     def _store_connection(self, connection: NetworkConnection, session_id: str, threat_score: float):
         """Store network connection in database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.storage.execute('''
             INSERT INTO network_connections 
             (source_ip, dest_ip, source_port, dest_port, protocol, timestamp, 
-             bytes_sent, bytes_received, duration, flags, session_id, threat_score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             bytes_sent, bytes_received, duration, flags, session_id, threat_score, ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             connection.source_ip, connection.dest_ip, connection.source_port,
             connection.dest_port, connection.protocol, connection.timestamp,
             connection.bytes_sent, connection.bytes_received, connection.duration,
-            json.dumps(connection.flags), session_id, threat_score
+            json.dumps(connection.flags), session_id, threat_score,
+            epoch_ms(connection.timestamp)
         ))
-        
-        conn.commit()
-        conn.close()
 
     def detect_attack_patterns(self, hours: int = 1) -> List[Dict]:
-        """Detect attack patterns in recent network traffic."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get recent high-threat connections
-        cursor.execute('''
-            SELECT source_ip, COUNT(*) as connection_count, 
-                   AVG(threat_score) as avg_threat_score,
-                   COUNT(DISTINCT dest_port) as unique_ports,
-                   SUM(bytes_sent + bytes_received) as total_bytes
-            FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-            GROUP BY source_ip
-            HAVING connection_count > 5 OR avg_threat_score > 0.5
-            ORDER BY avg_threat_score DESC, connection_count DESC
-        '''.format(hours), )
-        
-        results = cursor.fetchall()
-        conn.close()
+        """Get attack patterns seen in recent network traffic.
+
+        Patterns are maintained by the streaming detector; each carries the
+        IP's aggregates over the detector window as of its last connection.
+        """
+        since = epoch_ms() - hours * 3_600_000
+        
+        results = self.storage.query('''
+            SELECT ip_address, pattern_type, pattern_data, confidence_score
+            FROM traffic_patterns 
+            WHERE last_seen_ts > ?
+            ORDER BY confidence_score DESC, json_extract(pattern_data, '$.connection_count') DESC
+        ''', (since,))
         
         attack_patterns = []
         
-        for row in results:
-            ip, conn_count, avg_threat, unique_ports, total_bytes = row
+        for ip, pattern_type, pattern_data, avg_threat in results:
+            data = json.loads(pattern_data)
             
             pattern = {
                 "source_ip": ip,
-                "pattern_type": self._classify_attack_pattern(conn_count, unique_ports, total_bytes),
-                "connection_count": conn_count,
+                "pattern_type": pattern_type,
+                "connection_count": data["connection_count"],
                 "average_threat_score": round(avg_threat, 2),
-                "unique_ports_accessed": unique_ports,
-                "total_bytes_transferred": total_bytes,
-                "severity": self._calculate_pattern_severity(avg_threat, conn_count, unique_ports)
+                "unique_ports_accessed": data["unique_ports"],
+                "total_bytes_transferred": data["total_bytes"],
+                "severity": data["severity"]
             }
             
             attack_patterns.append(pattern)
@@ -325,49 +365,24 @@ class NetworkAnalyzer:
 
     def get_network_statistics(self, hours: int = 24) -> Dict:
         """Get comprehensive network statistics."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        since = epoch_ms() - hours * 3_600_000
         
-        # Total connections
-        cursor.execute('''
-            SELECT COUNT(*) FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-        '''.format(hours))
-        total_connections = cursor.fetchone()[0]
+        # Total connections and average threat score
+        total = self.rollups.aggregate("total", since).get("", (0, 0.0, 0, 0))
+        total_connections, threat_sum, threat_count, _ = total
+        avg_threat = threat_sum / threat_count if threat_count else 0
         
         # Unique source IPs
-        cursor.execute('''
-            SELECT COUNT(DISTINCT source_ip) FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-        '''.format(hours))
-        unique_ips = cursor.fetchone()[0]
+        unique_ips = sum(1 for ip in self.rollups.aggregate("ip", since) if ip != "")
         
         # Protocol distribution
-        cursor.execute('''
-            SELECT protocol, COUNT(*) FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-            GROUP BY protocol
-        '''.format(hours))
-        protocol_dist = dict(cursor.fetchall())
+        protocol_dist = {protocol or None: values[0]
+                         for protocol, values in self.rollups.aggregate("protocol", since).items()}
         
         # Top target ports
-        cursor.execute('''
-            SELECT dest_port, COUNT(*) as count FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-            GROUP BY dest_port
-            ORDER BY count DESC
-            LIMIT 10
-        '''.format(hours))
-        top_ports = cursor.fetchall()
-        
-        # Average threat score
-        cursor.execute('''
-            SELECT AVG(threat_score) FROM network_connections 
-            WHERE timestamp > datetime('now', '-{} hours')
-        '''.format(hours))
-        avg_threat = cursor.fetchone()[0] or 0
-        
-        conn.close()
+        port_counts = self.rollups.aggregate("port", since)
+        top_ports = sorted(((int(port) if port else None, values[0]) for port, values in port_counts.items()),
+                           key=lambda item: item[1], reverse=True)[:10]
         
         return {
             "time_period_hours": hours,
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from connection_tracker import ConnectionTracker
+
+class PatternDetector:
+    """Streaming per-IP attack-pattern detection that maintains traffic_patterns.
+
+    Every analysed connection updates the IP's sliding-window aggregates
+    (count, threat-score sum, distinct ports, bytes). A background flusher
+    periodically takes the IPs that saw traffic since the last flush, and
+    those meeting the same thresholds the old GROUP BY used (more than 5
+    connections or an average threat above 0.5) are classified and upserted
+    into ``traffic_patterns``. ``occurrence_count`` counts connections seen
+    while the IP was flagged; ``first_seen`` is kept from the first upsert.
+    """
+
+    def __init__(self,
+                 storage,
+                 classify: Callable[[int, int, int], str],
+                 severity: Callable[[float, int, int], str],
+                 window_minutes: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.storage = storage
+        self.classify = classify
+        self.severity = severity
+        self.window_minutes = window_minutes or int(os.getenv("PATTERN_WINDOW_MINUTES", "60"))
+        self.flush_interval = flush_interval or float(os.getenv("PATTERN_FLUSH_SECONDS", "5"))
+        self.tracker = ConnectionTracker(window_minutes=self.window_minutes, bucket_seconds=60)
+
+        self._dirty: Dict[str, List[int]] = {}  # ip -> [connections since flush, last ts]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flusher."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pattern-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out pending patterns."""
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Pattern flush failed: {e}")
+
+    def rebuild(self) -> int:
+        """Reload the window from stored connections."""
+        return self.tracker.rebuild(self.storage)
+
+    def observe(self, ip_address: str, dest_port: int, ts_ms: int,
+                threat_score: float, total_bytes: int):
+        """Fold one analysed connection into the IP's aggregates."""
+        self.tracker.record(ip_address, dest_port, ts_ms, threat_score, total_bytes)
+        with self._lock:
+            pending = self._dirty.get(ip_address)
+            if pending is None:
+                self._dirty[ip_address] = [1, ts_ms]
+            else:
+                pending[0] += 1
+                pending[1] = max(pending[1], ts_ms)
+
+    def flush(self) -> int:
+        """Upsert patterns for IPs that saw traffic since the last flush."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+
+        now_ms = int(time.time() * 1000)
+        rows = []
+        for ip_address, (occurrences, last_ts) in dirty.items():
+            count, unique_ports, threat_sum, total_bytes = self.tracker.window_totals(ip_address, now_ms=now_ms)
+            if count == 0:
+                continue
+            avg_threat = threat_sum / count
+            if not (count > 5 or avg_threat > 0.5):
+                continue
+
+            last_seen = datetime.fromtimestamp(last_ts / 1000)
+            pattern_data = {
+                "connection_count": count,
+                "unique_ports": unique_ports,
+                "total_bytes": total_bytes,
+                "severity": self.severity(avg_threat, count, unique_ports),
+                "window_minutes": self.window_minutes
+            }
+            rows.append((
+                ip_address,
+                self.classify(count, unique_ports, total_bytes),
+                json.dumps(pattern_data),
+                avg_threat,
+                last_seen,
+                last_seen,
+                occurrences,
+                last_ts
+            ))
+
+        self.storage.executemany('''
+            INSERT INTO traffic_patterns
+            (ip_address, pattern_type, pattern_data, confidence_score,
+             first_seen, last_seen, occurrence_count, last_seen_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ip_address) DO UPDATE SET
+                pattern_type = excluded.pattern_type,
+                pattern_data = excluded.pattern_data,
+                confidence_score = excluded.confidence_score,
+                last_seen = excluded.last_seen,
+                last_seen_ts = excluded.last_seen_ts,
+                occurrence_count = occurrence_count + excluded.occurrence_count
+        ''', rows)
+        return len(rows)
@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+# Badness added per event; decoy files are never linked, so any access counts
+ACCESS_WEIGHT = 10.0
+CONNECTION_WEIGHT = 10.0  # multiplied by the connection's threat score (0-1)
+USER_AGENT_WEIGHTS = {"scanner": 25.0, "script": 10.0, "empty": 10.0, "crawler": 2.0, "browser": 0.0}
+
+USER_AGENT_CLASSES = [
+    ("scanner", re.compile(r"sqlmap|nikto|nmap|masscan|zgrab|nuclei|gobuster|dirbuster|dirb|wpscan|"
+                           r"hydra|acunetix|nessus|openvas|burp|ffuf|feroxbuster|whatweb", re.I)),
+    ("script", re.compile(r"curl|wget|python|go-http-client|libwww|java/|okhttp|powershell|"
+                          r"httpclient|axios|node-fetch|ruby|perl|scrapy", re.I)),
+    ("crawler", re.compile(r"bot|crawler|spider|slurp", re.I)),
+]
+
+@lru_cache(maxsize=4096)
+def classify_user_agent(user_agent: Optional[str]) -> str:
+    """Bucket a user agent into scanner, script, crawler, empty or browser."""
+    if not user_agent or not user_agent.strip():
+        return "empty"
+    for name, pattern in USER_AGENT_CLASSES:
+        if pattern.search(user_agent):
+            return name
+    return "browser"
+
+class _Reputation:
+    """Decayed badness of one IP as of ``updated`` (epoch seconds)."""
+    __slots__ = ("badness", "updated", "events", "user_agents")
+
+    def __init__(self, badness: float = 0.0, updated: float = 0.0, events: int = 0,
+                 user_agents: Optional[Dict[str, int]] = None):
+        self.badness = badness
+        self.updated = updated
+        self.events = events
+        self.user_agents = user_agents or {}
+
+    def decayed(self, now: float, rate: float) -> float:
+        return self.badness * math.exp(-rate * max(0.0, now - self.updated))
+
+class ReputationTracker:
+    """Behavioural per-IP reputation from what the honeypot has seen.
+
+    Each IP keeps one exponentially decayed badness value. An event adds its
+    weight after decaying the old value to the event time, so an update is
+    O(1) whatever the IP's history: ``b = b * exp(-rate * dt) + weight``,
+    with ``rate = ln 2 / half-life``. The behaviour score is
+    ``100 * exp(-b / scale)``, 100 for an IP never seen and falling towards
+    0 as events pile up (badness is capped at ``MAX_SCALES * scale``).
+    Changed IPs are upserted into ``ip_reputation`` every ``flush_interval``
+    seconds; IPs whose badness has decayed to almost nothing are dropped
+    from memory.
+    """
+
+    PRUNE_BELOW = 0.01
+    # Badness is capped where the score is already 0, so a burst of events
+    # cannot keep an IP at 0 for weeks after it goes quiet
+    MAX_SCALES = 10
+
+    def __init__(self, storage, half_life_hours: Optional[float] = None, scale: Optional[float] = None,
+                 flush_interval: Optional[float] = None):
+        self.storage = storage
+        self.half_life_hours = half_life_hours or float(os.getenv("REPUTATION_HALF_LIFE_HOURS", "24"))
+        self.scale = scale or float(os.getenv("REPUTATION_SCALE", "50"))
+        self.flush_interval = flush_interval or float(os.getenv("REPUTATION_FLUSH_SECONDS", "30"))
+        self.rate = math.log(2) / (self.half_life_hours * 3600)
+        self._ips: Dict[str, _Reputation] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Load persisted reputations and start the background flusher."""
+        if self._thread is None:
+            self.load()
+            self._thread = threading.Thread(target=self._run, name="reputation-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out pending changes."""
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Reputation flush failed: {e}")
+
+    def load(self) -> int:
+        """Load reputations that have not decayed away."""
+        now = time.time()
+        rows = self.storage.query("SELECT ip_address, badness, updated_ts, events, user_agents FROM ip_reputation")
+        with self._lock:
+            for ip_address, badness, updated_ts, events, user_agents in rows:
+                reputation = _Reputation(badness, updated_ts / 1000, events, json.loads(user_agents or "{}"))
+                if reputation.decayed(now, self.rate) >= self.PRUNE_BELOW:
+                    self._ips[ip_address] = reputation
+            return len(self._ips)
+
+    def _add(self, ip_address: str, weight: float, now: Optional[float] = None,
+             user_agent_class: Optional[str] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            reputation = self._ips.get(ip_address)
+            if reputation is None:
+                reputation = self._ips[ip_address] = _Reputation(updated=now)
+            reputation.badness = min(reputation.decayed(now, self.rate) + weight, self.scale * self.MAX_SCALES)
+            reputation.updated = max(reputation.updated, now)
+            reputation.events += 1
+            if user_agent_class is not None:
+                reputation.user_agents[user_agent_class] = reputation.user_agents.get(user_agent_class, 0) + 1
+            self._dirty.add(ip_address)
+
+    def observe_access(self, ip_address: str, user_agent: Optional[str], now: Optional[float] = None):
+        """Record a decoy file access and the class of its user agent."""
+        user_agent_class = classify_user_agent(user_agent)
+        self._add(ip_address, ACCESS_WEIGHT + USER_AGENT_WEIGHTS[user_agent_class], now, user_agent_class)
+
+    def observe_connection(self, ip_address: str, threat_score: float, now: Optional[float] = None):
+        """Record an analysed connection, weighted by its threat score."""
+        self._add(ip_address, CONNECTION_WEIGHT * threat_score, now)
+
+    def score(self, ip_address: str, now: Optional[float] = None) -> int:
+        """Get the behaviour score (0-100, lower is worse) without touching storage."""
+        reputation = self._ips.get(ip_address)
+        if reputation is None:
+            return 100
+        badness = reputation.decayed(time.time() if now is None else now, self.rate)
+        return round(100 * math.exp(-badness / self.scale))
+
+    def get_reputation(self, ip_address: str) -> Dict:
+        """Get the behaviour score with the event counts behind it."""
+        now = time.time()
+        with self._lock:
+            reputation = self._ips.get(ip_address)
+            if reputation is None:
+                return {"score": 100, "events": 0, "user_agents": {}}
+            return {
+                "score": self.score(ip_address, now),
+                "badness": round(reputation.decayed(now, self.rate), 3),
+                "events": reputation.events,
+                "user_agents": dict(reputation.user_agents),
+                "last_event": reputation.updated
+            }
+
+    def flush(self) -> int:
+        """Upsert changed IPs and drop decayed ones from memory."""
+        now = time.time()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            for ip_address in dirty:
+                reputation = self._ips[ip_address]
+                rows.append((ip_address, reputation.badness, int(reputation.updated * 1000),
+                             reputation.events, json.dumps(reputation.user_agents)))
+            for ip_address in [ip for ip, reputation in self._ips.items()
+                               if ip not in dirty and reputation.decayed(now, self.rate) < self.PRUNE_BELOW]:
+                del self._ips[ip_address]
+
+        self.storage.executemany('''
+            INSERT INTO ip_reputation (ip_address, badness, updated_ts, events, user_agents)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (ip_address) DO UPDATE SET
+                badness = excluded.badness,
+                updated_ts = excluded.updated_ts,
+                events = excluded.events,
+                user_agents = excluded.user_agents
+        ''', rows)
+        return len(rows)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tracked_ips": len(self._ips),
+                "pending": len(self._dirty),
+                "half_life_hours": self.half_life_hours,
+                "scale": self.scale
+            }
@@ -0,0 +1,165 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from file_generator import TEXT_PROMPT
+
+def _lower_thread_priority(niceness: int):
+    """Renice the calling thread where the OS allows it (Linux schedules threads individually)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+class SnippetReservoir:
+    """Background pool of pre-generated {text} snippets per template category.
+
+    Each category keeps up to ``high_water`` ready (template, text) pairs,
+    generated for a random template of that category that needs text.
+    Refill workers run at a low OS priority and generate ``refill_batch``
+    snippets at a time for the emptiest category, so a foreground request
+    waits behind at most one small batch in the model host. ``create_files``
+    only fills templates from the pool and writes them; files the pool cannot
+    cover are reported so the caller can generate them elsewhere. The refill
+    workers start on the first ``take``, so an idle reservoir never loads the
+    text model.
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, generator, high_water: Optional[int] = None, refill_batch: Optional[int] = None,
+                 workers: Optional[int] = None):
+        self.generator = generator
+        self.high_water = int(os.getenv("DECOY_RESERVOIR_HIGH_WATER", "16")) if high_water is None else high_water
+        self.refill_batch = refill_batch or int(os.getenv("DECOY_RESERVOIR_REFILL_BATCH", "4"))
+        self.workers = workers or int(os.getenv("DECOY_RESERVOIR_WORKERS", "1"))
+        self.niceness = int(os.getenv("DECOY_RESERVOIR_NICENESS", "10"))
+        # Only templates with a {text} slot draw from the pool
+        self._text_templates = {
+            category: [t for t in templates if generator.text_length(t)]
+            for category, templates in generator.templates.items()
+        }
+        self._pools: Dict[str, Deque[Tuple[str, str]]] = {
+            category: deque() for category, templates in self._text_templates.items() if templates
+        }
+        self._in_flight = {category: 0 for category in self._pools}
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self.refill_seconds = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Start the refill workers (a high-water mark of 0 disables the reservoir)."""
+        with self._start_lock:
+            if self._threads or self.high_water <= 0:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"reservoir-refill-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _claim(self) -> Optional[Tuple[str, int]]:
+        """Reserve a batch for the emptiest category below the high-water mark."""
+        with self._lock:
+            levels = {category: len(pool) + self._in_flight[category] for category, pool in self._pools.items()}
+            below = [category for category, level in levels.items() if level < self.high_water]
+            if not below:
+                return None
+            category = min(below, key=levels.get)
+            count = min(self.refill_batch, self.high_water - levels[category])
+            self._in_flight[category] += count
+            return category, count
+
+    def _run(self):
+        _lower_thread_priority(self.niceness)
+        while not self._stop.is_set():
+            self._wake.clear()
+            claim = self._claim()
+            if claim is None:
+                self._wake.wait()
+                continue
+            category, count = claim
+            try:
+                self.refill(category, count)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Reservoir refill failed: {e}")
+                self._stop.wait(self.RETRY_SECONDS)
+            finally:
+                with self._lock:
+                    self._in_flight[category] -= count
+
+    def refill(self, category: str, count: int) -> int:
+        """Generate ``count`` snippets for a category in one batched call."""
+        templates = [random.choice(self._text_templates[category]) for _ in range(count)]
+        started = time.perf_counter()
+        texts = self.generator.text_model.generate(
+            [TEXT_PROMPT] * count, [self.generator.text_length(template) for template in templates]
+        )
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pools[category].extend(zip(templates, texts))
+            self.refilled += len(texts)
+            self.refill_seconds += elapsed
+        return len(texts)
+
+    def take(self, category: str) -> Optional[Tuple[str, str]]:
+        """Pop a ready (template, text) pair for a category, or None if it has run dry."""
+        self.start()
+        with self._lock:
+            pool = self._pools.get(category)
+            snippet = pool.popleft() if pool else None
+            if snippet is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self._wake.set()
+        return snippet
+
+    def create_files(self, count: int) -> Tuple[List[Dict], int]:
+        """Create up to ``count`` files from the pool; returns them and the shortfall."""
+        files = []
+        missing = 0
+        for _ in range(count):
+            category, template, filename = self.generator.plan_file()
+            text = ""
+            if self.generator.text_length(template):
+                snippet = self.take(category)
+                if snippet is None:
+                    self.generator.release_names([filename])
+                    missing += 1
+                    continue
+                template, text = snippet
+            files.append(self.generator.write_file(category, template, filename, text))
+        return files, missing
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            depth = {category: len(pool) for category, pool in self._pools.items()}
+            served = self.hits + self.misses
+            refill_rate = round(self.refilled / self.refill_seconds, 2) if self.refill_seconds else None
+            return {
+                "depth": depth,
+                "total_depth": sum(depth.values()),
+                "high_water": self.high_water,
+                "in_flight": sum(self._in_flight.values()),
+                "refilled": self.refilled,
+                "refill_rate_per_second": refill_rate,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / served, 4) if served else None,
+                "last_error": self.last_error
+            }
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+
+GRANULARITIES = (("hour", HOUR_MS), ("day", DAY_MS))
+
+# Rollup dimension -> SQL expression over network_connections. NULLs are
+# stored as '' because rollup keys are part of the primary key.
+DIMENSIONS = {
+    "total": "''",
+    "protocol": "COALESCE(protocol, '')",
+    "port": "COALESCE(CAST(dest_port AS TEXT), '')",
+    "ip": "COALESCE(source_ip, '')"
+}
+
+class NetworkRollups:
+    """Hourly and daily pre-aggregates of network_connections.
+
+    A background compactor folds rows into ``network_rollups`` in insertion
+    (id) order and records the last folded id in ``rollup_state``. A window
+    query then sums:
+
+    - daily rollups for whole days inside the window,
+    - hourly rollups for whole hours before the first whole day,
+    - raw rows in the partial hour at the start of the window, and
+    - raw rows not yet compacted (id above the watermark).
+
+    Every raw part is an index range scan bounded by one hour or by one
+    compaction interval, so the cost does not grow with history. Because
+    compaction follows ids rather than timestamps, rows imported late with
+    old timestamps are still counted exactly.
+    """
+
+    def __init__(self, storage, interval: Optional[float] = None, chunk_rows: Optional[int] = None):
+        self.storage = storage
+        self.interval = interval or float(os.getenv("ROLLUP_INTERVAL", "30"))
+        self.chunk_rows = chunk_rows or int(os.getenv("ROLLUP_CHUNK", "50000"))
+        self._stop = threading.Event()
+        self._thread = None
+        self._metrics = {"compactions": 0, "rows_compacted": 0, "last_compaction_ms": 0.0}
+
+    def start(self):
+        """Start the background compactor."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rollup-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Rollup compaction failed: {e}")
+
+    def compact(self) -> int:
+        """Fold newly inserted connections into the rollups. Returns rows folded."""
+        backfill = self.storage.backfill
+        if backfill is not None and not backfill.finished.is_set():
+            return 0  # Rows without ts yet would be skipped for good
+
+        total = 0
+        while True:
+            started = time.perf_counter()
+            folded = self.storage.call(self._compact_chunk)
+            total += folded
+            if folded:
+                self._metrics["compactions"] += 1
+                self._metrics["rows_compacted"] += folded
+                self._metrics["last_compaction_ms"] = (time.perf_counter() - started) * 1000
+            if folded < self.chunk_rows:
+                return total
+
+    def _compact_chunk(self, conn) -> int:
+        """Fold the next chunk of rows on the writer connection."""
+        row = conn.execute("SELECT last_id FROM rollup_state WHERE name = 'network_connections'").fetchone()
+        last_id = row[0] if row else 0
+        max_id = conn.execute("SELECT MAX(id) FROM network_connections").fetchone()[0] or 0
+        upper = min(max_id, last_id + self.chunk_rows)
+        if upper <= last_id:
+            return 0
+
+        for granularity, size in GRANULARITIES:
+            for dimension, expression in DIMENSIONS.items():
+                conn.execute(f'''
+                    INSERT INTO network_rollups
+                    (granularity, bucket_ts, dimension, key, connection_count,
+                     threat_sum, threat_count, bytes_sum)
+                    SELECT ?, (ts / {size}) * {size}, ?, {expression}, COUNT(*),
+                           TOTAL(threat_score), COUNT(threat_score),
+                           TOTAL(COALESCE(bytes_sent, 0) + COALESCE(bytes_received, 0))
+                    FROM network_connections
+                    WHERE id > ? AND id <= ? AND ts IS NOT NULL
+                    GROUP BY 2, 4
+                    ON CONFLICT (granularity, dimension, bucket_ts, key) DO UPDATE SET
+                        connection_count = connection_count + excluded.connection_count,
+                        threat_sum = threat_sum + excluded.threat_sum,
+                        threat_count = threat_count + excluded.threat_count,
+                        bytes_sum = bytes_sum + excluded.bytes_sum
+                ''', (granularity, dimension, last_id, upper))
+
+        conn.execute('''
+            INSERT INTO rollup_state (name, last_id) VALUES ('network_connections', ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+        ''', (upper,))
+        return upper - last_id
+
+    def adjust_threat(self, conn, changes: List[Tuple]) -> int:
+        """Apply re-scored threat values of already compacted rows to the rollups.
+
+        ``changes`` holds ``(id, ts, protocol, dest_port, source_ip, old_score,
+        new_score)``; runs on the writer connection. Returns buckets updated.
+        """
+        row = conn.execute("SELECT last_id FROM rollup_state WHERE name = 'network_connections'").fetchone()
+        last_id = row[0] if row else 0
+
+        deltas: Dict[Tuple[str, str, int, str], List] = {}
+        for row_id, ts, protocol, dest_port, source_ip, old_score, new_score in changes:
+            if row_id > last_id or ts is None:
+                continue  # Not compacted yet; the raw row is read directly
+            delta_sum = (new_score or 0.0) - (old_score or 0.0)
+            delta_count = (new_score is not None) - (old_score is not None)
+            keys = {
+                "total": "",
+                "protocol": protocol or "",
+                "port": str(dest_port) if dest_port is not None else "",
+                "ip": source_ip or ""
+            }
+            for granularity, size in GRANULARITIES:
+                bucket = (ts // size) * size
+                for dimension, key in keys.items():
+                    delta = deltas.setdefault((granularity, dimension, bucket, key), [0.0, 0])
+                    delta[0] += delta_sum
+                    delta[1] += delta_count
+
+        conn.executemany('''
+            UPDATE network_rollups SET threat_sum = threat_sum + ?, threat_count = threat_count + ?
+            WHERE granularity = ? AND dimension = ? AND bucket_ts = ? AND key = ?
+        ''', [(delta_sum, delta_count, *key) for key, (delta_sum, delta_count) in deltas.items()])
+        return len(deltas)
+
+    def aggregate(self, dimension: str, since_ms: int) -> Dict[str, Tuple[int, float, int, int]]:
+        """Sum a dimension over (since_ms, now].
+
+        Returns ``{key: (connection_count, threat_sum, threat_count, bytes_sum)}``.
+        """
+        expression = DIMENSIONS[dimension]
+        # First bucket starting strictly after since_ms, so ts == since_ms stays excluded
+        first_hour = (since_ms // HOUR_MS + 1) * HOUR_MS
+        first_day = -(-first_hour // DAY_MS) * DAY_MS
+
+        # One statement, so the watermark and both sides of it come from one snapshot
+        rows = self.storage.query(f'''
+            WITH watermark AS (
+                SELECT COALESCE((SELECT last_id FROM rollup_state
+                                 WHERE name = 'network_connections'), 0) AS last_id
+            )
+            SELECT key, SUM(c), SUM(t), SUM(tc), SUM(b) FROM (
+                SELECT key, connection_count AS c, threat_sum AS t, threat_count AS tc, bytes_sum AS b
+                FROM network_rollups
+                WHERE granularity = 'hour' AND dimension = ? AND bucket_ts >= ? AND bucket_ts < ?
+                UNION ALL
+                SELECT key, connection_count, threat_sum, threat_count, bytes_sum
+                FROM network_rollups
+                WHERE granularity = 'day' AND dimension = ? AND bucket_ts >= ?
+                UNION ALL
+                SELECT {expression}, 1, COALESCE(threat_score, 0), threat_score IS NOT NULL,
+                       COALESCE(bytes_sent, 0) + COALESCE(bytes_received, 0)
+                FROM network_connections
+                WHERE ts > ? AND ts < ? AND id <= (SELECT last_id FROM watermark)
+                UNION ALL
+                SELECT {expression}, 1, COALESCE(threat_score, 0), threat_score IS NOT NULL,
+                       COALESCE(bytes_sent, 0) + COALESCE(bytes_received, 0)
+                FROM network_connections
+                WHERE id > (SELECT last_id FROM watermark) AND ts > ?
+            )
+            GROUP BY key
+        ''', (dimension, first_hour, first_day,
+              dimension, first_day,
+              since_ms, first_hour,
+              since_ms))
+
+        return {key: (count, threat_sum, threat_count, bytes_sum)
+                for key, count, threat_sum, threat_count, bytes_sum in rows}
+
+    def get_metrics(self) -> Dict:
+        """Get compaction counters and the current watermark."""
+        watermark = self.storage.query_one(
+            "SELECT last_id FROM rollup_state WHERE name = 'network_connections'")
+        return {
+            "interval_seconds": self.interval,
+            "watermark_id": watermark[0] if watermark else 0,
+            **{key: round(value, 3) if isinstance(value, float) else value
+               for key, value in self._metrics.items()}
+        }
@@ -0,0 +1,388 @@
+import hashlib
+import json
+import math
+import operator
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Connection attributes a rule condition may test
+FIELDS = ("dest_port", "source_port", "protocol", "bytes_sent", "bytes_received",
+          "total_bytes", "window_connections", "window_unique_ports")
+
+# Value types a condition on each field may compare against
+FIELD_TYPES = {name: (int, float) for name in FIELDS}
+FIELD_TYPES["protocol"] = (str,)
+
+OPERATORS = {
+    "eq": "==", "ne": "!=", "gt": ">", "ge": ">=", "lt": "<", "le": "<=",
+    "in": "in", "not_in": "not in"
+}
+
+COLUMN_OPERATORS = {
+    "eq": operator.eq, "ne": operator.ne, "gt": operator.gt,
+    "ge": operator.ge, "lt": operator.lt, "le": operator.le
+}
+
+# Rule kind -> analysis list its label is appended to
+KINDS = {
+    "risk_factor": "risk_factors",
+    "anomaly": "anomalies",
+    "pattern_match": "pattern_matches",
+    "signature": None
+}
+
+# Scoring rules that used to be the if-chain in _analyze_connection_patterns.
+# Order matters: scores are summed in this order before capping at 1.0.
+DEFAULT_RULES = [
+    {"name": "High_Value_Service_Port", "kind": "risk_factor", "label": "High-value service port",
+     "score": 0.3, "conditions": [{"field": "dest_port", "op": "in", "value": [22, 23, 3389, 445, 135]}]},
+    {"name": "Low_Source_Port", "kind": "anomaly", "label": "Low source port number",
+     "score": 0.2, "conditions": [{"field": "source_port", "op": "lt", "value": 1024},
+                                  {"field": "protocol", "op": "eq", "value": "TCP"}]},
+    {"name": "Large_Data_Transfer", "kind": "risk_factor", "label": "Large data transfer",
+     "score": 0.4, "conditions": [{"field": "total_bytes", "op": "gt", "value": 1000000}]},
+    {"name": "High_Connection_Frequency", "kind": "pattern_match", "label": "High connection frequency",
+     "score": 0.5, "conditions": [{"field": "window_connections", "op": "gt", "value": 20}]},
+    {"name": "Port_Scan", "kind": "pattern_match", "label": "Port scanning detected",
+     "score": 0.7, "conditions": [{"field": "window_unique_ports", "op": "gt", "value": 10}]},
+]
+
+# Conditions for the named patterns stored by _load_default_signatures
+BUILTIN_PATTERNS = {
+    "sequential_ports": [{"field": "window_unique_ports", "op": "gt", "value": 10}],
+    "ssh_brute_force": [{"field": "dest_port", "op": "eq", "value": 22},
+                        {"field": "window_connections", "op": "gt", "value": 20}],
+    "aggressive_crawling": [{"field": "protocol", "op": "eq", "value": "HTTP"},
+                            {"field": "window_connections", "op": "gt", "value": 20}],
+    "large_outbound_transfer": [{"field": "total_bytes", "op": "gt", "value": 1000000}],
+}
+
+@dataclass
+class SignatureRule:
+    """One detection rule: all conditions must hold for it to match."""
+    name: str
+    conditions: List[Dict]
+    kind: str = "signature"
+    label: str = ""
+    score: float = 0.0
+    severity: str = "low"
+    description: str = ""
+    source: str = "builtin"
+    enabled: bool = True
+
+@dataclass
+class _Plan:
+    """Compiled rule set, swapped as a whole on reload."""
+    rules: List[SignatureRule]
+    predicates: List[Callable[[Dict], bool]]
+    generic: Tuple[int, ...]
+    by_port: Dict[int, Tuple[int, ...]]
+    fingerprint: str
+    matches: List[int] = field(default_factory=list)
+    sampled_seconds: List[float] = field(default_factory=list)
+    sampled_runs: int = 0
+
+def _literal(value, op: str) -> str:
+    """Render a condition value as a safe Python literal."""
+    def scalar(item):
+        if isinstance(item, bool) or not isinstance(item, (int, float, str)):
+            raise ValueError(f"Unsupported condition value: {item!r}")
+        if isinstance(item, float) and not math.isfinite(item):
+            # repr() gives nan/inf, which are not Python literals
+            raise ValueError(f"Non-finite condition value: {item!r}")
+        return repr(item)
+
+    if op in ("in", "not_in"):
+        if not isinstance(value, list):
+            raise ValueError(f"'{op}' needs a list value")
+        return "frozenset((" + "".join(scalar(item) + ", " for item in value) + "))"
+    return scalar(value)
+
+def _check_conditions(conditions: List[Dict]):
+    """Reject conditions with an unknown field or operator or a value of the wrong type.
+
+    A string compared with a numeric field would raise on every evaluation,
+    so bad rules are refused when the plan is built instead.
+    """
+    for condition in conditions:
+        if not isinstance(condition, dict):
+            raise ValueError(f"Condition must be an object: {condition!r}")
+        name, op, value = condition.get("field"), condition.get("op"), condition.get("value")
+        if name not in FIELDS:
+            raise ValueError(f"Unknown field: {name}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        if op in ("in", "not_in") and not isinstance(value, list):
+            raise ValueError(f"'{op}' needs a list value")
+        for item in value if op in ("in", "not_in") else [value]:
+            if isinstance(item, bool) or not isinstance(item, FIELD_TYPES[name]):
+                expected = "a string" if FIELD_TYPES[name] == (str,) else "a number"
+                raise ValueError(f"{name} needs {expected}, got {item!r}")
+
+def _compile_predicate(conditions: List[Dict]) -> Callable[[Dict], bool]:
+    """Compile a rule's conditions into one Python function."""
+    _check_conditions(conditions)
+    parts = []
+    for condition in conditions:
+        name, op = condition["field"], condition["op"]
+        parts.append(f"c[{name!r}] {OPERATORS[op]} {_literal(condition.get('value'), op)}")
+    source = "lambda c: " + (" and ".join(parts) if parts else "True")
+    return eval(compile(source, "<signature>", "eval"), {"__builtins__": {}, "frozenset": frozenset})
+
+def _column_mask(condition: Dict, columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Evaluate one condition over a batch of columns."""
+    column, op, value = columns[condition["field"]], condition["op"], condition.get("value")
+    if op in ("in", "not_in"):
+        mask = np.zeros(len(column), dtype=bool)
+        for item in value:
+            mask |= column == item
+        return ~mask if op == "not_in" else mask
+    return np.asarray(COLUMN_OPERATORS[op](column, value), dtype=bool)
+
+def _port_dispatch(conditions: List[Dict]) -> Tuple[Optional[List[int]], List[Dict]]:
+    """Split off a dest_port equality/membership test to index the rule by port."""
+    for i, condition in enumerate(conditions):
+        if condition.get("field") == "dest_port" and condition.get("op") in ("eq", "in"):
+            value = condition.get("value")
+            ports = value if isinstance(value, list) else [value]
+            if all(isinstance(port, int) and not isinstance(port, bool) for port in ports):
+                return ports, conditions[:i] + conditions[i + 1:]
+    return None, conditions
+
+class SignatureEngine:
+    """Evaluates attack signatures against connections in one pass.
+
+    Rules come from the built-in scoring rules, JSON rule files in
+    ``rules_dir`` (a list of rules or ``{"rules": [...]}``; a rule with an
+    existing name replaces it) and the ``attack_signatures`` table, whose
+    ``pattern`` is either a built-in pattern name or JSON conditions. Each
+    rule is compiled to a single Python predicate; rules that test
+    ``dest_port`` for equality are indexed by port, so a connection only runs
+    the predicates that can match it. A background thread re-reads the
+    sources every ``reload_interval`` seconds and swaps in a new plan when
+    they change; evaluation never takes a lock.
+    """
+
+    def __init__(self, storage, rules_dir: Optional[str] = None,
+                 reload_interval: Optional[float] = None, profile_every: int = 64):
+        self.storage = storage
+        self.rules_dir = Path(rules_dir or os.getenv("SIGNATURE_RULES_DIR", "rules"))
+        self.reload_interval = reload_interval or float(os.getenv("SIGNATURE_RELOAD_SECONDS", "10"))
+        self.profile_every = profile_every
+        self._evaluations = 0
+        self._eval_seconds = 0.0
+        self._reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._plan = self._build_plan(*self._read_sources())
+
+    def start(self):
+        """Start watching the rule sources for changes."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="signature-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Signature reload failed: {e}")
+
+    def _read_sources(self) -> Tuple[List[Dict], str]:
+        """Collect raw rule definitions and a fingerprint of their sources."""
+        digest = hashlib.sha1()
+        definitions = [dict(rule, source="builtin") for rule in DEFAULT_RULES]
+
+        if self.rules_dir.is_dir():
+            for path in sorted(self.rules_dir.glob("*.json")):
+                text = path.read_text(encoding="utf-8")
+                digest.update(path.name.encode() + text.encode())
+                data = json.loads(text)
+                rules = data.get("rules", []) if isinstance(data, dict) else data
+                definitions.extend(dict(rule, source=path.name) for rule in rules)
+
+        rows = self.storage.query('''
+            SELECT id, signature_name, pattern, severity, description
+            FROM attack_signatures ORDER BY id
+        ''')
+        for row_id, name, pattern, severity, description in rows:
+            digest.update(repr((row_id, name, pattern, severity, description)).encode())
+            definition = {"name": name, "severity": severity or "low",
+                          "description": description or "", "source": "attack_signatures"}
+            if pattern in BUILTIN_PATTERNS:
+                definition["conditions"] = BUILTIN_PATTERNS[pattern]
+            else:
+                try:
+                    parsed = json.loads(pattern or "")
+                except ValueError:
+                    print(f"Skipping signature {name}: unknown pattern {pattern!r}")
+                    continue
+                definition.update(parsed if isinstance(parsed, dict) else {"conditions": parsed})
+            definitions.append(definition)
+
+        return definitions, digest.hexdigest()
+
+    def _build_plan(self, definitions: List[Dict], fingerprint: str) -> _Plan:
+        """Compile rule definitions into an evaluation plan."""
+        by_name: Dict[str, SignatureRule] = {}
+        for definition in definitions:
+            try:
+                rule = SignatureRule(
+                    name=definition["name"],
+                    conditions=list(definition.get("conditions", [])),
+                    kind=definition.get("kind", "signature"),
+                    label=definition.get("label") or definition.get("description") or definition["name"],
+                    score=float(definition.get("score", 0.0)),
+                    severity=definition.get("severity", "low"),
+                    description=definition.get("description", ""),
+                    source=definition.get("source", "builtin"),
+                    enabled=definition.get("enabled", True)
+                )
+                if rule.kind not in KINDS:
+                    raise ValueError(f"Unknown kind: {rule.kind}")
+                # Checked here, not only when compiling, since evaluate_columns runs every condition
+                _check_conditions(rule.conditions)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping invalid signature {definition.get('name')}: {e}")
+                continue
+            by_name.pop(rule.name, None)  # Later definitions replace, and move to the end
+            by_name[rule.name] = rule
+
+        rules, predicates, generic, port_rules = [], [], [], {}
+        for rule in by_name.values():
+            if not rule.enabled:
+                continue
+            ports, remaining = _port_dispatch(rule.conditions)
+            try:
+                predicate = _compile_predicate(remaining)
+            except (ValueError, SyntaxError) as e:
+                print(f"Skipping invalid signature {rule.name}: {e}")
+                continue
+            index = len(rules)
+            rules.append(rule)
+            predicates.append(predicate)
+            if ports is None:
+                generic.append(index)
+            else:
+                for port in ports:
+                    port_rules.setdefault(port, []).append(index)
+
+        by_port = {port: tuple(sorted(generic + indices)) for port, indices in port_rules.items()}
+        return _Plan(rules=rules, predicates=predicates, generic=tuple(generic), by_port=by_port,
+                     fingerprint=fingerprint, matches=[0] * len(rules),
+                     sampled_seconds=[0.0] * len(rules))
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the plan if any rule source changed. Returns True if swapped."""
+        definitions, fingerprint = self._read_sources()
+        if not force and fingerprint == self._plan.fingerprint:
+            return False
+        old = self._plan
+        plan = self._build_plan(definitions, fingerprint)
+        counts = {rule.name: old.matches[i] for i, rule in enumerate(old.rules)}
+        plan.matches = [counts.get(rule.name, 0) for rule in plan.rules]
+        self._plan = plan
+        self._reloads += 1
+        return True
+
+    def evaluate(self, context: Dict) -> List[SignatureRule]:
+        """Get every rule matching one connection context, in rule order."""
+        plan = self._plan
+        started = time.perf_counter()
+        indices = plan.by_port.get(context["dest_port"], plan.generic)
+
+        self._evaluations += 1
+        if self._evaluations % self.profile_every == 0:
+            matched = []
+            plan.sampled_runs += 1
+            for i in indices:
+                rule_started = time.perf_counter()
+                hit = plan.predicates[i](context)
+                plan.sampled_seconds[i] += time.perf_counter() - rule_started
+                if hit:
+                    matched.append(i)
+        else:
+            predicates = plan.predicates
+            matched = [i for i in indices if predicates[i](context)]
+
+        for i in matched:
+            plan.matches[i] += 1
+        self._eval_seconds += time.perf_counter() - started
+        return [plan.rules[i] for i in matched]
+
+    def evaluate_batch(self, contexts: List[Dict]) -> List[List[SignatureRule]]:
+        """Evaluate a batch of connection contexts."""
+        return [self.evaluate(context) for context in contexts]
+
+    def evaluate_columns(self, columns: Dict[str, np.ndarray]) -> Tuple[List[SignatureRule], np.ndarray]:
+        """Evaluate every rule over columnar connection contexts.
+
+        Returns the rules and a boolean (rules x rows) match matrix.
+        """
+        plan = self._plan
+        rows = len(columns["dest_port"])
+        started = time.perf_counter()
+        mask = np.ones((len(plan.rules), rows), dtype=bool)
+        for i, rule in enumerate(plan.rules):
+            for condition in rule.conditions:
+                mask[i] &= _column_mask(condition, columns)
+            plan.matches[i] += int(np.count_nonzero(mask[i]))
+
+        self._evaluations += rows
+        self._eval_seconds += time.perf_counter() - started
+        return list(plan.rules), mask
+
+    def score_columns(self, rules: List[SignatureRule], mask: np.ndarray) -> np.ndarray:
+        """Sum matched rule scores per row, in rule order like apply()."""
+        scores = np.zeros(mask.shape[1])
+        for i, rule in enumerate(rules):
+            scores += np.where(mask[i], rule.score, 0.0)
+        return np.minimum(scores, 1.0)
+
+    def apply(self, matches: List[SignatureRule], analysis: Dict) -> Dict:
+        """Fold matched rules into an analysis dict in rule order."""
+        for rule in matches:
+            bucket = KINDS[rule.kind]
+            if bucket is not None:
+                analysis[bucket].append(rule.label)
+            else:
+                analysis["signature_matches"].append({
+                    "name": rule.name,
+                    "severity": rule.severity,
+                    "description": rule.description
+                })
+            analysis["threat_score"] += rule.score
+        analysis["threat_score"] = min(1.0, analysis["threat_score"])
+        return analysis
+
+    def get_stats(self) -> Dict:
+        """Get per-rule match counts and evaluation timings."""
+        plan = self._plan
+        runs = max(1, plan.sampled_runs)
+        return {
+            "rules": len(plan.rules),
+            "reloads": self._reloads,
+            "evaluations": self._evaluations,
+            "avg_evaluation_us": round(self._eval_seconds / max(1, self._evaluations) * 1e6, 3),
+            "per_rule": [
+                {
+                    "name": rule.name,
+                    "source": rule.source,
+                    "kind": rule.kind,
+                    "severity": rule.severity,
+                    "matches": plan.matches[i],
+                    "avg_sampled_us": round(plan.sampled_seconds[i] / runs * 1e6, 3)
+                }
+                for i, rule in enumerate(plan.rules)
+            ]
+        }
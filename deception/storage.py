@@ -0,0 +1,329 @@
+import atexit
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import migrations
+
+def epoch_ms(dt: Optional[datetime] = None) -> int:
+    """Convert a naive local datetime (default: now) to epoch milliseconds."""
+    if dt is None:
+        return int(time.time() * 1000)
+    return int(dt.timestamp() * 1000)
+
+class QueryCancelled(Exception):
+    """Raised when a read query is interrupted by its cancel scope."""
+
+class CancelScope:
+    """Deadline and cancellation flag checked by running read queries."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+current_cancel_scope: contextvars.ContextVar = contextvars.ContextVar("current_cancel_scope", default=None)
+
+class StorageEngine:
+    """Shared SQLite access for one database file within one process.
+
+    All writes go through a single WAL-mode connection owned by a dedicated
+    writer thread. Queued statements are group-committed every
+    ``flush_interval_ms`` milliseconds or ``batch_rows`` rows, whichever comes
+    first, and each statement runs inside its own savepoint so one bad row
+    does not roll back the rest of the batch. Reads use a small pool of
+    read-only connections, which WAL lets run concurrently with the writer.
+    """
+
+    _STOP = object()
+
+    def __init__(self,
+                 db_path: str = "honeypot.db",
+                 flush_interval_ms: Optional[int] = None,
+                 batch_rows: Optional[int] = None,
+                 read_pool_size: Optional[int] = None):
+        self.db_path = os.path.abspath(db_path)
+        self.flush_interval = (flush_interval_ms or int(os.getenv("STORAGE_FLUSH_MS", "50"))) / 1000
+        self.batch_rows = batch_rows or int(os.getenv("STORAGE_BATCH_ROWS", "500"))
+        self.read_pool_size = read_pool_size or int(os.getenv("STORAGE_READ_POOL", "4"))
+
+        self._ops: "queue.Queue" = queue.Queue()
+        self._readers: "queue.LifoQueue" = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._migrate_lock = threading.Lock()
+        self._closed = False
+        self.schema_version = None
+        self.backfill = None
+
+        self._metrics = {
+            "statements": 0,
+            "rows": 0,
+            "commits": 0,
+            "errors": 0,
+            "last_commit_ms": 0.0,
+            "max_batch_rows": 0
+        }
+
+        ready = Future()
+        self._writer = threading.Thread(target=self._run_writer, args=(ready,),
+                                         name="storage-writer", daemon=True)
+        self._writer.start()
+        ready.result()
+
+    def _open_writer(self) -> sqlite3.Connection:
+        """Open the single read-write connection."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        """Open a read-only connection for the read pool."""
+        uri = Path(self.db_path).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _run_writer(self, ready: Future):
+        """Writer thread: collect queued operations and group-commit them."""
+        try:
+            conn = self._open_writer()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(True)
+
+        while True:
+            op = self._ops.get()
+            if op is self._STOP:
+                break
+
+            batch = [op]
+            rows = self._op_rows(op)
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    op = self._ops.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if op is self._STOP:
+                    stop = True
+                    break
+                batch.append(op)
+                rows += self._op_rows(op)
+
+            self._commit_batch(conn, batch, rows)
+            if stop:
+                break
+
+        # Commit anything queued behind the stop marker
+        leftover = []
+        while True:
+            try:
+                op = self._ops.get_nowait()
+            except queue.Empty:
+                break
+            if op is not self._STOP:
+                leftover.append(op)
+        if leftover:
+            self._commit_batch(conn, leftover, sum(self._op_rows(op) for op in leftover))
+        conn.close()
+
+    @staticmethod
+    def _op_rows(op) -> int:
+        kind, payload, _ = op
+        return len(payload[1]) if kind == "many" else 1
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List, rows: int):
+        """Run a batch of operations in one transaction."""
+        started = time.perf_counter()
+        results = []
+        conn.execute("BEGIN")
+        for kind, payload, future in batch:
+            conn.execute("SAVEPOINT op")
+            try:
+                if kind == "sql":
+                    result = conn.execute(*payload).lastrowid
+                elif kind == "many":
+                    result = conn.executemany(*payload).rowcount
+                else:
+                    result = payload(conn)
+                conn.execute("RELEASE op")
+                results.append((future, result, None))
+            except Exception as e:
+                conn.execute("ROLLBACK TO op")
+                conn.execute("RELEASE op")
+                self._metrics["errors"] += 1
+                if future is None:
+                    print(f"Storage write failed: {e}")
+                results.append((future, None, e))
+
+        try:
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            self._metrics["errors"] += 1
+            print(f"Storage commit failed: {e}")
+            results = [(future, None, e) for future, _, _ in results]
+
+        self._metrics["statements"] += len(batch)
+        self._metrics["rows"] += rows
+        self._metrics["commits"] += 1
+        self._metrics["last_commit_ms"] = (time.perf_counter() - started) * 1000
+        self._metrics["max_batch_rows"] = max(self._metrics["max_batch_rows"], rows)
+
+        for future, result, error in results:
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _submit(self, kind: str, payload, wait: bool):
+        if self._closed:
+            raise RuntimeError("Storage engine is closed")
+        future = Future() if wait else None
+        self._ops.put((kind, payload, future))
+        return future
+
+    def execute(self, sql: str, params: Sequence = ()) -> None:
+        """Queue a write statement for the next group commit."""
+        self._submit("sql", (sql, tuple(params)), wait=False)
+
+    def executemany(self, sql: str, rows: Iterable[Sequence]) -> None:
+        """Queue a multi-row write for the next group commit."""
+        rows = [tuple(row) for row in rows]
+        if rows:
+            self._submit("many", (sql, rows), wait=False)
+
+    def execute_and_wait(self, sql: str, params: Sequence = (), timeout: Optional[float] = None) -> int:
+        """Queue a write statement and wait for its commit. Returns lastrowid."""
+        return self._submit("sql", (sql, tuple(params)), wait=True).result(timeout)
+
+    def call(self, fn: Callable[[sqlite3.Connection], Any], timeout: Optional[float] = None) -> Any:
+        """Run ``fn(connection)`` on the writer thread and wait for its commit."""
+        return self._submit("call", fn, wait=True).result(timeout)
+
+    def migrate(self) -> int:
+        """Apply pending schema migrations once and start the online backfill."""
+        with self._migrate_lock:
+            if self.schema_version is None:
+                self.schema_version = self.call(migrations.migrate)
+                self.backfill = migrations.Backfill(self)
+                self.backfill.start()
+        return self.schema_version
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until everything queued so far has been committed."""
+        self.call(lambda conn: None, timeout)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_lock:
+            if self._reader_count < self.read_pool_size:
+                self._reader_count += 1
+                return self._open_reader()
+        return self._readers.get()
+
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        """Run a read query on a pooled read-only connection.
+
+        If the calling context has a ``CancelScope``, the query is interrupted
+        as soon as the scope is cancelled or its deadline passes.
+        """
+        scope = current_cancel_scope.get()
+        if scope is not None and scope.cancelled:
+            raise QueryCancelled("Query cancelled before it started")
+
+        conn = self._acquire_reader()
+        try:
+            if scope is not None:
+                conn.set_progress_handler(lambda: 1 if scope.cancelled else 0, 1000)
+            return conn.execute(sql, tuple(params)).fetchall()
+        except sqlite3.OperationalError as e:
+            if scope is not None and scope.cancelled:
+                raise QueryCancelled("Query interrupted") from e
+            raise
+        finally:
+            if scope is not None:
+                conn.set_progress_handler(None, 0)
+            self._readers.put(conn)
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        """Run a read query and return its first row."""
+        rows = self.query(sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        """Commit pending writes and close all connections."""
+        if self._closed:
+            return
+        self._closed = True
+        self._ops.put(self._STOP)
+        self._writer.join()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_metrics(self) -> Dict:
+        """Get writer queue and group-commit statistics."""
+        return {
+            "db_path": self.db_path,
+            "pending_operations": self._ops.qsize(),
+            "flush_interval_ms": self.flush_interval * 1000,
+            "batch_rows": self.batch_rows,
+            "read_connections": self._reader_count,
+            "schema_version": self.schema_version,
+            "backfill": dict(self.backfill.progress) if self.backfill else {},
+            **{key: round(value, 3) if isinstance(value, float) else value
+               for key, value in self._metrics.items()}
+        }
+
+_engines: Dict[tuple, StorageEngine] = {}
+_engines_lock = threading.Lock()
+
+def get_storage(db_path: str = "honeypot.db") -> StorageEngine:
+    """Get the process-wide storage engine for a database file."""
+    key = (os.getpid(), os.path.abspath(db_path))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = StorageEngine(db_path)
+            _engines[key] = engine
+        return engine
+
+@atexit.register
+def close_all():
+    """Flush and close every storage engine opened by this process."""
+    with _engines_lock:
+        engines = [engine for (pid, _), engine in _engines.items() if pid == os.getpid()]
+        _engines.clear()
+    for engine in engines:
+        engine.close()
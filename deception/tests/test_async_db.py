@@ -0,0 +1,55 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from async_db import AsyncDataAccess, QueryTimeout
+
+def test_run_returns_result_and_times_out():
+    async def main():
+        access = AsyncDataAccess(max_workers=2, max_pending=4, default_timeout=0.2)
+        try:
+            assert await access.run(sum, [1, 2, 3]) == 6
+            with pytest.raises(QueryTimeout):
+                await access.run(time.sleep, 0.5)
+            return access.get_metrics()
+        finally:
+            access.shutdown()
+
+    metrics = asyncio.run(main())
+    assert (metrics["calls"], metrics["timeouts"]) == (2, 1)
+
+def test_timed_out_calls_keep_their_slot_until_they_finish():
+    lock = threading.Lock()
+    running = peak = 0
+
+    def slow_query():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.3)
+        with lock:
+            running -= 1
+
+    async def main():
+        access = AsyncDataAccess(max_workers=8, max_pending=2, default_timeout=0.05)
+        try:
+            for _ in range(3):
+                # Each wave times out while the previous waves' threads are still running
+                outcomes = await asyncio.gather(*(access.run(slow_query) for _ in range(2)),
+                                                return_exceptions=True)
+                assert all(isinstance(outcome, QueryTimeout) for outcome in outcomes)
+            await asyncio.sleep(0.4)  # Let the abandoned calls return and hand back their slots
+            assert access.get_metrics()["in_flight"] == 0
+            await access.run(sum, [1])
+        finally:
+            access.shutdown()
+
+    asyncio.run(main())
+    assert peak <= 2
@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bloom import IPSet, compile_ipset
+from ip_index import parse_ip
+
+def _addresses(count: int, third_octet: int = 0):
+    return [f"10.{third_octet}.{i // 256}.{i % 256}" for i in range(count)]
+
+def test_compile_and_lookup(tmp_path):
+    path = str(tmp_path / "feed.ipset")
+    stats = compile_ipset(_addresses(5000) + ["2001:db8::1", "not an ip"], path)
+    assert (stats["ipv4"], stats["ipv6"], stats["rejected"]) == (5000, 1, 1)
+
+    ipset = IPSet(path)
+    assert all(ipset.contains(*parse_ip(ip)) for ip in _addresses(5000))
+    assert ipset.contains(*parse_ip("2001:db8::1"))
+    assert not any(ipset.contains(*parse_ip(ip)) for ip in _addresses(5000, third_octet=200))
+
+def test_recompile_while_mapped(tmp_path):
+    path = str(tmp_path / "feed.ipset")
+    compile_ipset(_addresses(50000), path)
+    old = IPSet(path)
+
+    # Rewriting in place would truncate the mapped file and fault the next read of `old`
+    compile_ipset(["192.0.2.1"], path)
+    assert all(old.contains(*parse_ip(ip)) for ip in _addresses(50000)[-1000:])
+
+    new = IPSet(path)
+    assert len(new) == 1 and new.contains(*parse_ip("192.0.2.1"))
+    assert [name for name in os.listdir(tmp_path) if name != "feed.ipset"] == []
@@ -0,0 +1,57 @@
+import gzip
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+from bulk_import import BulkImporter, detect_format
+from network_analyzer import NetworkAnalyzer
+
+@pytest.fixture
+def importer(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIGNATURE_RULES_DIR", str(tmp_path / "rules"))
+    yield BulkImporter(NetworkAnalyzer(str(tmp_path / "honeypot.db")), chunk_rows=10,
+                       import_dir=str(tmp_path / "imports"))
+    storage.close_all()
+
+def stored_rows(importer):
+    return importer.storage.query("SELECT source_ip, dest_port, ts FROM network_connections ORDER BY ts")
+
+def test_csv_import_counts_bad_lines_and_resumes(importer, tmp_path):
+    path = tmp_path / "conns.csv"
+    lines = ["ts,src_ip,dst_ip,dst_port,proto,orig_bytes"]
+    lines += [f"{1700000000 + i},198.51.100.{i},10.0.0.1,{20 + i},tcp,100" for i in range(25)]
+    lines.insert(5, "1700000100,,10.0.0.1,80,tcp,100")  # No source IP
+    path.write_text("\n".join(lines) + "\n")
+
+    assert detect_format(path) == "csv"
+    stats = importer.import_file(str(path))
+    assert (stats["rows"], stats["errors"], stats["finished"]) == (25, 1, True)
+    rows = stored_rows(importer)
+    assert len(rows) == 25
+    assert rows[0] == ("198.51.100.0", 20, 1700000000000)
+
+    # A finished file is not imported twice
+    again = importer.import_file(str(path))
+    assert again["finished"] and again["imported"] == 0
+    assert len(stored_rows(importer)) == 25
+
+def test_cancelled_import_resumes_from_checkpoint(importer, tmp_path):
+    path = tmp_path / "conns.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        for i in range(35):
+            f.write(json.dumps({"ts": 1700000000 + i, "src_ip": "203.0.113.9", "dest_port": 1000 + i}) + "\n")
+
+    cancel = threading.Event()
+    stats = importer.import_file(str(path), progress=lambda stats: cancel.set(), cancel=cancel)
+    assert stats["rows"] == 10 and not stats["finished"]
+
+    stats = importer.import_file(str(path))
+    assert stats["resumed_from"] > 0
+    assert (stats["rows"], stats["imported"], stats["finished"]) == (35, 25, True)
+    assert [port for _, port, _ in stored_rows(importer)] == list(range(1000, 1035))
@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feed_manager import FeedManager
+
+def test_reload_loads_feeds_and_skips_a_malformed_csv(tmp_path):
+    (tmp_path / "blocklist.txt").write_text("# type: botnet\n203.0.113.0/24\n198.51.100.7  # C2\n",
+                                            encoding="utf-8")
+    (tmp_path / "good.csv").write_text("ip,type,confidence\n192.0.2.10,scanner,80\n", encoding="utf-8")
+    # A field over csv.field_size_limit() makes the reader raise csv.Error
+    (tmp_path / "broken.csv").write_text('ip\n"' + "x" * 200_000 + '"\n', encoding="utf-8")
+
+    feeds = FeedManager(feed_dir=str(tmp_path))
+
+    assert "error" in feeds.feed_stats["broken"]
+    assert feeds.feed_stats["blocklist"]["entries"] == 2
+    hits = feeds.index.lookup("203.0.113.99")
+    assert [(hit["feed"], hit["type"]) for hit in hits] == [("blocklist", "botnet")]
+    assert feeds.index.lookup("192.0.2.10")[0]["confidence"] == 0.8
+    assert feeds.index.lookup("192.0.2.11") == []
@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_generator import FakeFileGenerator
+from markov import MarkovTextModel
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = FakeFileGenerator()
+    generator.markov_model = MarkovTextModel.train(generator.templates, seed=1)
+    return generator
+
+def test_large_batch_writes_distinct_files(generator):
+    # Far more files than there are short names: later picks must see the earlier ones
+    files = generator.generate_multiple_files(5000, "markov")
+
+    names = [file["filename"] for file in files]
+    assert len(set(names)) == 5000
+    assert len(os.listdir(generator.static_dir)) == 5000
+    assert not generator._reserved
+
+def test_concurrent_batches_write_distinct_files(generator):
+    results = []
+
+    def run():
+        results.extend(generator.generate_multiple_files(1000, "markov"))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({file["filename"] for file in results}) == 4000
+    assert len(os.listdir(generator.static_dir)) == 4000
+
+def test_failed_batch_releases_its_names(generator, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(generator.markov_model, "generate_for", fail)
+    with pytest.raises(RuntimeError):
+        generator.generate_multiple_files(50, "markov")
+    assert not generator._reserved
@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generation_jobs import GenerationJobs, JobQueueFull
+
+class FakeGenerator:
+    """Stands in for FakeFileGenerator; ``gate`` holds every chunk until set."""
+
+    def __init__(self, fail_after=None):
+        self.gate = threading.Event()
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def generate_multiple_files(self, count, backend):
+        self.gate.wait(5)
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("model unavailable")
+        return [{"filename": f"f{self.calls}-{i}.txt", "size": 10} for i in range(count)]
+
+def wait_for(jobs, job_id, statuses, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {jobs.get_job(job_id)['status']}")
+
+def test_queue_limit_and_cancel():
+    generator = FakeGenerator()
+    jobs = GenerationJobs(generator, workers=1, max_queued=2, chunk_files=4)
+    jobs.start()
+    try:
+        with pytest.raises(ValueError):
+            jobs.submit(0)
+        running = jobs.submit(10, "markov")["job_id"]
+        wait_for(jobs, running, ("running",))
+        queued = [jobs.submit(4, "markov")["job_id"] for _ in range(2)]
+        with pytest.raises(JobQueueFull):
+            jobs.submit(4, "markov")
+
+        # A cancelled job frees its queue slot at once
+        assert jobs.cancel(queued[0])
+        assert jobs.get_job(queued[0])["status"] == "cancelled"
+        jobs.submit(4, "markov")
+
+        generator.gate.set()
+        job = wait_for(jobs, running, ("finished",))
+        assert job["generated"] == 10 and len(job["files"]) == 10 and job["total_bytes"] == 100
+        assert jobs.get_job(running, 8)["files"] == job["files"][8:]
+        assert "files" not in jobs.list_jobs()[0]
+    finally:
+        jobs.stop()
+
+def test_failed_job_is_recorded():
+    generator = FakeGenerator(fail_after=1)
+    generator.gate.set()
+    jobs = GenerationJobs(generator, workers=1, chunk_files=2)
+    jobs.start()
+    try:
+        job_id = jobs.submit(6, "markov")["job_id"]
+        job = wait_for(jobs, job_id, ("failed",))
+        assert job["generated"] == 2 and job["error"] == "model unavailable"
+        assert jobs.get_stats()["last_error"] == f"{job_id}: model unavailable"
+    finally:
+        jobs.stop()
@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from geoip import GeoIPDatabase, compile_csv
+
+def _write_csv(path: Path, networks: int):
+    rows = ["network,country,city,asn,latitude,longitude"]
+    rows += [f"10.{i // 256}.{i % 256}.0/24,Testland,City {i},{64500 + i % 100},1.5,-2.5" for i in range(networks)]
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+def test_compile_and_lookup(tmp_path):
+    _write_csv(tmp_path / "ranges.csv", 300)
+    stats = compile_csv(str(tmp_path / "ranges.csv"), str(tmp_path / "geo.vgeo"))
+    assert stats["ipv4_ranges"] == 300
+
+    db = GeoIPDatabase(str(tmp_path / "geo.vgeo"))
+    location = db.lookup("10.0.7.200")
+    assert (location["city"], location["asn"], location["latitude"]) == ("City 7", "AS64507", 1.5)
+    assert db.lookup("192.0.2.1") is None
+    assert [r and r["city"] for r in db.lookup_many(["10.1.0.1", "bogus", "10.0.1.1"])] == ["City 256", None, "City 1"]
+
+def test_recompile_while_mapped(tmp_path):
+    _write_csv(tmp_path / "big.csv", 20000)
+    _write_csv(tmp_path / "small.csv", 1)
+    path = str(tmp_path / "geo.vgeo")
+    compile_csv(str(tmp_path / "big.csv"), path)
+    old = GeoIPDatabase(path, record_cache=0)
+
+    # Rewriting in place would truncate the mapped file and fault the next read of `old`
+    compile_csv(str(tmp_path / "small.csv"), path)
+    assert old.lookup("10.78.31.9")["city"] == "City 19999"
+
+    assert GeoIPDatabase(path).lookup("10.78.31.9") is None
+    assert sorted(os.listdir(tmp_path)) == ["big.csv", "geo.vgeo", "small.csv"]
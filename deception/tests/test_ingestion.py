@@ -0,0 +1,61 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion import AccessEvent, IngestionPipeline
+
+def access(index: int) -> AccessEvent:
+    return AccessEvent(filename=f"file{index}.txt", ip_address="203.0.113.9",
+                       user_agent="curl/8.0", header_count=4, file_size=100)
+
+def test_stop_drains_queued_events():
+    seen = []
+
+    async def record(batch):
+        await asyncio.sleep(0.01)
+        seen.extend(event.filename for event in batch)
+
+    async def fail(batch):
+        raise RuntimeError("alert channel down")
+
+    async def main():
+        pipeline = IngestionPipeline([("record", record), ("alert", fail)], batch_size=100, workers=2)
+        await pipeline.start()
+        for index in range(250):
+            assert await pipeline.publish(access(index))
+        await pipeline.stop()
+        assert not await pipeline.publish(access(250))
+        return pipeline.get_metrics()
+
+    metrics = asyncio.run(main())
+    assert sorted(seen) == sorted(f"file{index}.txt" for index in range(250))
+    assert metrics["processed"] == 250 and metrics["dropped"] == 1
+    # A failing stage is counted per batch and does not stop the others
+    assert metrics["stage_errors"] == {"record": 0, "alert": metrics["batches"]}
+
+def test_drop_oldest_keeps_newest_events():
+    seen = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def record(batch):
+            await gate.wait()
+            seen.extend(event.filename for event in batch)
+
+        pipeline = IngestionPipeline([("record", record)], max_depth=3, batch_size=1, workers=1,
+                                     policy="drop_oldest")
+        await pipeline.start()
+        await pipeline.publish(access(0))
+        await asyncio.sleep(0)  # The worker takes event 0 and waits on the gate
+        for index in range(1, 6):
+            assert await pipeline.publish(access(index))
+        gate.set()
+        await pipeline.stop()
+        return pipeline.get_metrics()
+
+    metrics = asyncio.run(main())
+    assert seen == ["file0.txt", "file3.txt", "file4.txt", "file5.txt"]
+    assert metrics["dropped"] == 2
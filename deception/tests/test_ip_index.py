@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bloom import IPSet, compile_ipset
+from ip_index import FeedTag, IPIndexBuilder
+
+SPAM = FeedTag("spamhaus", "spam", 0.8, "Spamhaus DROP", "Hijacked netblock")
+TOR = FeedTag("tor", "anonymizer", 0.6, "Tor exits", "Tor exit node")
+SCAN = FeedTag("scanners", "scanner", 0.7, "Scanner list", "Known scanner")
+
+def build():
+    builder = IPIndexBuilder()
+    for network in ("198.51.100.0/24", "198.51.0.0/16", "2001:db8::/32", "2001:db8:1::/48"):
+        assert builder.add(network, SPAM)
+    assert builder.add("198.51.100.7", TOR)
+    assert builder.add("::ffff:203.0.113.5", TOR)  # Stored as IPv4
+    assert not builder.add("not-an-ip", TOR)
+    assert builder.rejected == 1
+    return builder
+
+def test_longest_prefix_per_feed_in_feed_order():
+    index = build().build()
+
+    hits = index.lookup("198.51.100.7")
+    assert [(hit["feed"], hit["network"]) for hit in hits] == [
+        ("spamhaus", "198.51.100.0/24"), ("tor", "198.51.100.7/32")]
+    assert [hit["network"] for hit in index.lookup("198.51.7.1")] == ["198.51.0.0/16"]
+    assert [hit["network"] for hit in index.lookup("2001:db8:1::9")] == ["2001:db8:1::/48"]
+    assert [hit["feed"] for hit in index.lookup("::ffff:198.51.100.7")] == ["spamhaus", "tor"]
+    assert index.lookup("203.0.113.5")[0]["network"] == "203.0.113.5/32"
+    assert index.lookup("192.0.2.1") == [] and index.lookup("bogus") == []
+    assert index.contains("198.51.100.7", "anonymizer") and not index.contains("198.51.7.1", "anonymizer")
+
+def test_lookup_many_matches_lookup(tmp_path):
+    path = tmp_path / "scanners.ipset"
+    compile_ipset(["192.0.2.44", "2001:db8:ffff::1"], str(path))
+    builder = build()
+    builder.add_exact_set(IPSet(str(path)), SCAN)
+    index = builder.build()
+
+    addresses = ["198.51.100.7", "198.51.7.1", "192.0.2.44", "192.0.2.45", "2001:db8:ffff::1",
+                 "203.0.113.5", "bogus"]
+    assert index.lookup_many(addresses) == [index.lookup(address) for address in addresses]
+    assert index.lookup("192.0.2.44")[0]["feed"] == "scanners"
+    assert len(index) == 8
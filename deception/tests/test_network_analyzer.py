@@ -0,0 +1,76 @@
+import json
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+from network_analyzer import NetworkAnalyzer, NetworkConnection
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIGNATURE_RULES_DIR", str(tmp_path / "rules"))
+    yield NetworkAnalyzer(str(tmp_path / "honeypot.db"))
+    storage.close_all()
+
+def test_score_batch_matches_scalar_path(analyzer, monkeypatch):
+    rng = random.Random(7)
+    ports = [21, 22, 23, 80, 443, 445, 1433, 3306, 3389, 5900, 8080, rng.randrange(1024, 65536)]
+    rows = [
+        {
+            "dest_port": rng.choice(ports),
+            "source_port": rng.randrange(1024, 65536),
+            "protocol": rng.choice(["TCP", "UDP", "ICMP"]),
+            "bytes_sent": rng.choice([0, 512, 50_000, 5_000_000]),
+            "bytes_received": rng.choice([0, 1024, 20_000_000]),
+            "window_connections": rng.randrange(0, 200),
+            "window_unique_ports": rng.randrange(0, 40)
+        }
+        for _ in range(500)
+    ]
+
+    batch = analyzer.score_batch(**{field: [row[field] for row in rows] for field in rows[0]})
+
+    for index, row in enumerate(rows):
+        monkeypatch.setattr(analyzer.connection_tracker, "window_stats",
+                            lambda ip, minutes=None, now_ms=None, row=row:
+                            (row["window_connections"], row["window_unique_ports"]))
+        connection = NetworkConnection(
+            source_ip="203.0.113.9", dest_ip="10.0.0.1", source_port=row["source_port"],
+            dest_port=row["dest_port"], protocol=row["protocol"], timestamp=datetime.now(),
+            bytes_sent=row["bytes_sent"], bytes_received=row["bytes_received"], duration=1.0, flags=[]
+        )
+        scalar = analyzer._analyze_connection_patterns(connection)
+        matched = [rule for rule, hit in zip(batch["rules"], batch["matches"][:, index]) if hit]
+        expected = analyzer.signature_engine.apply(matched, {
+            "threat_score": 0.0, "anomalies": [], "pattern_matches": [], "risk_factors": [], "signature_matches": []
+        })
+        assert batch["threat_score"][index] == pytest.approx(scalar["threat_score"])
+        assert expected == scalar
+
+def test_rescore_history_applies_rule_changes(analyzer, tmp_path):
+    for port in (22, 8080, 8080):
+        analyzer.analyze_connection("198.51.100.7", "10.0.0.1", 40000, port, "TCP", 10, 10)
+    analyzer.storage.call(lambda conn: None)  # Wait for the queued inserts to commit
+
+    def stored_scores():
+        return [row[0] for row in analyzer.storage.query(
+            "SELECT threat_score FROM network_connections ORDER BY id")]
+
+    assert stored_scores() == [pytest.approx(0.3), 0.0, 0.0]
+
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    (rules_dir / "alt_http.json").write_text(json.dumps([
+        {"name": "Alt_HTTP", "kind": "risk_factor", "score": 0.25,
+         "conditions": [{"field": "dest_port", "op": "eq", "value": 8080}]}
+    ]), encoding="utf-8")
+    assert analyzer.signature_engine.reload()
+
+    result = analyzer.rescore_history(0)
+    assert (result["rows_scored"], result["rows_changed"]) == (3, 2)
+    assert stored_scores() == [pytest.approx(0.3), pytest.approx(0.25), pytest.approx(0.25)]
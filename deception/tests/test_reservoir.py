@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_generator import FakeFileGenerator
+from reservoir import SnippetReservoir
+
+class CountingModel:
+    """Text model stub that counts its calls and holds them until ``gate`` is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+
+    def generate(self, prompts, max_length=150):
+        self.gate.wait(5)
+        self.calls += 1
+        return ["generated snippet"] * len(prompts)
+
+@pytest.fixture
+def reservoir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DECOY_RESERVOIR_NICENESS", "0")
+    model = CountingModel()
+    reservoir = SnippetReservoir(FakeFileGenerator(text_model=model), high_water=8, refill_batch=4)
+    yield reservoir, model
+    reservoir.stop()
+
+def wait_full(reservoir, timeout=5):
+    deadline = time.time() + timeout
+    while reservoir.get_stats()["total_depth"] < reservoir.high_water * len(reservoir._pools):
+        assert time.time() < deadline, reservoir.get_stats()
+        time.sleep(0.01)
+
+def test_idle_reservoir_never_calls_the_model(reservoir):
+    reservoir, model = reservoir
+    time.sleep(0.05)
+    assert model.calls == 0 and not reservoir._threads
+
+def test_create_files_reports_shortfall_then_serves_from_pool(reservoir):
+    reservoir, model = reservoir
+    files, missing = reservoir.create_files(40)
+    # The pool starts empty: only templates without a {text} slot are written
+    assert len(files) + missing == 40 and missing > 0
+    assert not reservoir.generator._reserved
+    assert reservoir._threads
+
+    model.gate.set()
+    wait_full(reservoir)
+    # No category can run dry: each holds as many snippets as there are files
+    served, short = reservoir.create_files(8)
+    assert (len(served), short) == (8, 0)
+    category = next(iter(reservoir._pools))
+    template, text = reservoir.take(category)
+    assert text == "generated snippet" and template in reservoir._text_templates[category]
+
+    stats = reservoir.get_stats()
+    assert stats["misses"] == missing and stats["hits"] >= 1 and stats["last_error"] is None
+    assert len(os.listdir(reservoir.generator.static_dir)) == len(files) + 8
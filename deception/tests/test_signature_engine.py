@@ -0,0 +1,60 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+from signature_engine import SignatureEngine
+
+CONTEXT = {"dest_port": 22, "source_port": 40000, "protocol": "TCP", "bytes_sent": 10,
+           "bytes_received": 10, "total_bytes": 20, "window_connections": 30, "window_unique_ports": 2}
+
+@pytest.fixture
+def db(tmp_path):
+    engine = storage.get_storage(str(tmp_path / "honeypot.db"))
+    engine.migrate()
+    yield engine
+    storage.close_all()
+
+def _engine(db, tmp_path, rules):
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir(exist_ok=True)
+    (rules_dir / "custom.json").write_text(json.dumps(rules), encoding="utf-8")
+    return SignatureEngine(db, rules_dir=str(rules_dir))
+
+def _columns(context):
+    return {name: np.array([value], dtype=object if name == "protocol" else np.int64)
+            for name, value in context.items()}
+
+def test_rule_file_rules_match(db, tmp_path):
+    engine = _engine(db, tmp_path, [
+        {"name": "SSH_Flood", "score": 0.6, "conditions": [{"field": "dest_port", "op": "eq", "value": 22},
+                                                           {"field": "window_connections", "op": "gt", "value": 25}]}
+    ])
+    assert "SSH_Flood" in [rule.name for rule in engine.evaluate(CONTEXT)]
+    assert "SSH_Flood" not in [rule.name for rule in engine.evaluate(dict(CONTEXT, window_connections=5))]
+
+@pytest.mark.parametrize("condition", [
+    {"field": "dest_port", "op": "gt", "value": "abc"},
+    {"field": "dest_port", "op": "eq", "value": "22"},
+    {"field": "total_bytes", "op": "in", "value": [1, "x"]},
+    {"field": "protocol", "op": "eq", "value": 6},
+    {"field": "bytes_sent", "op": "gt", "value": True},
+    {"field": "bytes_sent", "op": "gt", "value": float("nan")},
+])
+def test_mistyped_rule_is_skipped(db, tmp_path, capsys, condition):
+    engine = _engine(db, tmp_path, [
+        {"name": "Bad", "score": 0.9, "conditions": [condition]},
+        {"name": "Good", "score": 0.1, "conditions": [{"field": "protocol", "op": "eq", "value": "TCP"}]}
+    ])
+    assert "Skipping invalid signature Bad" in capsys.readouterr().out
+
+    names = [rule.name for rule in engine.evaluate(CONTEXT)]
+    assert "Good" in names and "Bad" not in names
+    rules, matches = engine.evaluate_columns(_columns(CONTEXT))
+    assert "Bad" not in [rule.name for rule in rules]
+    assert matches.shape == (len(rules), 1)
@@ -0,0 +1,94 @@
+import sqlite3
+import sys
+from calendar import timegm
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import migrations
+import storage
+from storage import CancelScope, QueryCancelled, StorageEngine, current_cancel_scope
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = StorageEngine(str(tmp_path / "honeypot.db"), flush_interval_ms=20)
+    engine.call(lambda conn: conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)"))
+    yield engine
+    engine.close()
+
+def test_writes_are_group_committed(engine):
+    engine.executemany("INSERT INTO items (name) VALUES (?)", [(f"item{i}",) for i in range(100)])
+    for i in range(20):
+        engine.execute("INSERT INTO items (name) VALUES (?)", (f"single{i}",))
+    engine.flush()
+
+    assert engine.query_one("SELECT COUNT(*) FROM items") == (120,)
+    metrics = engine.get_metrics()
+    assert metrics["commits"] < metrics["statements"]
+
+def test_failed_statement_rolls_back_alone(engine):
+    engine.execute("INSERT INTO items (name) VALUES (?)", ("before",))
+    with pytest.raises(sqlite3.IntegrityError):
+        engine.execute_and_wait("INSERT INTO items (name) VALUES (NULL)")
+    engine.execute("INSERT INTO items (name) VALUES (?)", ("after",))
+    engine.flush()
+
+    assert engine.query("SELECT name FROM items ORDER BY id") == [("before",), ("after",)]
+    assert engine.get_metrics()["errors"] == 1
+
+def test_close_commits_queued_writes(tmp_path):
+    engine = StorageEngine(str(tmp_path / "honeypot.db"), flush_interval_ms=1000)
+    engine.call(lambda conn: conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    for i in range(50):
+        engine.execute("INSERT INTO items (name) VALUES (?)", (str(i),))
+    engine.close()
+
+    with pytest.raises(RuntimeError):
+        engine.execute("INSERT INTO items (name) VALUES ('late')")
+    conn = sqlite3.connect(tmp_path / "honeypot.db")
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone() == (50,)
+    conn.close()
+
+def test_cancelled_scope_stops_queries(engine):
+    scope = CancelScope()
+    scope.cancel()
+    token = current_cancel_scope.set(scope)
+    try:
+        with pytest.raises(QueryCancelled):
+            engine.query("SELECT COUNT(*) FROM items")
+    finally:
+        current_cancel_scope.reset(token)
+
+    # A deadline interrupts a long scan already under way
+    token = current_cancel_scope.set(CancelScope(timeout=0.05))
+    try:
+        with pytest.raises(QueryCancelled):
+            engine.query("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n")
+    finally:
+        current_cancel_scope.reset(token)
+    assert engine.query_one("SELECT COUNT(*) FROM items") == (0,)
+
+def test_migrate_upgrades_legacy_database(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    migrations._baseline_schema(conn)
+    conn.execute("CREATE TABLE schema_migrations (version INTEGER PRIMARY KEY, name TEXT, applied_at TIMESTAMP)")
+    conn.execute("INSERT INTO schema_migrations (version, name) VALUES (1, 'baseline_schema')")
+    conn.execute("INSERT INTO access_logs (ip_address, timestamp) VALUES ('198.51.100.7', '2024-01-02 03:04:05.678')")
+    conn.commit()
+    conn.close()
+
+    engine = storage.get_storage(str(db_path))
+    try:
+        assert engine.migrate() == migrations.MIGRATIONS[-1][0]
+        assert engine.migrate() == migrations.MIGRATIONS[-1][0]
+        assert engine.backfill.finished.wait(5)
+        # access_logs timestamps come from CURRENT_TIMESTAMP, which is UTC
+        expected = timegm((2024, 1, 2, 3, 4, 5)) * 1000 + 678
+        assert engine.query_one("SELECT ts FROM access_logs") == (expected,)
+        versions = engine.query("SELECT version FROM schema_migrations ORDER BY version")
+        assert [v for v, in versions] == [version for version, _, _ in migrations.MIGRATIONS]
+    finally:
+        storage.close_all()
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("requests")
+
+import storage
+from ip_index import FeedTag
+from threat_intelligence import ThreatIntelligence
+
+@pytest.fixture
+def intel(tmp_path, monkeypatch):
+    monkeypatch.setenv("THREAT_FEED_DIR", str(tmp_path / "feeds"))
+    monkeypatch.setenv("GEOIP_DB", str(tmp_path / "missing.vgeo"))
+    (tmp_path / "feeds").mkdir()
+    intel = ThreatIntelligence(str(tmp_path / "honeypot.db"))
+    yield intel
+    intel.feeds.stop()
+    intel.writer.stop()
+    intel.reputation.stop()
+    storage.close_all()
+
+def test_analysis_racing_a_feed_reload_is_not_cached(intel, tmp_path, monkeypatch):
+    lookup = intel._check_threat_feeds
+
+    def lookup_then_reload(ip_address):
+        hits = lookup(ip_address)  # Verdict from the old index...
+        (tmp_path / "feeds" / "new.txt").write_text("192.0.2.55\n", encoding="utf-8")
+        intel.feeds.reload()       # ...while a reload swaps the index and clears the cache
+        return hits
+
+    monkeypatch.setattr(intel, "_check_threat_feeds", lookup_then_reload)
+    assert intel.analyze_ip("192.0.2.55")["threat_indicators"] == []
+    monkeypatch.setattr(intel, "_check_threat_feeds", lookup)
+
+    assert intel.cache.get("192.0.2.55") is None
+    assert intel.analyze_ip("192.0.2.55")["threat_indicators"] != []
@@ -0,0 +1,30 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ttl_cache import TTLCache
+
+def test_lru_eviction_and_expiry():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # Evicts "b", the least recently used
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    cache.put("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get_stats()["expirations"] == 1
+
+def test_put_after_clear_is_dropped():
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.clear()  # e.g. a feed reload while the value was being computed
+    cache.put("stale", "old verdict", generation=generation)
+    assert cache.get("stale") is None
+
+    cache.put("fresh", "new verdict", generation=cache.generation)
+    assert cache.get("fresh") == "new verdict"
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+from file_generator import FakeFileGenerator
+from markov import MarkovTextModel
+from virtual_fs import RenderCache, VirtualFileSystem
+
+@pytest.fixture
+def vfs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = FakeFileGenerator()
+    generator.markov_model = MarkovTextModel.train(generator.templates, seed=1)
+    engine = storage.get_storage(str(tmp_path / "honeypot.db"))
+    engine.migrate()
+    yield VirtualFileSystem(generator, engine)
+    storage.close_all()
+
+def test_renders_are_deterministic(vfs):
+    result = vfs.create(200, "credentials")
+    assert result["created"] == 200
+    files = vfs.list_files(limit=500)
+    assert len({f["filename"] for f in files}) == 200
+    assert {f["category"] for f in files} == {"credentials"}
+
+    filename = result["sample"][0]
+    content = vfs.load(filename)
+    assert content and vfs.cached(filename) == content
+    # A fresh instance, without the render cache, serves the same bytes
+    assert VirtualFileSystem(vfs.generator, vfs.storage).load(filename) == content
+    assert vfs.load("missing.txt") is None
+
+    with pytest.raises(ValueError):
+        vfs.create(1, "payroll")
+
+def test_static_files_avoid_virtual_names(vfs, monkeypatch):
+    vfs.create(1)
+    taken = vfs.list_files()[0]["filename"]
+    names = iter([taken, "fresh_name.txt"])
+    monkeypatch.setattr(vfs.generator, "generate_honeypot_filename", lambda *args, **kwargs: next(names))
+    assert vfs.generator.plan_file()[2] == "fresh_name.txt"
+
+def test_render_cache_is_bounded_by_bytes():
+    cache = RenderCache(max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"  # "b" is now least recently used
+    cache.put("c", b"123")
+    assert cache.get("b") is None and cache.bytes == 8
+    cache.put("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.get_stats()["evictions"] == 1
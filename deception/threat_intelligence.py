@@ -1,177 +1,246 @@
 import requests
-import json
-from typing import Dict, Optional, List
+import os
+from typing import Dict, Iterable, Optional, List
 from datetime import datetime
+from functools import lru_cache
 import ipaddress
-import sqlite3
 from pathlib import Path
 
+from storage import get_storage, epoch_ms, current_cancel_scope, QueryCancelled
+from ip_index import FeedTag, parse_ip
+from feed_manager import FeedManager
+from ttl_cache import TTLCache
+from geoip import open_geoip
+from intel_writer import ThreatIntelWriter
+from reputation import ReputationTracker
+
+# IPs looked up per step of analyze_many, between cancellation checks
+ANALYZE_SLICE = 1000
+
+# Hosting/cloud provider ASNs and organisation keywords used by _is_datacenter
+DATACENTER_ASNS = {
+    "AS16509", "AS14618", "AS8987",    # Amazon
+    "AS15169", "AS396982",             # Google
+    "AS8075",                          # Microsoft
+    "AS14061",                         # DigitalOcean
+    "AS16276",                         # OVH
+    "AS24940",                         # Hetzner
+    "AS63949",                         # Linode/Akamai
+    "AS20473",                         # Vultr
+    "AS31898",                         # Oracle
+    "AS37963", "AS45102"               # Alibaba
+}
+DATACENTER_KEYWORDS = ("cloud", "hosting", "datacenter", "data center", "server", "vps")
+
+@lru_cache(maxsize=4096)
+def _is_hosting_network(asn: str, organization: str, isp: str) -> bool:
+    """Check an ASN/owner against the hosting lists; few distinct owners, so memoised."""
+    if asn.upper() in DATACENTER_ASNS:
+        return True
+    owner = f"{organization} {isp}".lower()
+    return any(keyword in owner for keyword in DATACENTER_KEYWORDS)
+
+# Fallback demo data when no geolocation database covers an IP
+MOCK_GEOLOCATIONS = {
+    "45.142.212.33": {
+        "country": "Russia",
+        "region": "Moscow",
+        "city": "Moscow",
+        "latitude": 55.7558,
+        "longitude": 37.6176,
+        "isp": "Unknown ISP",
+        "organization": "Unknown",
+        "asn": "AS12345",
+        "timezone": "Europe/Moscow"
+    },
+    "198.51.100.42": {
+        "country": "China",
+        "region": "Beijing",
+        "city": "Beijing",
+        "latitude": 39.9042,
+        "longitude": 116.4074,
+        "isp": "Alibaba Cloud",
+        "organization": "Alibaba",
+        "asn": "AS37963",
+        "timezone": "Asia/Shanghai"
+    }
+}
+
+UNKNOWN_GEOLOCATION = {
+    "country": "Unknown",
+    "region": "Unknown",
+    "city": "Unknown",
+    "latitude": 0.0,
+    "longitude": 0.0,
+    "isp": "Unknown",
+    "organization": "Unknown",
+    "asn": "Unknown",
+    "timezone": "Unknown"
+}
+
 class ThreatIntelligence:
     """Advanced threat intelligence and IP analysis."""
     
     def __init__(self, db_path: str = "honeypot.db"):
         self.db_path = db_path
-        self.threat_feeds = {
-            "malicious_ips": self._load_threat_ips(),
-            "tor_nodes": self._load_tor_nodes(),
-            "known_botnets": self._load_botnet_ips()
-        }
+        self.storage = get_storage(db_path)
+        self.feeds = FeedManager(builtin=self._builtin_feeds())
+        # Feed hits are cached for ANALYSIS_CACHE_TTL, clean IPs for ANALYSIS_CACHE_NEGATIVE_TTL
+        self.cache = TTLCache(maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", "10000")),
+                              ttl=float(os.getenv("ANALYSIS_CACHE_TTL", "300")))
+        self.negative_ttl = float(os.getenv("ANALYSIS_CACHE_NEGATIVE_TTL", "60"))
+        self.geoip = self._open_geoip()
+        # Analyses only enter the cache if no reload cleared it while they ran
+        self.feeds.on_reload(lambda index: self.cache.clear())
+        self.feeds.start()
         self._init_threat_db()
+        # Sightings are merged in memory and upserted every THREAT_INTEL_FLUSH_SECONDS
+        self.writer = ThreatIntelWriter(self.storage)
+        self.writer.start()
+        # Behavioural reputation, fed by decoy accesses and connections
+        self.reputation = ReputationTracker(self.storage)
+        self.reputation.start()
 
     def _init_threat_db(self):
         """Initialize threat intelligence database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS threat_intel (
-                id INTEGER PRIMARY KEY,
-                ip_address TEXT UNIQUE,
-                threat_type TEXT,
-                confidence_score REAL,
-                first_seen TIMESTAMP,
-                last_seen TIMESTAMP,
-                source TEXT,
-                additional_info TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ip_geolocation (
-                id INTEGER PRIMARY KEY,
-                ip_address TEXT UNIQUE,
-                country TEXT,
-                region TEXT,
-                city TEXT,
-                latitude REAL,
-                longitude REAL,
-                isp TEXT,
-                organization TEXT,
-                asn TEXT,
-                timezone TEXT,
-                last_updated TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        self.storage.migrate()
 
     def analyze_ip(self, ip_address: str) -> Dict:
         """Comprehensive IP analysis."""
+        cached = self.cache.get(ip_address)
+        if cached is not None:
+            analysis = self._with_behavior(cached, datetime.now().isoformat())
+            self.writer.record(ip_address, analysis)
+            return analysis
+        
+        generation = self.cache.generation
+        analysis = self._build_analysis(ip_address, self._check_threat_feeds(ip_address),
+                                        self._get_geolocation(ip_address))
+        self._cache_analysis(ip_address, analysis, generation)
+        analysis = self._with_behavior(analysis)
+        
+        # Store in database
+        self._store_threat_intel(ip_address, analysis)
+        return analysis
+
+    def analyze_many(self, ip_addresses: Iterable[str]) -> List[Dict]:
+        """Analyze many IPs at once; one result per distinct input, in first-seen order.
+
+        Feed and geolocation lookups run over the whole batch, cached IPs are
+        answered from the cache, and every result is handed to the
+        write-behind buffer under one lock. Inputs that are not IP addresses
+        get an ``error`` result and are not stored.
+        """
+        unique = list(dict.fromkeys(ip.strip() for ip in ip_addresses if ip and ip.strip()))
+        results: Dict[str, Dict] = {}
+        pending = []
+        timestamp = datetime.now().isoformat()
+        generation = self.cache.generation
+
+        for ip_address in unique:
+            if parse_ip(ip_address) is None:
+                results[ip_address] = {"ip_address": ip_address, "error": "invalid IP address"}
+                continue
+            cached = self.cache.get(ip_address)
+            if cached is None:
+                pending.append(ip_address)
+            else:
+                results[ip_address] = self._with_behavior(cached, timestamp)
+
+        scope = current_cancel_scope.get()
+        for start in range(0, len(pending), ANALYZE_SLICE):
+            # Lookups hold no SQLite query to interrupt, so honour the caller's deadline between slices
+            if scope is not None and scope.cancelled:
+                raise QueryCancelled(f"Batch analysis stopped after {start} of {len(pending)} lookups")
+            part = pending[start:start + ANALYZE_SLICE]
+            feed_hits = self.feeds.index.lookup_many(part)
+            locations = self._get_geolocations(part)
+            for ip_address, indicators, geolocation in zip(part, feed_hits, locations):
+                analysis = self._build_analysis(ip_address, indicators, geolocation, timestamp)
+                self._cache_analysis(ip_address, analysis, generation)
+                results[ip_address] = self._with_behavior(analysis)
+
+        self.writer.record_many((result["ip_address"], result) for result in results.values()
+                                if "error" not in result)
+        return [results[ip_address] for ip_address in unique]
+
+    def _build_analysis(self, ip_address: str, threat_indicators: List[Dict], geolocation: Dict,
+                        timestamp: Optional[str] = None) -> Dict:
+        """Assemble an analysis from feed hits and geolocation."""
         analysis = {
             "ip_address": ip_address,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
             "threat_level": "unknown",
-            "geolocation": {},
-            "threat_indicators": [],
+            "geolocation": geolocation,
+            "threat_indicators": threat_indicators,
             "reputation_score": 0,
             "is_tor": False,
             "is_vpn": False,
             "is_datacenter": False
         }
-        
-        # Check if IP is in threat feeds
-        analysis["threat_indicators"] = self._check_threat_feeds(ip_address)
-        analysis["threat_level"] = self._calculate_threat_level(analysis["threat_indicators"])
-        
-        # Get geolocation data
-        analysis["geolocation"] = self._get_geolocation(ip_address)
+        analysis["threat_level"] = self._calculate_threat_level(threat_indicators)
         
         # Check for special IP types
-        analysis["is_tor"] = self._is_tor_node(ip_address)
+        analysis["is_tor"] = any(threat["type"] == "tor_node" for threat in threat_indicators)
         analysis["is_vpn"] = self._is_vpn(ip_address)
-        analysis["is_datacenter"] = self._is_datacenter(ip_address)
+        analysis["is_datacenter"] = self._is_datacenter(ip_address, geolocation)
         
         # Calculate reputation score
         analysis["reputation_score"] = self._calculate_reputation_score(analysis)
-        
-        # Store in database
-        self._store_threat_intel(ip_address, analysis)
-        
         return analysis
 
+    def _with_behavior(self, analysis: Dict, timestamp: Optional[str] = None) -> Dict:
+        """Copy a (cached) analysis with the current behaviour score folded into its reputation.
+
+        Cached analyses keep the feed-based score; the behaviour score is an
+        O(1) in-memory read, so it is applied fresh on every call.
+        """
+        behavior_score = self.reputation.score(analysis["ip_address"])
+        result = dict(analysis,
+                      behavior_score=behavior_score,
+                      reputation_score=round(analysis["reputation_score"] * behavior_score / 100))
+        if timestamp is not None:
+            result["timestamp"] = timestamp
+        return result
+
+    def _cache_analysis(self, ip_address: str, analysis: Dict, generation: int):
+        """Cache an analysis unless the feeds were reloaded since ``generation`` was read."""
+        self.cache.put(ip_address, analysis,
+                       None if analysis["threat_indicators"] else self.negative_ttl, generation)
+
     def _check_threat_feeds(self, ip_address: str) -> List[Dict]:
-        """Check IP against known threat feeds."""
-        threats = []
-        
-        # Check malicious IPs
-        if ip_address in self.threat_feeds["malicious_ips"]:
-            threats.append({
-                "type": "malicious_ip",
-                "confidence": 0.9,
-                "source": "threat_feed",
-                "description": "IP found in known malicious IP list"
-            })
-        
-        # Check Tor nodes
-        if ip_address in self.threat_feeds["tor_nodes"]:
-            threats.append({
-                "type": "tor_node",
-                "confidence": 1.0,
-                "source": "tor_directory",
-                "description": "Tor exit node"
-            })
-        
-        # Check botnets
-        if ip_address in self.threat_feeds["known_botnets"]:
-            threats.append({
-                "type": "botnet",
-                "confidence": 0.8,
-                "source": "botnet_tracker",
-                "description": "Known botnet member"
-            })
-        
-        return threats
+        """Check IP against known threat feeds, including CIDR ranges."""
+        return self.feeds.index.lookup(ip_address)
+
+    def _open_geoip(self):
+        """Open the local geolocation database named by GEOIP_DB, if present."""
+        path = os.getenv("GEOIP_DB", "data/geoip.vgeo")
+        if not Path(path).is_file():
+            return None
+        try:
+            return open_geoip(path)
+        except Exception as e:
+            print(f"Failed to open geolocation database {path}: {e}")
+            return None
 
     def _get_geolocation(self, ip_address: str) -> Dict:
         """Get geolocation data for IP address."""
-        # First check database cache
-        cached = self._get_cached_geolocation(ip_address)
-        if cached:
-            return cached
-        
-        # Mock geolocation service (in real implementation, use ipinfo.io, MaxMind, etc.)
-        mock_geolocations = {
-            "45.142.212.33": {
-                "country": "Russia",
-                "region": "Moscow",
-                "city": "Moscow",
-                "latitude": 55.7558,
-                "longitude": 37.6176,
-                "isp": "Unknown ISP",
-                "organization": "Unknown",
-                "asn": "AS12345",
-                "timezone": "Europe/Moscow"
-            },
-            "198.51.100.42": {
-                "country": "China",
-                "region": "Beijing",
-                "city": "Beijing",
-                "latitude": 39.9042,
-                "longitude": 116.4074,
-                "isp": "Alibaba Cloud",
-                "organization": "Alibaba",
-                "asn": "AS37963",
-                "timezone": "Asia/Shanghai"
-            }
-        }
-        
-        geo_data = mock_geolocations.get(ip_address, {
-            "country": "Unknown",
-            "region": "Unknown",
-            "city": "Unknown",
-            "latitude": 0.0,
-            "longitude": 0.0,
-            "isp": "Unknown",
-            "organization": "Unknown",
-            "asn": "Unknown",
-            "timezone": "Unknown"
-        })
-        
-        # Cache the result
-        self._cache_geolocation(ip_address, geo_data)
-        
-        return geo_data
+        if self.geoip is not None:
+            location = self.geoip.lookup(ip_address)
+            if location:
+                return location
+        return self._fallback_geolocation(ip_address)
+
+    def _get_geolocations(self, ip_addresses: List[str]) -> List[Dict]:
+        """Get geolocation data for many IPs with one database pass."""
+        if self.geoip is None:
+            return [self._fallback_geolocation(ip_address) for ip_address in ip_addresses]
+        return [location or self._fallback_geolocation(ip_address)
+                for ip_address, location in zip(ip_addresses, self.geoip.lookup_many(ip_addresses))]
+
+    def _fallback_geolocation(self, ip_address: str) -> Dict:
+        """Demo data used when no geolocation database covers the IP."""
+        return dict(MOCK_GEOLOCATIONS.get(ip_address, UNKNOWN_GEOLOCATION))
 
     def _calculate_threat_level(self, threats: List[Dict]) -> str:
         """Calculate overall threat level."""
@@ -191,7 +260,7 @@ class ThreatIntelligence:
             return "low"
 
     def _calculate_reputation_score(self, analysis: Dict) -> int:
-        """Calculate IP reputation score (0-100, lower is worse)."""
+        """Calculate feed-based IP reputation score (0-100, lower is worse); see _with_behavior."""
         score = 100
         
         for threat in analysis["threat_indicators"]:
@@ -209,6 +278,17 @@ class ThreatIntelligence:
         
         return max(0, score)
 
+    def _builtin_feeds(self) -> List:
+        """Feeds that are always loaded, whatever is in the feed directory."""
+        return [
+            (self._load_threat_ips(), FeedTag("malicious_ips", "malicious_ip", 0.9, "threat_feed",
+                                              "IP found in known malicious IP list")),
+            (self._load_tor_nodes(), FeedTag("tor_nodes", "tor_node", 1.0, "tor_directory",
+                                             "Tor exit node")),
+            (self._load_botnet_ips(), FeedTag("known_botnets", "botnet", 0.8, "botnet_tracker",
+                                              "Known botnet member"))
+        ]
+
     def _load_threat_ips(self) -> set:
         """Load known malicious IPs."""
         return {
@@ -230,7 +310,7 @@ class ThreatIntelligence:
 
     def _is_tor_node(self, ip_address: str) -> bool:
         """Check if IP is a Tor node."""
-        return ip_address in self.threat_feeds["tor_nodes"]
+        return self.feeds.index.contains(ip_address, "tor_node")
 
     def _is_vpn(self, ip_address: str) -> bool:
         """Check if IP is from a VPN service."""
@@ -238,103 +318,31 @@ class ThreatIntelligence:
         vpn_asns = ["AS62240", "AS396356", "AS13335"]  # Example VPN ASNs
         return False  # Simplified for demo
 
-    def _is_datacenter(self, ip_address: str) -> bool:
+    def _is_datacenter(self, ip_address: str, geolocation: Optional[Dict] = None) -> bool:
         """Check if IP is from a datacenter."""
-        # Mock datacenter detection
-        return "cloud" in self._get_geolocation(ip_address).get("organization", "").lower()
+        geolocation = geolocation if geolocation is not None else self._get_geolocation(ip_address)
+        return _is_hosting_network(geolocation.get("asn", ""), geolocation.get("organization", ""),
+                                   geolocation.get("isp", ""))
 
     def _store_threat_intel(self, ip_address: str, analysis: Dict):
         """Store threat intelligence in database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO threat_intel 
-            (ip_address, threat_type, confidence_score, first_seen, last_seen, source, additional_info)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            ip_address,
-            analysis["threat_level"],
-            analysis["reputation_score"] / 100,
-            datetime.now(),
-            datetime.now(),
-            "internal_analysis",
-            json.dumps(analysis["threat_indicators"])
-        ))
-        
-        conn.commit()
-        conn.close()
-
-    def _get_cached_geolocation(self, ip_address: str) -> Optional[Dict]:
-        """Get cached geolocation data."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT country, region, city, latitude, longitude, isp, organization, asn, timezone
-            FROM ip_geolocation 
-            WHERE ip_address = ? AND last_updated > datetime('now', '-7 days')
-        ''', (ip_address,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                "country": result[0],
-                "region": result[1], 
-                "city": result[2],
-                "latitude": result[3],
-                "longitude": result[4],
-                "isp": result[5],
-                "organization": result[6],
-                "asn": result[7],
-                "timezone": result[8]
-            }
-        return None
-
-    def _cache_geolocation(self, ip_address: str, geo_data: Dict):
-        """Cache geolocation data."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO ip_geolocation 
-            (ip_address, country, region, city, latitude, longitude, isp, organization, asn, timezone, last_updated)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            ip_address, geo_data.get("country"), geo_data.get("region"),
-            geo_data.get("city"), geo_data.get("latitude"), geo_data.get("longitude"),
-            geo_data.get("isp"), geo_data.get("organization"), geo_data.get("asn"),
-            geo_data.get("timezone"), datetime.now()
-        ))
-        
-        conn.commit()
-        conn.close()
+        self.writer.record(ip_address, analysis)
 
     def get_threat_summary(self, hours: int = 24) -> Dict:
         """Get threat summary for the specified time period."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        since = epoch_ms() - hours * 3_600_000
         
-        cursor.execute('''
-            SELECT threat_type, COUNT(*) as count
+        # One pass over the covering (last_seen_ts, threat_type, confidence_score) index
+        rows = self.storage.query('''
+            SELECT threat_type, COUNT(*) as count, TOTAL(confidence_score), COUNT(confidence_score)
             FROM threat_intel 
-            WHERE last_seen > datetime('now', '-{} hours')
+            WHERE last_seen_ts > ?
             GROUP BY threat_type
-        '''.format(hours))
-        
-        threat_counts = dict(cursor.fetchall())
-        
-        cursor.execute('''
-            SELECT AVG(confidence_score) as avg_threat_score
-            FROM threat_intel 
-            WHERE last_seen > datetime('now', '-{} hours')
-        '''.format(hours))
-        
-        avg_threat = cursor.fetchone()[0] or 0
+        ''', (since,))
         
-        conn.close()
+        threat_counts = {threat_type: count for threat_type, count, _, _ in rows}
+        confidence_count = sum(row[3] for row in rows)
+        avg_threat = sum(row[2] for row in rows) / confidence_count if confidence_count else 0
         
         return {
             "time_period_hours": hours,
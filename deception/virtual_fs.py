@@ -0,0 +1,150 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from storage import epoch_ms
+
+class RenderCache:
+    """LRU cache of rendered file bytes bounded by total size, not entry count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return content
+
+    def put(self, key: str, content: bytes):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self._entries[key] = content
+            self.bytes += len(content)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats
+            }
+
+class VirtualFileSystem:
+    """Decoys that exist only as manifest rows and are rendered on access.
+
+    Each ``virtual_files`` row holds a filename, category, template index
+    and seed. Rendering seeds ``random.Random`` for the fake values and the
+    n-gram model for {text}, and takes the year from the creation time, so
+    every hit on a file serves the same bytes without them ever touching
+    disk. Recent renderings are kept in a ``cache_bytes`` LRU (env
+    ``VIRTUAL_FS_CACHE_BYTES``, default 32 MiB). Rendering depends on the
+    template list and the trained n-gram tables: editing templates or
+    retraining changes the content of existing virtual files. The generator
+    is told about manifest names so that it never writes a static file that
+    would shadow a virtual one.
+    """
+
+    def __init__(self, generator, storage, cache_bytes: Optional[int] = None):
+        self.generator = generator
+        self.storage = storage
+        self.cache = RenderCache(cache_bytes or int(os.getenv("VIRTUAL_FS_CACHE_BYTES", str(32 * 2**20))))
+        self.renders = 0
+        self.render_seconds = 0.0
+        generator.name_taken = self.exists
+
+    def create(self, count: int, category: Optional[str] = None) -> Dict:
+        """Add ``count`` decoys with new unique names to the manifest."""
+        if category is not None and category not in self.generator.templates:
+            raise ValueError(f"Unknown category: {category}")
+        self.generator.load_markov()  # Fail now, not on first access, if there is no trained model
+        existing = {row[0] for row in self.storage.query("SELECT filename FROM virtual_files")}
+        existing.update(path.name for path in self.generator.static_dir.iterdir())
+
+        rng = random.Random()
+        categories = list(self.generator.templates)
+        created_ts = epoch_ms()
+        rows = []
+        for _ in range(count * 20):
+            if len(rows) == count:
+                break
+            file_category = category or rng.choice(categories)
+            filename = self.generator.generate_honeypot_filename(file_category, rng, qualified=True)
+            if filename in existing:
+                continue
+            existing.add(filename)
+            rows.append((filename, file_category, rng.randrange(len(self.generator.templates[file_category])),
+                         rng.getrandbits(63), created_ts))
+
+        # Wait for the commit so the new names can be served right away
+        self.storage.call(lambda conn: conn.executemany('''
+            INSERT OR IGNORE INTO virtual_files (filename, category, template, seed, created_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows))
+        return {"created": len(rows), "sample": [row[0] for row in rows[:10]]}
+
+    def exists(self, filename: str) -> bool:
+        return self.storage.query_one("SELECT 1 FROM virtual_files WHERE filename = ?", (filename,)) is not None
+
+    def list_files(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        rows = self.storage.query('''
+            SELECT filename, category FROM virtual_files ORDER BY filename LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        return [{"filename": filename, "category": category} for filename, category in rows]
+
+    def render(self, category: str, template_index: int, seed: int, created_ts: int) -> str:
+        """Deterministically render one decoy from its manifest fields."""
+        template = self.generator.templates[category][template_index]
+        length = self.generator.text_length(template)
+        text = self.generator.load_markov().generate_for([category], [length], seed=seed)[0] if length else ""
+        year = datetime.fromtimestamp(created_ts / 1000).year
+        return self.generator.render(template, text, random.Random(seed), year)
+
+    def cached(self, filename: str) -> Optional[bytes]:
+        """Get a recent rendering without touching storage."""
+        return self.cache.get(filename)
+
+    def load(self, filename: str) -> Optional[bytes]:
+        """Render a decoy by name (and cache it); None if it is not in the manifest."""
+        row = self.storage.query_one('''
+            SELECT category, template, seed, created_ts FROM virtual_files WHERE filename = ?
+        ''', (filename,))
+        if row is None:
+            return None
+        started = time.perf_counter()
+        content = self.render(*row).encode("utf-8")
+        self.render_seconds += time.perf_counter() - started
+        self.renders += 1
+        self.cache.put(filename, content)
+        return content
+
+    def get_stats(self) -> Dict:
+        return {
+            "files": self.storage.query_one("SELECT COUNT(*) FROM virtual_files")[0],
+            "renders": self.renders,
+            "avg_render_ms": round(self.render_seconds / self.renders * 1000, 3) if self.renders else None,
+            "cache": self.cache.get_stats()
+        }